@@ -0,0 +1,190 @@
+"""
+asyncio facade over main.py for asyncio frontends.
+
+The peewee calls block, so every operation runs on a dedicated executor
+instead of the event loop. Concurrent searches for the same id share one
+query.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+import main
+
+
+class AsyncSocialNetwork:
+    """
+    Awaitable versions of the operations in main.py on a user collection
+    and a status collection.
+
+    The default executor has a single thread, which then owns the SQLite
+    connection and runs the operations in the order they were awaited.
+    With a pooled database (see db_pool.py) a larger executor can be
+    passed in to run reads in parallel.
+    """
+
+    def __init__(self, uc_instance, sc_instance, executor=None):
+        self.uc_instance = uc_instance
+        self.sc_instance = sc_instance
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="socialnetwork-db")
+        # Searches in flight by ("user" | "status", id)
+        self._searches = {}
+
+    async def _run(self, function, *args):
+        """
+        Runs function(*args) on the executor and returns its result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def _search(self, key, function, *args):
+        """
+        Runs a search, or joins the identical search already in flight
+        """
+        task = self._searches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(function, *args))
+            self._searches[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            logger.debug("Joined the search in flight for {}", key)
+        # shield: one caller being cancelled must not cancel the others' search
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        """
+        Drops a finished search from the in-flight searches
+        """
+        if self._searches.get(key) is task:
+            del self._searches[key]
+
+    async def _write(self, key, function, *args):
+        """
+        Runs a write. Searches for the same key started before it are not
+        joined afterwards, so awaiting a write then a search never returns
+        the value from before the write. A key of None stands for every id.
+        """
+        if key is None:
+            self._searches.clear()
+        else:
+            self._searches.pop(key, None)
+        return await self._run(function, *args)
+
+    async def load_accounts_csv_to_db(self, file):
+        """
+        Awaitable main.load_accounts_csv_to_db
+        """
+        return await self._write(None, main.load_accounts_csv_to_db, file, self.uc_instance)
+
+    async def load_status_csv_to_db(self, file):
+        """
+        Awaitable main.load_status_csv_to_db
+        """
+        return await self._write(None, main.load_status_csv_to_db, file, self.sc_instance)
+
+    async def bulk_load_accounts_csv_to_db(self, file, chunk_size=main.LOAD_CHUNK_SIZE):
+        """
+        Awaitable main.bulk_load_accounts_csv_to_db
+        """
+        return await self._write(None, main.bulk_load_accounts_csv_to_db, file,
+                                 self.uc_instance, chunk_size)
+
+    async def bulk_load_status_csv_to_db(self, file, chunk_size=main.LOAD_CHUNK_SIZE):
+        """
+        Awaitable main.bulk_load_status_csv_to_db
+        """
+        return await self._write(None, main.bulk_load_status_csv_to_db, file,
+                                 self.sc_instance, chunk_size)
+
+    async def add_user(self, user_id, user_name, user_last_name, email):
+        """
+        Awaitable main.add_user
+        """
+        return await self._write(("user", user_id), main.add_user, user_id, user_name,
+                                 user_last_name, email, self.uc_instance)
+
+    async def delete_user(self, user_id):
+        """
+        Awaitable main.delete_user
+        """
+        # The statuses of the user go too, but we don't know their ids here
+        self._searches = {key: task for key, task in self._searches.items()
+                          if key[0] != "status"}
+        return await self._write(("user", user_id), main.delete_user, user_id,
+                                 self.uc_instance)
+
+    async def search_user(self, user_id):
+        """
+        Awaitable main.search_user
+        """
+        return await self._search(("user", user_id), main.search_user, user_id,
+                                  self.uc_instance)
+
+    async def search_users(self, user_ids):
+        """
+        Awaitable main.search_users
+        """
+        return await self._run(main.search_users, list(user_ids), self.uc_instance)
+
+    async def update_email(self, user_id, email):
+        """
+        Awaitable main.update_email
+        """
+        return await self._write(("user", user_id), main.update_email, user_id, email,
+                                 self.uc_instance)
+
+    async def add_status(self, status_id, user_id, status_text):
+        """
+        Awaitable main.add_status
+        """
+        return await self._write(("status", status_id), main.add_status, status_id,
+                                 user_id, status_text, self.sc_instance)
+
+    async def delete_status(self, status_id):
+        """
+        Awaitable main.delete_status
+        """
+        return await self._write(("status", status_id), main.delete_status, status_id,
+                                 self.sc_instance)
+
+    async def search_status(self, status_id):
+        """
+        Awaitable main.search_status
+        """
+        return await self._search(("status", status_id), main.search_status, status_id,
+                                  self.sc_instance)
+
+    async def search_statuses(self, status_ids):
+        """
+        Awaitable main.search_statuses
+        """
+        return await self._run(main.search_statuses, list(status_ids), self.sc_instance)
+
+    async def list_statuses(self, user_id, cursor=None, page_size=None):
+        """
+        Awaitable main.list_statuses
+        """
+        return await self._run(main.list_statuses, user_id, self.sc_instance, cursor,
+                               page_size)
+
+    async def search_status_text(self, text, page=1, page_size=None):
+        """
+        Awaitable main.search_status_text
+        """
+        return await self._run(main.search_status_text, text, self.sc_instance, page,
+                               page_size)
+
+    async def update_status(self, status_id, status_text):
+        """
+        Awaitable main.update_status
+        """
+        return await self._write(("status", status_id), main.update_status, status_id,
+                                 status_text, self.sc_instance)
+
+    def close(self):
+        """
+        Waits for the pending operations and shuts the executor down
+        """
+        self.executor.shutdown(wait=True)
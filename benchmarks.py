@@ -0,0 +1,963 @@
+"""
+Benchmarks for the social network backend.
+
+Run python benchmarks.py --help to list them. Results are printed as JSON;
+save them with --output and check a later run against them with --compare.
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import Future
+from csv import DictReader
+
+from peewee import SqliteDatabase
+
+import db_pool
+import log_config
+import main
+from bloom import load_filter
+import mmap_csv
+from cache import LRUCache
+from metrics import Metrics
+from replica import UserReplica, model_size
+from async_main import AsyncSocialNetwork
+from follows import FollowCollection
+from group_commit import GroupCommitWriter
+from shards import ShardedUserCollection, open_shards
+from socialnetwork_model import UserStatusTable, UsersTable, database
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+def percentiles(samples):
+    """
+    Returns the p50 and p99 of a list of samples, in the unit of the samples
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": None, "p99": None}
+    return {"p50": ordered[len(ordered) // 2],
+            "p99": ordered[min(len(ordered) - 1, len(ordered) * 99 // 100)]}
+
+
+def temporary_database(directory, name="bench.db"):
+    """
+    Creates both tables in a new SQLite file in directory and binds them to it
+    """
+    bench_database = SqliteDatabase(os.path.join(directory, name),
+                                    pragmas={"foreign_keys": 1})
+    bench_database.bind([UsersTable, UserStatusTable])
+    bench_database.create_tables([UsersTable, UserStatusTable])
+    return bench_database
+
+
+FIRST_NAMES = ("Brittaney", "Keri", "Michal", "Carolina", "Melitta", "Ashien",
+               "Eustacia", "Calli", "Audrey", "Bryce")
+LAST_NAMES = ("Gentry", "Royce", "Hollyanne", "Mateusz", "Zacharia", "Amos",
+              "Rudich", "Barsky", "Le", "Brown")
+DOMAINS = ("goodmail.com", "funmail.com")
+WORDS = ("wooden", "lace", "cause", "dull", "pest", "large", "bedroom", "kiss",
+         "receptive", "discovery", "expensive", "wrist", "wonder", "itchy", "neck",
+         "magnificent", "answer", "lend", "mammoth", "lip", "cultured", "smoke")
+# The row-by-row loaders are only timed up to this many rows
+PER_ROW_LOAD_LIMIT = 10000
+
+
+def account(i):
+    """
+    Returns the i-th synthetic user as a (user_id, name, last name, email) tuple
+    """
+    name = FIRST_NAMES[i % len(FIRST_NAMES)]
+    last_name = LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]
+    user_id = f"{name}.{last_name}{i}"
+    return user_id, name, last_name, f"{user_id}@{DOMAINS[i % len(DOMAINS)]}"
+
+
+def status(i, users):
+    """
+    Returns the i-th synthetic status, written by one of users users,
+    as a (status_id, user_id, status_text) tuple
+    """
+    user_id = account(i % users)[0]
+    text = " ".join(WORDS[(i * 7 + k * 3) % len(WORDS)] for k in range(5))
+    return f"{user_id}_{i}", user_id, text
+
+
+def generate_accounts_csv(file, rows):
+    """
+    Writes rows synthetic users to file in the layout of accounts.csv
+    """
+    with open(file, "w", encoding="utf-8") as csv_file:
+        csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\n")
+        for i in range(rows):
+            csv_file.write(",".join(account(i)) + "\n")
+
+
+def generate_status_csv(file, rows, users):
+    """
+    Writes rows synthetic statuses of users users to file in the layout
+    of sample_status.csv
+    """
+    with open(file, "w", encoding="utf-8") as csv_file:
+        csv_file.write("STATUS_ID,USER_ID,STATUS_TEXT\n")
+        for i in range(rows):
+            csv_file.write(",".join(status(i, users)) + "\n")
+
+
+def time_calls(function, calls):
+    """
+    Calls function once per tuple of arguments in calls and returns the
+    p50/p99 latency in microseconds and the throughput in calls per second
+    """
+    latencies = []
+    start = time.perf_counter()
+    for args in calls:
+        call_start = time.perf_counter_ns()
+        function(*args)
+        latencies.append((time.perf_counter_ns() - call_start) / 1000)
+    elapsed = time.perf_counter() - start
+    result = {f"{name}_us": value for name, value in percentiles(latencies).items()}
+    result["ops_per_second"] = round(len(latencies) / elapsed) if elapsed else None
+    return result
+
+
+def time_load(loader, file, collection, rows):
+    """
+    Runs a CSV loader of main.py and returns its duration and rows per second
+    """
+    start = time.perf_counter()
+    loader(file, collection)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "rows_per_second": round(rows / elapsed)}
+
+
+def open_backend(backend, directory, name):
+    """
+    Returns a database with both tables, in memory or in a file in directory
+    """
+    if backend == "memory":
+        bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        bench_database.bind([UsersTable, UserStatusTable])
+        bench_database.create_tables([UsersTable, UserStatusTable])
+        return bench_database
+    return temporary_database(directory, name)
+
+
+def operation_latencies(rows=(1000,), backends=("memory", "file"), samples=1000):
+    """
+    Times every operation of main.py on databases seeded from synthetic
+    CSV files of each size in rows, for each backend ("memory" or "file").
+
+    The CSV loaders are timed while seeding. Then each of add_user,
+    search_user, update_email, add_status, search_status, update_status,
+    delete_status and delete_user runs samples times on random ids.
+    Returns, by backend and size, the p50/p99 latency in microseconds and
+    the throughput of each operation.
+    """
+    results = {}
+    for backend in backends:
+        results[backend] = {}
+        for size in rows:
+            with tempfile.TemporaryDirectory() as directory:
+                accounts_file = os.path.join(directory, "accounts.csv")
+                status_file = os.path.join(directory, "status.csv")
+                generate_accounts_csv(accounts_file, size)
+                generate_status_csv(status_file, size, size)
+                result = {}
+                if size <= PER_ROW_LOAD_LIMIT:
+                    scratch = open_backend(backend, directory, "scratch.db")
+                    result["load_accounts_csv_to_db"] = time_load(
+                        main.load_accounts_csv_to_db, accounts_file,
+                        UserCollection(scratch), size)
+                    result["load_status_csv_to_db"] = time_load(
+                        main.load_status_csv_to_db, status_file,
+                        UserStatusCollection(scratch), size)
+                    scratch.close()
+                bench_database = open_backend(backend, directory, "bench.db")
+                uc_instance = UserCollection(bench_database)
+                sc_instance = UserStatusCollection(bench_database)
+                result["bulk_load_accounts_csv_to_db"] = time_load(
+                    main.bulk_load_accounts_csv_to_db, accounts_file, uc_instance, size)
+                result["bulk_load_status_csv_to_db"] = time_load(
+                    main.bulk_load_status_csv_to_db, status_file, sc_instance, size)
+
+                count = min(samples, size)
+                new_users = [account(size + i) for i in range(count)]
+                existing_users = [account(random.randrange(size)) for _ in range(count)]
+                new_statuses = [status(size + i, size) for i in range(count)]
+                existing_statuses = [status(random.randrange(size), size)
+                                     for _ in range(count)]
+                timings = (
+                    ("add_user", main.add_user,
+                     [user + (uc_instance,) for user in new_users]),
+                    ("search_user", main.search_user,
+                     [(user[0], uc_instance) for user in existing_users]),
+                    ("update_email", main.update_email,
+                     [(user[0], f"{user[0]}@uw.edu", uc_instance) for user in existing_users]),
+                    ("add_status", main.add_status,
+                     [new_status + (sc_instance,) for new_status in new_statuses]),
+                    ("search_status", main.search_status,
+                     [(old[0], sc_instance) for old in existing_statuses]),
+                    ("update_status", main.update_status,
+                     [(old[0], "updated text", sc_instance) for old in existing_statuses]),
+                    ("delete_status", main.delete_status,
+                     [(new_status[0], sc_instance) for new_status in new_statuses]),
+                    ("delete_user", main.delete_user,
+                     [(user[0], uc_instance) for user in new_users]),
+                )
+                for name, function, calls in timings:
+                    result[name] = time_calls(function, calls)
+                bench_database.close()
+                results[backend][str(size)] = result
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def compare_reports(baseline, current, threshold=0.25, path=""):
+    """
+    Compares two benchmark reports and returns a description of every
+    measure that got more than threshold (25%) worse: latencies ("_us",
+    "_ms", "seconds") that grew or throughputs ("_per_second") that shrank.
+    """
+    regressions = []
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        where = f"{path}.{key}" if path else key
+        old = baseline[key]
+        if isinstance(value, dict) and isinstance(old, dict):
+            regressions.extend(compare_reports(old, value, threshold, where))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            change = (value - old) / old
+            if key.endswith("_per_second"):
+                change = -change
+            elif not key.endswith(("_us", "_ms", "seconds")):
+                continue
+            if change > threshold:
+                regressions.append(f"{where}: {old} -> {value}")
+    return regressions
+
+
+def pool_read_throughput(thread_counts=(1, 2, 4, 8), users=10000, seconds=2.0):
+    """
+    Measures search_user throughput on a pooled WAL database while one
+    thread keeps updating emails, for each number of reader threads.
+
+    Returns a list of {"threads", "reads_per_second", "writes"} dicts.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        pooled = db_pool.init_pooled_database(os.path.join(directory, "bench.db"),
+                                              max_connections=max(thread_counts) + 1)
+        pooled.create_tables([UsersTable, UserStatusTable])
+        UserCollection(pooled).add_users(
+            (f"user{i}", "Name", "Last", f"user{i}@gmail.com") for i in range(users))
+        pooled.close()
+
+        def read(stop, reads, index):
+            with pooled.connection_context():
+                user_collection = UserCollection(pooled)
+                while not stop.is_set():
+                    user_collection.search_user(f"user{random.randrange(users)}")
+                    reads[index] += 1
+
+        def write(stop, writes):
+            with pooled.connection_context():
+                user_collection = UserCollection(pooled)
+                while not stop.is_set():
+                    user_id = f"user{random.randrange(users)}"
+                    user_collection.update_email(user_id, f"{user_id}@uw.edu")
+                    writes[0] += 1
+
+        for thread_count in thread_counts:
+            stop = threading.Event()
+            reads = [0] * thread_count
+            writes = [0]
+            threads = [threading.Thread(target=read, args=(stop, reads, i))
+                       for i in range(thread_count)]
+            threads.append(threading.Thread(target=write, args=(stop, writes)))
+            for thread in threads:
+                thread.start()
+            time.sleep(seconds)
+            stop.set()
+            for thread in threads:
+                thread.join()
+            results.append({"threads": thread_count,
+                            "reads_per_second": round(sum(reads) / seconds),
+                            "writes": writes[0]})
+        pooled.close_all()
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+async def _mixed_load(network, operations, users):
+    """
+    Runs a mix of 80% searches and 20% writes, 50 at a time, through the
+    awaitable methods of network
+    """
+    async def one(i):
+        user_id = f"user{random.randrange(users)}"
+        if i % 5 == 0:
+            await network.update_email(user_id, f"{user_id}@uw.edu")
+        elif i % 5 == 1:
+            await network.add_status(f"{user_id}_{i}", user_id, "Hello")
+        else:
+            await network.search_user(user_id)
+
+    for start in range(0, operations, 50):
+        await asyncio.gather(*[one(i) for i in range(start, min(start + 50, operations))])
+
+
+class _BlockingNetwork:
+    """
+    Runs the collection methods straight on the event loop, as calling
+    them from a coroutine without the facade would
+    """
+    def __init__(self, uc_instance, sc_instance):
+        self.uc_instance = uc_instance
+        self.sc_instance = sc_instance
+
+    async def update_email(self, user_id, email):
+        """
+        Updates the email on the event loop's thread
+        """
+        return self.uc_instance.update_email(user_id, email)
+
+    async def add_status(self, status_id, user_id, status_text):
+        """
+        Adds the status on the event loop's thread
+        """
+        return self.sc_instance.add_status(status_id, user_id, status_text)
+
+    async def search_user(self, user_id):
+        """
+        Searches for the user on the event loop's thread
+        """
+        return self.uc_instance.search_user(user_id)
+
+
+async def _loop_lag(load, interval=0.001):
+    """
+    Runs load while a ticker sleeps interval seconds in a loop, and
+    returns how late, in milliseconds, each tick woke up
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def tick():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lags.append((loop.time() - start - interval) * 1000)
+
+    ticker = asyncio.ensure_future(tick())
+    await load
+    done.set()
+    await ticker
+    return lags
+
+
+def event_loop_latency(operations=2000, users=1000):
+    """
+    Measures how late an event loop ticker runs under a mixed read/write
+    load, calling the collections directly ("blocking") versus through
+    async_main.AsyncSocialNetwork ("executor").
+
+    Returns the p50/p99 tick lag in milliseconds and the operations per
+    second of each mode.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        bench_database = temporary_database(directory)
+        UserCollection(bench_database).add_users(
+            (f"user{i}", "Name", "Last", f"user{i}@gmail.com") for i in range(users))
+        bench_database.close()
+        uc_instance = UserCollection(bench_database)
+        sc_instance = UserStatusCollection(bench_database)
+        for mode in ("blocking", "executor"):
+            if mode == "blocking":
+                network = _BlockingNetwork(uc_instance, sc_instance)
+            else:
+                network = AsyncSocialNetwork(uc_instance, sc_instance)
+            start = time.perf_counter()
+            lags = asyncio.run(_loop_lag(_mixed_load(network, operations, users)))
+            elapsed = time.perf_counter() - start
+            if mode == "executor":
+                network.close()
+            results[mode] = {"lag_ms": percentiles(lags),
+                             "ops_per_second": round(operations / elapsed)}
+            # the next mode may run on another thread, with its own connection
+            bench_database.close()
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+# (file level, enqueue, quiet) of each logging setup compared by logging_overhead;
+# "before" is how every module configured loguru before log_config
+LOGGING_SETUPS = {
+    "no_sinks": (None, False, True),
+    "before": ("DEBUG", False, False),
+    "enqueued_debug": ("DEBUG", True, True),
+    "enqueued_warning": ("WARNING", True, True),
+}
+
+
+def logging_overhead(operations=5000):
+    """
+    Times add_user, search_user and update_email on an in-memory database
+    under each of LOGGING_SETUPS.
+
+    Returns the mean microseconds per operation of each setup and its
+    overhead over running without any sink.
+    """
+    results = {}
+    for name, (level, enqueue, quiet) in LOGGING_SETUPS.items():
+        log_config.configure_logging(level=level, console_level=None, quiet=quiet,
+                                     enqueue=enqueue)
+        bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        bench_database.bind([UsersTable, UserStatusTable])
+        bench_database.create_tables([UsersTable, UserStatusTable])
+        user_collection = UserCollection(bench_database)
+        with open(os.devnull, "w", encoding="utf-8") as devnull, \
+                contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for i in range(operations):
+                user_collection.add_user(f"user{i}", "Name", "Last", f"user{i}@gmail.com")
+                user_collection.search_user(f"user{i}")
+                user_collection.update_email(f"user{i}", f"user{i}@uw.edu")
+            elapsed = time.perf_counter() - start
+        bench_database.close()
+        results[name] = {"us_per_op": round(elapsed / (3 * operations) * 1e6, 1)}
+    baseline = results["no_sinks"]["us_per_op"]
+    for result in results.values():
+        result["overhead_us"] = round(result["us_per_op"] - baseline, 1)
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def metrics_overhead(operations=20000):
+    """
+    Times search_user on an in-memory database without metrics, with
+    metrics, and with metrics plus SQL statement timing, logging off.
+
+    Returns the mean microseconds per call of each setup.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+    bench_database.bind([UsersTable, UserStatusTable])
+    bench_database.create_tables([UsersTable, UserStatusTable])
+    UserCollection(bench_database).add_users(account(i) for i in range(1000))
+    user_ids = [account(i % 1000)[0] for i in range(operations)]
+    results = {}
+    for name in ("disabled", "enabled", "enabled_with_sql"):
+        metrics = None if name == "disabled" else Metrics(slow_query_seconds=0.01)
+        if name == "enabled_with_sql":
+            metrics.attach(bench_database)
+        user_collection = UserCollection(bench_database, metrics=metrics)
+        start = time.perf_counter()
+        for user_id in user_ids:
+            user_collection.search_user(user_id)
+        results[name] = {"us_per_op": round((time.perf_counter() - start) / operations * 1e6,
+                                            2)}
+    bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def update_paths(rows=1000):
+    """
+    Times updating rows users' emails and rows statuses' texts on a
+    database file three ways each: the former get-then-save per row, the
+    single UPDATE per row of update_email and update_status_text, and one
+    update_emails or update_status_texts call for all of them.
+
+    Returns the mean microseconds per updated row of each.
+    """
+    def get_and_save(key_field, value_field, key, value):
+        with bench_database.transaction("immediate"):
+            row = key_field.model.get(key_field == key)
+            setattr(row, value_field.name, value)
+            row.save()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        bench_database = temporary_database(directory)
+        user_collection = UserCollection(bench_database)
+        status_collection = UserStatusCollection(bench_database)
+        user_collection.add_users(account(i) for i in range(rows))
+        status_collection.add_statuses(status(i, rows) for i in range(rows))
+        user_ids = [account(i)[0] for i in range(rows)]
+        status_ids = [status(i, rows)[0] for i in range(rows)]
+        # (name, ids, update, whether update takes a dict of all the rows)
+        paths = (
+            ("get_and_save", user_ids,
+             functools.partial(get_and_save, UsersTable.user_id, UsersTable.email), False),
+            ("update_email", user_ids, user_collection.update_email, False),
+            ("update_emails", user_ids, user_collection.update_emails, True),
+            ("status_get_and_save", status_ids,
+             functools.partial(get_and_save, UserStatusTable.status_id,
+                               UserStatusTable.status_text), False),
+            ("update_status_text", status_ids, status_collection.update_status_text, False),
+            ("update_status_texts", status_ids, status_collection.update_status_texts, True),
+        )
+        for name, ids, update, batch in paths:
+            values = {key: f"{name}.{key}@example.com" for key in ids}
+            start = time.perf_counter()
+            if batch:
+                update(values)
+            else:
+                for key, value in values.items():
+                    update(key, value)
+            results[name] = {"us_per_op": round((time.perf_counter() - start) / rows * 1e6, 2)}
+        bench_database.close()
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def csv_readers(rows=5000000):
+    """
+    Times reading a generated status CSV of rows records into the tuples
+    the bulk loaders insert, with DictReader and main.csv_row, and with
+    the memory-mapped reader of mmap_csv.py. Parsing only; no database.
+
+    Returns the seconds and rows per second of each reader.
+    """
+    readers = {
+        "dict_reader": lambda csv_file: (main.csv_row(row, main.STATUS_COLUMNS)
+                                         for row in DictReader(csv_file)),
+        "mmap_tuples": lambda csv_file: mmap_csv.read_tuples(csv_file, main.STATUS_COLUMNS),
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, "statuses.csv")
+        generate_status_csv(file, rows, max(rows // 10, 1))
+        for name, reader in readers.items():
+            with open(file, "r", encoding="utf-8", newline="") as csv_file:
+                start = time.perf_counter()
+                count = sum(1 for row in reader(csv_file) if row is not None)
+                elapsed = time.perf_counter() - start
+            results[name] = {"seconds": round(elapsed, 3), "rows": count,
+                             "rows_per_second": round(rows / elapsed)}
+    return results
+
+
+def pipeline_loads(rows=200000, worker_counts=None):
+    """
+    Loads generated CSV files of rows users and rows statuses with the
+    bulk loaders, which parse in this process, and with the parallel
+    loaders for each number of parsing processes in worker_counts, by
+    default 1 to os.cpu_count(). Every loader fills a new database file.
+
+    Returns the seconds and rows per second of each load, by loader.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    if worker_counts is None:
+        worker_counts = range(1, (os.cpu_count() or 1) + 1)
+    loaders = [("bulk", main.bulk_load_accounts_csv_to_db, main.bulk_load_status_csv_to_db)]
+    loaders += [(f"parallel_{workers}",
+                 functools.partial(main.parallel_load_accounts_csv_to_db, workers=workers),
+                 functools.partial(main.parallel_load_status_csv_to_db, workers=workers))
+                for workers in worker_counts]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        accounts_file = os.path.join(directory, "accounts.csv")
+        status_file = os.path.join(directory, "status.csv")
+        generate_accounts_csv(accounts_file, rows)
+        generate_status_csv(status_file, rows, rows)
+        for name, load_accounts, load_statuses in loaders:
+            bench_database = temporary_database(directory, f"{name}.db")
+            results[name] = {
+                "accounts": time_load(load_accounts, accounts_file,
+                                      UserCollection(bench_database), rows),
+                "statuses": time_load(load_statuses, status_file,
+                                      UserStatusCollection(bench_database), rows)}
+            bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def replica_lookups(users=100000, operations=20000):
+    """
+    Loads users into a replica.UserReplica and compares its memory per
+    user with a UsersTable instance, then times search_user answered by
+    SQLite, by a warm cache.LRUCache and by the replica, logging off.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+    bench_database.bind([UsersTable, UserStatusTable])
+    bench_database.create_tables([UsersTable, UserStatusTable])
+    UserCollection(bench_database).add_users(account(i) for i in range(users))
+    start = time.perf_counter()
+    user_replica = UserReplica(bench_database).load()
+    results = {"load_seconds": round(time.perf_counter() - start, 3),
+               "replica_bytes_per_user": user_replica.memory_usage()["bytes_per_user"],
+               "model_bytes_per_user": model_size(UsersTable.get())}
+    user_ids = [account(random.randrange(users))[0] for _ in range(operations)]
+    collections = {
+        "sqlite": UserCollection(bench_database),
+        "lru_cache": UserCollection(bench_database, cache=LRUCache(maxsize=users)),
+        "replica": UserCollection(bench_database, replica=user_replica),
+    }
+    for name, user_collection in collections.items():
+        for user_id in user_ids:
+            user_collection.search_user(user_id)
+        start = time.perf_counter()
+        for user_id in user_ids:
+            user_collection.search_user(user_id)
+        results[f"{name}_us_per_op"] = round(
+            (time.perf_counter() - start) / operations * 1e6, 2)
+    bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def row_mode_reads(users=10000, batch=1000, repeats=20):
+    """
+    Times batch reads with the collections returning peewee models and
+    in row mode: search_users of batch user_ids, search_statuses of batch
+    status_ids and list_statuses pages of batch statuses. Also measures
+    the memory allocated to hold one batch of results with tracemalloc.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+    bench_database.bind([UsersTable, UserStatusTable])
+    bench_database.create_tables([UsersTable, UserStatusTable])
+    UserCollection(bench_database).add_users(account(i) for i in range(users))
+    user_ids = [account(i)[0] for i in range(users)]
+    # All written by the first user, so that list_statuses has full pages
+    UserStatusCollection(bench_database).add_statuses(status(i, 1) for i in range(batch))
+    UserStatusCollection(bench_database).create_timeline_index()
+    status_ids = [status(i, 1)[0] for i in range(batch)]
+
+    def search_users(user_collection):
+        return user_collection.search_users(random.sample(user_ids, batch))
+
+    results = {}
+    for row_mode in (False, True):
+        user_collection = UserCollection(bench_database, row_mode=row_mode)
+        status_collection = UserStatusCollection(bench_database, row_mode=row_mode)
+        reads = {
+            "search_users": functools.partial(search_users, user_collection),
+            "search_statuses": functools.partial(status_collection.search_statuses,
+                                                 status_ids),
+            "list_statuses": functools.partial(status_collection.list_statuses,
+                                               user_ids[0], page_size=batch),
+        }
+        for name, read in reads.items():
+            read()
+            start = time.perf_counter()
+            for _ in range(repeats):
+                read()
+            elapsed = (time.perf_counter() - start) / repeats
+            tracemalloc.start()
+            kept = read()
+            allocated = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del kept
+            results[f"{name}_{'rows' if row_mode else 'models'}"] = {
+                "ms_per_batch": round(elapsed * 1000, 2),
+                "kib_per_batch": round(allocated / 1024)}
+    bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def power_law_follows(users, follows_per_user, exponent=1.0):
+    """
+    Returns (follower, followed) pairs where user i is followed with a
+    probability proportional to 1 / (i + 1) ** exponent, so that a few
+    accounts have most of the followers
+    """
+    weights = [1 / (i + 1) ** exponent for i in range(users)]
+    pairs = set()
+    for follower in range(users):
+        for followed in random.choices(range(users), weights, k=follows_per_user):
+            if followed != follower:
+                pairs.add((follower, followed))
+    return sorted(pairs)
+
+
+def feed_strategies(users=2000, follows_per_user=50, statuses=5000, reads=1000):
+    """
+    Compares home feeds filled by fan-out on write for everyone, by the
+    hybrid of follows.py (fan-out on read above 100 followers) and by
+    fan-out on read for everyone, on a power-law follow graph.
+
+    Returns, for each, the microseconds per add_status, the feed rows
+    written and the latency of reading the first page of a feed.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    random.seed(21)
+    pairs = power_law_follows(users, follows_per_user)
+    user_ids = [account(i)[0] for i in range(users)]
+    posts = [status(i, users) for i in range(statuses)]
+    readers = [(random.choice(user_ids),) for _ in range(reads)]
+    results = {"max_followers": max(sum(1 for _, followed in pairs if followed == i)
+                                    for i in range(10))}
+    for name, fanout_limit in (("fan_out_on_write", users), ("hybrid", 100),
+                               ("fan_out_on_read", 0)):
+        bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        bench_database.bind([UsersTable, UserStatusTable])
+        bench_database.create_tables([UsersTable, UserStatusTable])
+        UserCollection(bench_database).add_users(account(i) for i in range(users))
+        follow_collection = FollowCollection(bench_database, fanout_limit=fanout_limit)
+        with bench_database.transaction():
+            for follower, followed in pairs:
+                follow_collection.follow(user_ids[follower], user_ids[followed])
+        status_collection = UserStatusCollection(bench_database, feed=follow_collection)
+        start = time.perf_counter()
+        for post in posts:
+            status_collection.add_status(*post)
+        elapsed = time.perf_counter() - start
+        feed_rows = bench_database.execute_sql('SELECT COUNT(*) FROM "feedtable"').fetchone()[0]
+        results[name] = {"add_status_us": round(elapsed / statuses * 1e6, 1),
+                         "feed_rows": feed_rows,
+                         "home_feed": time_calls(follow_collection.home_feed, readers)}
+        bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def shard_writes(shard_counts=(1, 2, 4), users=2000, threads=4):
+    """
+    Measures the write throughput of users spread over 1, 2 and 4 shard
+    files: threads threads calling add_user, then bulk add_users of
+    1000-user batches split across the shards in parallel.
+
+    Returns a list of {"shards", "add_user_per_second",
+    "bulk_users_per_second"} dicts.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+
+    def write(user_collection, first):
+        for i in range(first, users, threads):
+            user_collection.add_user(*account(i))
+
+    results = []
+    for count in shard_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            shard_databases = open_shards(directory, count)
+            user_collection = ShardedUserCollection(shard_databases)
+            workers = [threading.Thread(target=write, args=(user_collection, i))
+                       for i in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            single = time.perf_counter() - start
+            start = time.perf_counter()
+            for first in range(users, users * 11, 1000):
+                user_collection.add_users([account(i) for i in range(first, first + 1000)])
+            bulk = time.perf_counter() - start
+            results.append({"shards": count,
+                            "add_user_per_second": round(users / single),
+                            "bulk_users_per_second": round(users * 10 / bulk)})
+            user_collection.executor.shutdown()
+            for shard in shard_databases:
+                shard.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def group_commit_writes(statuses=2000, threads=4):
+    """
+    Compares threads threads posting statuses to a database file with a
+    transaction per add_status, and through a GroupCommitWriter.
+
+    Returns the statuses committed per second of each.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+
+    def post(add_status, first):
+        outcomes = [add_status(*status(i, 100)) for i in range(first, statuses, threads)]
+        # The writer returns futures, which resolve once committed
+        for outcome in outcomes:
+            if isinstance(outcome, Future):
+                outcome.result()
+
+    results = {}
+    for name in ("add_status", "group_commit"):
+        with tempfile.TemporaryDirectory() as directory:
+            bench_database = temporary_database(directory)
+            UserCollection(bench_database).add_users(account(i) for i in range(100))
+            status_collection = UserStatusCollection(bench_database)
+            writer = GroupCommitWriter(status_collection) if name == "group_commit" else None
+            add_status = (writer or status_collection).add_status
+            workers = [threading.Thread(target=post, args=(add_status, i))
+                       for i in range(threads)]
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            results[name] = {"statuses_per_second":
+                             round(statuses / (time.perf_counter() - start))}
+            if writer is not None:
+                writer.close()
+            bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def bloom_misses(users=100000, operations=5000, error_rate=0.01):
+    """
+    Times search_user, delete_status and add_status for ids that don't
+    exist, without and with Bloom filters of the user_ids and status_ids
+    loaded from users users, and reports the memory of the filters.
+    """
+    log_config.configure_logging(level=None, console_level=None, quiet=True)
+    bench_database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+    bench_database.bind([UsersTable, UserStatusTable])
+    bench_database.create_tables([UsersTable, UserStatusTable])
+    UserCollection(bench_database).add_users(account(i) for i in range(users))
+    UserStatusCollection(bench_database).add_statuses(status(i, users) for i in range(users))
+    unknown = [(f"unknown{i}",) for i in range(operations)]
+    orphans = [(f"unknown{i}_1", f"unknown{i}", "text") for i in range(operations)]
+    start = time.perf_counter()
+    user_filter = load_filter(bench_database, UsersTable.user_id, error_rate)
+    status_filter = load_filter(bench_database, UserStatusTable.status_id, error_rate)
+    results = {"load_seconds": round(time.perf_counter() - start, 2),
+               "user_filter": user_filter.stats(),
+               "status_filter": status_filter.stats()}
+    for name, filters in (("without_filters", {}),
+                          ("with_filters", {"user_filter": user_filter,
+                                            "status_filter": status_filter})):
+        user_collection = UserCollection(bench_database,
+                                         user_filter=filters.get("user_filter"))
+        status_collection = UserStatusCollection(bench_database, **filters)
+        results[name] = {"search_user": time_calls(user_collection.search_user, unknown),
+                         "delete_status": time_calls(status_collection.delete_status,
+                                                     [(status_id,) for status_id, _, _
+                                                      in orphans]),
+                         "add_status": time_calls(status_collection.add_status, orphans)}
+    bench_database.close()
+    log_config.configure_logging(quiet=True)
+    database.bind([UsersTable, UserStatusTable])
+    return results
+
+
+def import_time(module, runs=5):
+    """
+    Imports module in runs fresh interpreters with python -X importtime.
+
+    Returns the best wall time of the interpreter in milliseconds, the
+    cumulative import time of module in microseconds, and whether the
+    import loaded peewee or loguru.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    walls = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=directory, capture_output=True, text=True, check=True)
+        walls.append((time.perf_counter() - start) * 1000)
+    # Lines read "import time: self | cumulative | name", the module's own line last
+    cumulative = {}
+    for line in done.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, total, name = line.split("|")
+            cumulative[name.strip()] = int(total)
+    return {"wall_ms": round(min(walls), 1),
+            "import_us": cumulative.get(module),
+            "imports_peewee": "peewee" in cumulative,
+            "imports_loguru": "loguru" in cumulative}
+
+
+def startup(runs=5):
+    """
+    Measures the startup cost of the entry points: importing main and
+    menu in a fresh interpreter, against an empty interpreter
+    """
+    return {"python_ms": import_time("sys", runs)["wall_ms"],
+            "main": import_time("main", runs),
+            "menu": import_time("menu", runs)}
+
+
+BENCHMARKS = {
+    "operations": operation_latencies,
+    "pool_reads": pool_read_throughput,
+    "event_loop_latency": event_loop_latency,
+    "logging_overhead": logging_overhead,
+    "metrics_overhead": metrics_overhead,
+    "update_paths": update_paths,
+    "csv_readers": csv_readers,
+    "pipeline_loads": pipeline_loads,
+    "replica_lookups": replica_lookups,
+    "row_mode_reads": row_mode_reads,
+    "feed_strategies": feed_strategies,
+    "shard_writes": shard_writes,
+    "group_commit_writes": group_commit_writes,
+    "bloom_misses": bloom_misses,
+    "startup": startup,
+}
+
+
+def run_cli(argv=None):
+    """
+    Runs the benchmarks named on the command line, or argv, prints the
+    report and exits with 1 if --compare finds regressions
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("benchmarks", nargs="*",
+                        help=f"benchmarks to run among {', '.join(BENCHMARKS)}; all by default")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000],
+                        help="table sizes for the operations benchmark, e.g. 1000 1000000")
+    parser.add_argument("--backends", nargs="+", default=["memory", "file"],
+                        choices=["memory", "file"], help="databases for the operations benchmark")
+    parser.add_argument("--samples", type=int, default=1000,
+                        help="calls timed per operation")
+    parser.add_argument("--csv-rows", type=int, default=5000000,
+                        help="records of the generated file for the csv_readers benchmark")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="process counts for the pipeline_loads benchmark; "
+                             "1 to the number of CPUs by default")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    parser.add_argument("--compare", help="report of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+    options = {"operations": {"rows": args.rows, "backends": args.backends,
+                              "samples": args.samples},
+               "csv_readers": {"rows": args.csv_rows},
+               "pipeline_loads": {"worker_counts": args.workers}}
+    # The collections print a line for every write
+    log_config.configure_logging(quiet=True)
+    report = {name: BENCHMARKS[name](**options.get(name, {}))
+              for name in args.benchmarks or BENCHMARKS}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous:
+            found = compare_reports(json.load(previous), report, args.threshold)
+        for regression in found:
+            print(f"Regression: {regression}", file=sys.stderr)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    run_cli()
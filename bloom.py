@@ -0,0 +1,158 @@
+"""
+Bloom filters of the user_ids and status_ids in the database.
+
+A filter answers "maybe there" or "certainly not there" from memory. The
+collections take one as user_filter or status_filter and return at once
+for the ids it has never seen, instead of running a transaction that
+finds nothing. Every write path adds the ids it creates.
+
+A BloomFilter can't forget a deleted id, which then stays a false
+positive and costs one query, as without a filter. A CountingBloomFilter
+keeps a counter instead of a bit per position so that deleted ids can be
+removed, for eight times the memory.
+"""
+import hashlib
+import math
+
+from loguru import logger
+
+# False positive rate the filters are sized for by default
+ERROR_RATE = 0.01
+# Smallest number of ids a filter built by load_filter is sized for
+MIN_CAPACITY = 1024
+# load_filter sizes a filter for this many times the ids in the table
+HEADROOM = 2
+
+
+def filter_key(key):
+    """
+    Returns the str a key is hashed as. Model instances, such as the
+    UsersTable instance add_status accepts as user_id, stand for their
+    primary key, and other ids for their text, as the TEXT id columns
+    compare them.
+    """
+    if hasattr(key, "get_id"):
+        key = key.get_id()
+    return key if isinstance(key, str) else str(key)
+
+
+class BloomFilter:
+    """
+    Set of keys, see filter_key, with false positives but no false negatives, sized
+    to keep false positives at error_rate until capacity keys are added
+    """
+    # Whether discard removes keys
+    counting = False
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._array = self._new_array()
+
+    def _new_array(self):
+        """
+        Returns the zeroed array of positions
+        """
+        return bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, key):
+        """
+        Yields the positions of key, by double hashing of one digest
+        """
+        digest = hashlib.blake2b(filter_key(key).encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key):
+        """
+        Adds key to the filter
+        """
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, keys):
+        """
+        Adds every key of keys to the filter
+        """
+        for key in keys:
+            self.add(key)
+
+    def discard(self, key):
+        """
+        Does nothing: a plain filter can't tell which bits key alone set
+        """
+
+    def __contains__(self, key):
+        return all(self._array[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def false_positive_rate(self):
+        """
+        Estimates the current false positive rate from the number of
+        keys added, which rises above error_rate past capacity
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def stats(self):
+        """
+        Returns the sizing, memory use and estimated false positive rate
+        """
+        return {"capacity": self.capacity,
+                "keys": self.count,
+                "error_rate": self.error_rate,
+                "false_positive_rate": self.false_positive_rate(),
+                "hashes": self.hashes,
+                "positions": self.size,
+                "bytes": len(self._array)}
+
+
+class CountingBloomFilter(BloomFilter):
+    """
+    BloomFilter with an 8-bit counter per position, which lets discard
+    remove keys. Only discard keys that were added: removing another key
+    could clear the positions of one that was. A counter that reaches 255
+    is never decremented again.
+    """
+    counting = True
+
+    def _new_array(self):
+        return bytearray(self.size)
+
+    def add(self, key):
+        for position in self._positions(key):
+            if self._array[position] < 255:
+                self._array[position] += 1
+        self.count += 1
+
+    def discard(self, key):
+        """
+        Removes key, which must have been added
+        """
+        for position in self._positions(key):
+            if 0 < self._array[position] < 255:
+                self._array[position] -= 1
+        self.count = max(0, self.count - 1)
+
+    def __contains__(self, key):
+        return all(self._array[position] for position in self._positions(key))
+
+
+def load_filter(database, field, error_rate=ERROR_RATE, counting=False, capacity=None):
+    """
+    Builds a filter of the values of field, such as UsersTable.user_id,
+    from database. It is sized for capacity ids, by default HEADROOM
+    times the rows of the table, and is a CountingBloomFilter if counting.
+    """
+    model = field.model
+    if capacity is None:
+        capacity = max(MIN_CAPACITY, model.select().count(database) * HEADROOM)
+    bloom = (CountingBloomFilter if counting else BloomFilter)(capacity, error_rate)
+    bloom.update(key for (key,) in model.select(field).tuples().iterator(database))
+    logger.info("Loaded a filter of {}: {}", field.column_name, bloom.stats())
+    return bloom
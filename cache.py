@@ -0,0 +1,191 @@
+"""
+In-process caches for the collection classes
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class LRUCache:
+    """
+    Thread-safe least recently used cache with an optional time to live.
+
+    Holds at most maxsize entries; entries older than ttl seconds are
+    treated as misses. The hits, misses and evictions counters help size it.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped by every invalidation, see put()
+        self.version = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if it is absent or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def put(self, key, value, version=None):
+        """
+        Caches value for key, evicting the least recently used entry if
+        the cache is full.
+
+        A reader that loaded value from the database passes the version it
+        read before the query; the value is dropped if an invalidation
+        happened in between, as it may predate that write.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._add(key, value)
+            while self._entries and self._is_full():
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Drops the entry for key, if any
+        """
+        with self._lock:
+            self.version += 1
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        """
+        Drops every entry, keeping the counters
+        """
+        with self._lock:
+            self.version += 1
+            for key in list(self._entries):
+                self._remove(key)
+
+    def _add(self, key, value):
+        """
+        Stores value as the most recently used entry. Called with the lock held.
+        """
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+
+    def _remove(self, key):
+        """
+        Removes the entry for key. Called with the lock held.
+        """
+        del self._entries[key]
+
+    def _is_full(self):
+        """
+        Tells whether the cache is over capacity. Called with the lock held.
+        """
+        return len(self._entries) > self.maxsize
+
+    def stats(self):
+        """
+        Returns the size and the hit, miss and eviction counters of the cache
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class StatusCache(LRUCache):
+    """
+    LRU cache of statuses by status_id, bounded by an estimate of the
+    memory its entries use rather than by their number, since the length
+    of status_text varies a lot.
+
+    It also indexes the cached statuses by user_id, so that all the
+    statuses of a user can be dropped when the user is deleted and the
+    database cascades the delete to UserStatusTable.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, ttl=None, clock=time.monotonic):
+        super().__init__(maxsize=None, ttl=ttl, clock=clock)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._sizes = {}
+        self._owners = {}
+        self._by_user = defaultdict(set)
+
+    def put(self, key, value, version=None, user_id=None, size=None):
+        """
+        Caches the status value for status_id key, owned by user_id.
+        size is its estimated footprint in bytes; it defaults to the
+        size of the value object itself.
+        """
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._sizes[key] = sys.getsizeof(value) if size is None else size
+            self._owners[key] = user_id
+            self._by_user[user_id].add(key)
+            self.bytes += self._sizes[key]
+            self._add(key, value)
+            while self._entries and self._is_full():
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """
+        Drops every cached status of user_id
+        """
+        with self._lock:
+            self.version += 1
+            for key in list(self._by_user.get(user_id, ())):
+                self._remove(key)
+
+    def stats(self):
+        """
+        Returns the size in entries and bytes and the hit, miss and
+        eviction counters of the cache
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key):
+        super()._remove(key)
+        self.bytes -= self._sizes.pop(key)
+        user_id = self._owners.pop(key)
+        statuses = self._by_user[user_id]
+        statuses.discard(key)
+        if not statuses:
+            del self._by_user[user_id]
+
+    def _is_full(self):
+        return self.bytes > self.max_bytes
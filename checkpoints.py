@@ -0,0 +1,111 @@
+"""
+Checkpoints of the resumable CSV imports.
+
+After every committed batch, the resumable loaders of main.py record how
+far into the file they got, in the same transaction as the batch. A file
+is recognised by a fingerprint of its first bytes rather than by its name,
+so an import resumes after the file is moved or more rows are appended to
+it, and a file already imported up to its last byte is skipped.
+"""
+import csv
+import hashlib
+import os
+
+from loguru import logger
+
+# Bytes at the start of a file that make up its fingerprint
+FINGERPRINT_BYTES = 64 * 1024
+
+CHECKPOINT_TABLE_SQL = ('CREATE TABLE IF NOT EXISTS "import_checkpoint" ('
+                        '"fingerprint" TEXT NOT NULL PRIMARY KEY, '
+                        '"file" TEXT NOT NULL, '
+                        '"offset" INTEGER NOT NULL)')
+
+
+def file_fingerprint(file):
+    """
+    Returns a hex digest of the first FINGERPRINT_BYTES bytes of file.
+    Appending rows to a file larger than that keeps its fingerprint.
+
+    Raises FileNotFoundError if the file can't be found.
+    """
+    with open(file, "rb") as csv_file:
+        return hashlib.sha256(csv_file.read(FINGERPRINT_BYTES)).hexdigest()
+
+
+def create_checkpoint_table(database):
+    """
+    Creates the import_checkpoint table in database if it doesn't exist
+    """
+    database.execute_sql(CHECKPOINT_TABLE_SQL)
+
+
+def get_checkpoint(database, fingerprint):
+    """
+    Returns the byte offset up to which the file with fingerprint was
+    imported, or 0 if it never was.
+    """
+    row = database.execute_sql('SELECT "offset" FROM "import_checkpoint" '
+                               'WHERE "fingerprint" = ?', (fingerprint,)).fetchone()
+    return row[0] if row else 0
+
+
+def save_checkpoint(database, fingerprint, file, offset):
+    """
+    Records that the file with fingerprint was imported up to offset
+    """
+    database.execute_sql('INSERT OR REPLACE INTO "import_checkpoint" '
+                         '("fingerprint", "file", "offset") VALUES (?, ?, ?)',
+                         (fingerprint, os.fspath(file), offset))
+
+
+def resume_offset(file, offset):
+    """
+    Returns offset if file can resume there, that is if the byte before
+    offset ends a line, or if offset is the end of the file, which a file
+    without a trailing newline was fully imported up to. Otherwise, or if
+    the file is now shorter than offset, it was rewritten since the
+    checkpoint and the import starts over from 0.
+    """
+    if offset == 0:
+        return 0
+    if offset == os.path.getsize(file):
+        return offset
+    with open(file, "rb") as csv_file:
+        csv_file.seek(offset - 1)
+        if csv_file.read(1) == b"\n":
+            return offset
+    logger.warning("{} changed since it was imported up to byte {}, starting over",
+                   file, offset)
+    return 0
+
+
+def read_csv_chunks(file, offset, chunk_size):
+    """
+    Reads the CSV file from byte offset, which must be 0 or the start of
+    a record, and yields (rows, end) where rows is a list of at most
+    chunk_size dicts keyed by the header, like DictReader rows, and end
+    is the byte offset right after the last of them.
+    """
+    with open(file, "rb") as csv_file:
+        header = next(csv.reader([csv_file.readline().decode("utf-8-sig")]), [])
+        csv_file.seek(max(offset, csv_file.tell()))
+        position = [csv_file.tell()]
+
+        def lines():
+            # csv.reader pulls lines one record at a time, so after each
+            # record position is the offset where the next one starts
+            for line in csv_file:
+                position[0] += len(line)
+                yield line.decode("utf-8")
+
+        rows = []
+        for record in csv.reader(lines()):
+            if not record:
+                continue
+            rows.append(dict(zip(header, record)))
+            if len(rows) == chunk_size:
+                yield rows, position[0]
+                rows = []
+        if rows:
+            yield rows, position[0]
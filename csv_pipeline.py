@@ -0,0 +1,155 @@
+"""
+Pipelined CSV parsing for the account and status loaders.
+
+The input file is split into byte ranges aligned to line boundaries. The
+ranges are parsed and validated in a process pool while the calling thread,
+which owns the SQLite connection, writes the parsed batches. A bounded queue
+between the two keeps memory flat when the writer falls behind.
+
+Records are expected to fit on one line, as in accounts.csv and
+sample_status.csv: a quoted field containing a newline would be cut in two
+at a range boundary.
+"""
+import csv
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Full, Queue
+
+from loguru import logger
+
+# Bytes of CSV parsed by a worker per task
+RANGE_SIZE = 1024 * 1024
+# Parsed batches waiting for the writer
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+def split_ranges(file, range_size=RANGE_SIZE):
+    """
+    Reads the header of a CSV file and splits the rest of it into
+    (start, end) byte ranges of about range_size bytes, each ending
+    on a line boundary.
+
+    Returns the header as a list of column names and the list of ranges.
+    """
+    with open(file, "rb") as csv_file:
+        header = next(csv.reader([csv_file.readline().decode("utf-8-sig")]), [])
+        start = csv_file.tell()
+        size = os.fstat(csv_file.fileno()).st_size
+        ranges = []
+        while start < size:
+            csv_file.seek(min(start + range_size, size))
+            csv_file.readline()
+            end = min(csv_file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def parse_range(file, start, end, indexes):
+    """
+    Parses the CSV lines between byte offsets start and end and picks the
+    columns at the given indexes from every record.
+
+    Runs in a worker process. Returns the list of valid row tuples and the
+    number of records rejected because a column is missing or empty.
+    """
+    with open(file, "rb") as csv_file:
+        csv_file.seek(start)
+        lines = csv_file.read(end - start).decode("utf-8").splitlines()
+    rows = []
+    rejected = 0
+    for record in csv.reader(lines):
+        if not record:
+            continue
+        try:
+            values = tuple(record[index] for index in indexes)
+        except IndexError:
+            rejected += 1
+            continue
+        if all(values):
+            rows.append(values)
+        else:
+            rejected += 1
+    return rows, rejected
+
+
+def _put(out, item, stop):
+    """
+    Blocks until item fits in the queue, unless the consumer has stopped.
+    """
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return
+        except Full:
+            continue
+
+
+def _produce(file, ranges, indexes, workers, out, stop):
+    """
+    Submits the ranges to a process pool, keeping a bounded number of them
+    in flight, and queues their results in file order.
+    """
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for start, end in ranges:
+                if stop.is_set():
+                    break
+                pending.append(pool.submit(parse_range, file, start, end, indexes))
+                if len(pending) >= 2 * workers:
+                    _put(out, pending.popleft().result(), stop)
+            while pending and not stop.is_set():
+                _put(out, pending.popleft().result(), stop)
+            for future in pending:
+                future.cancel()
+        _put(out, _DONE, stop)
+    except Exception as error:  # pylint: disable=W0703
+        logger.error("Failed to parse {}: {}", file, error)
+        _put(out, error, stop)
+
+
+def parse_in_parallel(file, columns, workers=None, range_size=RANGE_SIZE,
+                      queue_size=QUEUE_SIZE):
+    """
+    Parses a CSV file in a pool of worker processes and yields, in file
+    order, (rows, rejected) batches where rows is a list of tuples with
+    the values of columns and rejected counts the invalid records.
+
+    Raises FileNotFoundError if the file can't be found and ValueError if
+    the header lacks one of the columns.
+    """
+    header, ranges = split_ranges(file, range_size)
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise ValueError(f"{file} has no column(s) {', '.join(missing)}")
+    indexes = tuple(header.index(column) for column in columns)
+    workers = workers or os.cpu_count() or 1
+
+    out = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce,
+                                args=(file, ranges, indexes, workers, out, stop),
+                                daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = out.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Unblock the producer if it is waiting on a full queue
+        try:
+            while True:
+                out.get_nowait()
+        except Empty:
+            pass
+        producer.join()
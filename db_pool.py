@@ -0,0 +1,48 @@
+"""
+Pooled database mode for serving many threads at once
+"""
+from playhouse.pool import PooledSqliteDatabase
+
+from loguru import logger
+
+from socialnetwork_model import UsersTable, UserStatusTable
+
+# Connections the pool hands out at most, one per thread
+MAX_CONNECTIONS = 8
+# Milliseconds a writer waits for the SQLite write lock before giving up
+BUSY_TIMEOUT = 5000
+# Seconds a thread waits for a free connection when the pool is exhausted
+POOL_TIMEOUT = 30
+
+
+def init_pooled_database(filename="users.db", max_connections=MAX_CONNECTIONS,
+                         busy_timeout=BUSY_TIMEOUT, pool_timeout=POOL_TIMEOUT):
+    """
+    Opens filename as a pooled database and binds UsersTable and
+    UserStatusTable to it. Pass the result to UserCollection and
+    UserStatusCollection like the default database.
+
+    Every thread gets its own connection from the pool the first time it
+    queries. The database is switched to WAL journal mode so that readers
+    never wait behind the writer, and writers wait up to busy_timeout
+    milliseconds for each other. A thread hands its connection back with
+    database.close(), or by running its work in database.connection_context().
+    Once max_connections are in use, other threads wait up to pool_timeout
+    seconds for one (0 waits forever) before MaxConnectionsExceeded is raised.
+    """
+    database = PooledSqliteDatabase(
+        filename,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        check_same_thread=False,
+        pragmas={
+            "journal_mode": "wal",
+            "foreign_keys": 1,
+            "busy_timeout": busy_timeout,
+            # In WAL mode this only risks the last commits on a power loss
+            "synchronous": "normal",
+        },
+    )
+    database.bind([UsersTable, UserStatusTable])
+    logger.info("Opened {} with a pool of {} connections", filename, max_connections)
+    return database
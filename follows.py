@@ -0,0 +1,257 @@
+"""
+Follow graph and precomputed home feeds.
+
+FollowsTable holds who follows whom. When a status is added, its id is
+copied into the FeedTable rows of every follower of its author (fan-out
+on write), so that reading a home feed is one range scan of the primary
+key (owner_id, seq). Authors with more than fanout_limit followers are
+marked in CelebrityTable and skipped by the fan-out: their statuses are
+merged into the feeds of their followers when the feeds are read
+(fan-out on read), which keeps a single status from writing millions of
+feed rows.
+
+seq is the rowid of the status in userstatustable, so feeds list the
+newest statuses first.
+"""
+# pylint: disable=R0903
+import heapq
+
+from peewee import (CompositeKey, ForeignKeyField, IntegerField, IntegrityError, Model,
+                    chunked)
+
+from loguru import logger
+
+from metrics import instrumented
+from rows import StatusRow
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from user_status import PAGE_SIZE
+from users import SQLITE_MAX_VARIABLES
+
+# Authors with more followers than this are read at feed time instead
+FANOUT_LIMIT = 1000
+# Recent statuses of an account copied into a feed when it is followed
+FOLLOW_BACKFILL = 50
+# Larger than any rowid, the cursor of a first page
+NO_CURSOR = 2 ** 63 - 1
+
+
+class FollowsTable(Model):
+    """
+    follower follows followed. The primary key starts with followed to
+    find the followers of an author during fan-out.
+    """
+    followed = ForeignKeyField(UsersTable, column_name="followed_id", on_delete="CASCADE",
+                               index=False)
+    follower = ForeignKeyField(UsersTable, column_name="follower_id", on_delete="CASCADE")
+
+    class Meta:
+        database = database
+        primary_key = CompositeKey("followed", "follower")
+        without_rowid = True
+
+
+class FeedTable(Model):
+    """
+    The status with rowid seq is in the home feed of owner
+    """
+    owner = ForeignKeyField(UsersTable, column_name="owner_id", on_delete="CASCADE",
+                            index=False)
+    seq = IntegerField()
+    status = ForeignKeyField(UserStatusTable, column_name="status_id", on_delete="CASCADE")
+
+    class Meta:
+        database = database
+        primary_key = CompositeKey("owner", "seq")
+        without_rowid = True
+
+
+class CelebrityTable(Model):
+    """
+    Users whose statuses are not fanned out, see FANOUT_LIMIT
+    """
+    user = ForeignKeyField(UsersTable, column_name="user_id", primary_key=True,
+                           on_delete="CASCADE")
+
+    class Meta:
+        database = database
+
+
+FOLLOW_MODELS = (FollowsTable, FeedTable, CelebrityTable)
+
+FANOUT_SQL = ('INSERT OR IGNORE INTO "feedtable" ("owner_id", "seq", "status_id") '
+              'SELECT w."follower_id", s.rowid, s."status_id" FROM "userstatustable" AS s '
+              'JOIN "followstable" AS w ON w."followed_id" = s."user_id" '
+              'WHERE s."status_id" IN ({}) '
+              'AND s."user_id" NOT IN (SELECT "user_id" FROM "celebritytable")')
+BACKFILL_SQL = ('INSERT OR IGNORE INTO "feedtable" ("owner_id", "seq", "status_id") '
+                'SELECT ?, s.rowid, s."status_id" FROM "userstatustable" AS s '
+                'WHERE s."user_id" = ? ORDER BY s.rowid DESC LIMIT ?')
+UNFOLLOW_FEED_SQL = ('DELETE FROM "feedtable" WHERE "owner_id" = ? AND "status_id" IN '
+                     '(SELECT "status_id" FROM "userstatustable" WHERE "user_id" = ?)')
+FEED_SQL = ('SELECT f."seq", s."status_id", s."user_id", s."status_text" '
+            'FROM "feedtable" AS f JOIN "userstatustable" AS s ON s."status_id" = f."status_id" '
+            'WHERE f."owner_id" = ? AND f."seq" < ? ORDER BY f."seq" DESC LIMIT ?')
+FOLLOWED_CELEBRITIES_SQL = ('SELECT w."followed_id" FROM "followstable" AS w '
+                            'JOIN "celebritytable" AS c ON c."user_id" = w."followed_id" '
+                            'WHERE w."follower_id" = ?')
+AUTHOR_FEED_SQL = ('SELECT s.rowid, s."status_id", s."user_id", s."status_text" '
+                   'FROM "userstatustable" AS s WHERE s."user_id" = ? AND s.rowid < ? '
+                   'ORDER BY s.rowid DESC LIMIT ?')
+
+
+class FollowCollection:
+    """
+    Follow relationships between users and their home feeds.
+
+    Pass it to UserStatusCollection as feed so that add_status and
+    add_statuses fan the new statuses out. The tables are created on
+    first use. metrics is an optional metrics.Metrics recording every call.
+    """
+
+    def __init__(self, database, fanout_limit=FANOUT_LIMIT, metrics=None):
+        # pylint: disable=W0621
+        self.database = database
+        self.fanout_limit = fanout_limit
+        self.metrics = metrics
+        self._created = False
+
+    def _create_tables(self):
+        """
+        Creates the follow and feed tables in the database if needed
+        """
+        if not self._created:
+            with self.database.bind_ctx(FOLLOW_MODELS, bind_refs=False, bind_backrefs=False):
+                self.database.create_tables(FOLLOW_MODELS)
+            self._created = True
+
+    def _follower_count(self, user_id, limit):
+        """
+        Counts the followers of user_id, stopping at limit
+        """
+        return self.database.execute_sql(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM "followstable" WHERE "followed_id" = ? '
+            'LIMIT ?)', (user_id, limit)).fetchone()[0]
+
+    def _is_celebrity(self, user_id):
+        """
+        Tells whether the statuses of user_id are left out of the fan-out
+        """
+        return self.database.execute_sql(
+            'SELECT 1 FROM "celebritytable" WHERE "user_id" = ?', (user_id,)).fetchone() is not None
+
+    @instrumented
+    def follow(self, follower_id, followed_id):
+        """
+        follower_id starts following followed_id, whose recent statuses
+        are added to the home feed of follower_id.
+
+        Returns False if either user does not exist, if it is the same
+        user, or if follower_id already follows followed_id.
+        """
+        if follower_id == followed_id:
+            return False
+        self._create_tables()
+        try:
+            with self.database.transaction("immediate"):
+                FollowsTable.insert(followed=followed_id,
+                                    follower=follower_id).execute(self.database)
+                if self._is_celebrity(followed_id):
+                    logger.debug("{} is read at feed time", followed_id)
+                elif self._follower_count(followed_id, self.fanout_limit + 1) > self.fanout_limit:
+                    CelebrityTable.insert(user=followed_id).execute(self.database)
+                    logger.info("{} has more than {} followers, its statuses are no longer "
+                                "fanned out", followed_id, self.fanout_limit)
+                else:
+                    self.database.execute_sql(BACKFILL_SQL,
+                                              (follower_id, followed_id, FOLLOW_BACKFILL))
+            logger.info("{} follows {}", follower_id, followed_id)
+            return True
+        except IntegrityError:
+            logger.error("{} cannot follow {}", follower_id, followed_id)
+            return False
+
+    @instrumented
+    def unfollow(self, follower_id, followed_id):
+        """
+        follower_id stops following followed_id, whose statuses leave the
+        home feed of follower_id.
+
+        Returns False if follower_id was not following followed_id.
+        """
+        self._create_tables()
+        with self.database.transaction("immediate"):
+            deleted = (FollowsTable.delete()
+                       .where((FollowsTable.followed == followed_id)
+                              & (FollowsTable.follower == follower_id))
+                       .execute(self.database))
+            if deleted:
+                self.database.execute_sql(UNFOLLOW_FEED_SQL, (follower_id, followed_id))
+        if not deleted:
+            logger.error("{} does not follow {}", follower_id, followed_id)
+            return False
+        logger.info("{} unfollowed {}", follower_id, followed_id)
+        return True
+
+    @instrumented
+    def following(self, user_id):
+        """
+        Returns the list of the user_ids followed by user_id
+        """
+        self._create_tables()
+        query = (FollowsTable.select(FollowsTable.followed)
+                 .where(FollowsTable.follower == user_id)
+                 .tuples())
+        return [followed_id for (followed_id,) in query.iterator(self.database)]
+
+    @instrumented
+    def follower_count(self, user_id):
+        """
+        Returns the number of followers of user_id
+        """
+        self._create_tables()
+        return self._follower_count(user_id, -1)
+
+    def fan_out(self, status_ids):
+        """
+        Adds the statuses of status_ids, already in userstatustable, to
+        the home feeds of the followers of their authors, except the
+        statuses of celebrities. Call it in the transaction that adds the
+        statuses. Returns the number of feed rows written.
+        """
+        self._create_tables()
+        written = 0
+        for batch in chunked(status_ids, SQLITE_MAX_VARIABLES):
+            cursor = self.database.execute_sql(FANOUT_SQL.format(", ".join("?" * len(batch))),
+                                               batch)
+            written += cursor.rowcount
+        return written
+
+    @instrumented
+    def home_feed(self, user_id, cursor=None, page_size=PAGE_SIZE):
+        """
+        Returns a page of the statuses of the accounts user_id follows,
+        newest first, as rows.StatusRow tuples, and the cursor to pass to
+        get the next page, which is None on the last page.
+
+        The fanned-out statuses come from one range scan of the feed of
+        user_id; those of followed celebrities from one index scan each.
+        """
+        self._create_tables()
+        before = NO_CURSOR if cursor is None else cursor
+        with self.database.transaction():
+            sources = [self.database.execute_sql(FEED_SQL, (user_id, before, page_size + 1))]
+            for (celebrity_id,) in self.database.execute_sql(FOLLOWED_CELEBRITIES_SQL,
+                                                             (user_id,)).fetchall():
+                sources.append(self.database.execute_sql(
+                    AUTHOR_FEED_SQL, (celebrity_id, before, page_size + 1)))
+            page = []
+            # The feed may still hold statuses a celebrity posted before it became one
+            for row in heapq.merge(*sources, key=lambda row: row[0], reverse=True):
+                if page and row[0] == page[-1][0]:
+                    continue
+                page.append(row)
+                if len(page) > page_size:
+                    break
+        next_cursor = page[page_size - 1][0] if len(page) > page_size else None
+        logger.info("Read {} statuses of the feed of {}", len(page[:page_size]), user_id)
+        return [StatusRow._make(row[1:]) for row in page[:page_size]], next_cursor
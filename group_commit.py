@@ -0,0 +1,131 @@
+"""
+Write-behind buffer with group commit for add_status.
+
+Every UserStatusCollection.add_status commits its own transaction, so a
+high rate of posts is bound by the commit latency. GroupCommitWriter
+instead buffers the statuses and a background thread commits them
+together through add_statuses, in one transaction every interval
+seconds or every max_rows statuses, whichever comes first.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from loguru import logger
+
+# Seconds a buffered status waits at most for others to share its commit
+FLUSH_INTERVAL = 0.005
+# Statuses committed at most per transaction
+FLUSH_ROWS = 500
+
+
+class GroupCommitWriter:
+    """
+    Buffers add_status calls for status_collection, a UserStatusCollection,
+    and commits them in groups on a flusher thread.
+
+    add_status returns a concurrent.futures.Future that resolves once the
+    status is committed, to True, or to False like add_status when the
+    user does not exist or the status_id already does. Since the flusher
+    thread does the writes, the database must not be an in-memory one,
+    which peewee opens separately for every thread.
+    Use it as a context manager, or call close(), to commit what is left.
+    """
+
+    def __init__(self, status_collection, interval=FLUSH_INTERVAL, max_rows=FLUSH_ROWS):
+        self.status_collection = status_collection
+        self.interval = interval
+        self.max_rows = max_rows
+        # (status, future) pairs waiting for the next commit
+        self._buffer = []
+        # Groups commit in order, so this future resolves after all the others
+        self._last = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="socialnetwork-group-commit",
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_status(self, status_id, user_id, status_text):
+        """
+        Buffers a status and returns the future of its result
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("GroupCommitWriter is closed")
+            self._buffer.append(((status_id, user_id, status_text), future))
+            self._last = future
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_rows:
+                self._condition.notify()
+        return future
+
+    def flush(self):
+        """
+        Waits until every status buffered so far is committed
+        """
+        last = self._last
+        if last is not None:
+            last.exception()
+
+    def close(self):
+        """
+        Commits the buffered statuses and stops the flusher thread
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _take(self):
+        """
+        Waits for a group to commit: max_rows statuses, or the statuses
+        buffered interval seconds after the first. Returns an empty list
+        once closed with nothing left.
+        """
+        with self._condition:
+            while not self._buffer and not self._closed:
+                self._condition.wait()
+            deadline = time.monotonic() + self.interval
+            while len(self._buffer) < self.max_rows and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            group = self._buffer[:self.max_rows]
+            del self._buffer[:self.max_rows]
+            return group
+
+    def _run(self):
+        """
+        Commits groups until closed
+        """
+        while True:
+            group = self._take()
+            if not group:
+                return
+            self._commit(group)
+
+    def _commit(self, group):
+        """
+        Adds a group of statuses in one transaction and resolves their futures
+        """
+        statuses = [status for status, _ in group]
+        try:
+            report = self.status_collection.add_statuses(statuses)
+        except Exception as error:  # pylint: disable=W0703
+            logger.error("Failed to commit {} statuses: {}", len(group), error)
+            for _, future in group:
+                future.set_exception(error)
+            return
+        # The report holds the very tuples that were left out
+        rejected = {id(status) for status in report["orphaned"] + report["duplicates"]}
+        for status, future in group:
+            future.set_result(id(status) not in rejected)
+        logger.debug("Group committed {} statuses", report["inserted"])
@@ -0,0 +1,46 @@
+"""
+Deferred imports for the entry points.
+
+main.py and menu.py reach most of the project through modules they only
+need for some commands. Importing socialnetwork_model also opens users.db,
+peewee alone takes longer to import than the rest of a short run, and
+loguru brings in asyncio and multiprocessing.
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    Stands for the module name, which is imported the first time one of
+    its attributes is read
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+class LazyAttribute:
+    """
+    Stands for the attribute of the module name, such as the logger of
+    loguru, which is imported the first time the attribute is used
+    """
+
+    def __init__(self, name, attribute):
+        self._name = name
+        self._attribute = attribute
+        self._target = None
+
+    def __getattr__(self, attribute):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._name), self._attribute)
+        return getattr(self._target, attribute)
@@ -0,0 +1,45 @@
+"""
+Central logging setup for the social network project.
+
+Modules only call logger.debug/info/... with "{}" placeholders and
+arguments rather than f-strings: loguru formats the message only when a
+sink accepts its level, so dropped messages cost next to nothing.
+"""
+import sys
+
+from lazy import LazyAttribute
+
+# loguru is only imported once something logs or configures it
+logger = LazyAttribute("loguru", "logger")
+
+LOG_FILE = 'loguru_file_{time:YYYY-MM-DD}.log'
+
+# When True, echo() prints nothing; see configure_logging(quiet=...)
+QUIET = False
+
+
+def configure_logging(level='DEBUG', console_level='WARNING', quiet=False, enqueue=True):
+    """
+    Replaces the loguru sinks with a file sink at level and a stderr sink at
+    console_level. Pass level=None or console_level=None to leave one out.
+
+    With enqueue, messages go through a queue and a background thread
+    writes them, so logging never waits on the disk. quiet turns off the
+    console messages the collection classes print with echo().
+    """
+    global QUIET  # pylint: disable=W0603
+    logger.remove()
+    if level is not None:
+        logger.add(LOG_FILE, level=level, enqueue=enqueue)
+    if console_level is not None:
+        logger.add(sys.stderr, level=console_level, enqueue=enqueue)
+    QUIET = quiet
+
+
+def echo(message, *args):
+    """
+    Prints message, formatted with args like the logger messages,
+    unless quiet mode is on
+    """
+    if not QUIET:
+        print(message.format(*args) if args else message)
@@ -1,36 +1,162 @@
 """
 main driver for a simple social network project
 """
-import sys
+import csv
+import os
 from csv import DictReader
+from itertools import islice
+
+from lazy import LazyAttribute, LazyModule
+from log_config import echo
+
+# Imported on first use, see lazy.py. Logging is set up by the entry
+# points with log_config.configure_logging(), never on import.
+logger = LazyAttribute("loguru", "logger")
+bloom = LazyModule("bloom")
+checkpoints = LazyModule("checkpoints")
+csv_pipeline = LazyModule("csv_pipeline")
+follows = LazyModule("follows")
+group_commit = LazyModule("group_commit")
+gzip = LazyModule("gzip")
+json = LazyModule("json")
+mmap_csv = LazyModule("mmap_csv")
+replica = LazyModule("replica")
+shards = LazyModule("shards")
+socialnetwork_model = LazyModule("socialnetwork_model")
+user_status = LazyModule("user_status")
+users = LazyModule("users")
+
+# Number of CSV rows committed per transaction by the bulk loaders
+LOAD_CHUNK_SIZE = 1000
+ACCOUNT_COLUMNS = ("USER_ID", "NAME", "LASTNAME", "EMAIL")
+STATUS_COLUMNS = ("STATUS_ID", "USER_ID", "STATUS_TEXT")
+# Directory of the database files of init_shards
+SHARD_DIRECTORY = "shards"
+
+
+def init_user_collection(cache=None, status_cache=None, metrics=None, user_replica=None,
+                         row_mode=False, user_filter=None):
+    """
+    Creates and returns a new instance of UserCollection,
+    optionally reading through a cache.LRUCache. Pass the
+    status collection's cache.StatusCache as status_cache
+    so deleted users' statuses are dropped from it, a
+    metrics.Metrics to record every call, and the result of
+    init_user_replica() to answer searches from memory.
+    row_mode makes searches return rows.UserRow tuples.
+    Pass the result of init_user_filter() as user_filter to
+    skip the queries for user_ids that don't exist.
+    """
+    return users.UserCollection(socialnetwork_model.database, cache=cache,
+                                status_cache=status_cache, metrics=metrics,
+                                replica=user_replica, row_mode=row_mode,
+                                user_filter=user_filter)
+
+
+def init_user_replica():
+    """
+    Loads and returns a replica.UserReplica of UsersTable.
+
+    Loading it adds triggers that log the user_id of every insert,
+    update and delete on UsersTable, from any connection: one more row
+    written per user written, bulk loads included. The replica deletes
+    the entries it has applied each time it refreshes; call
+    replica.drop_change_log(database) once no replica is used anymore.
+    """
+    return replica.UserReplica(socialnetwork_model.database).load()
+
+
+def init_status_collection(cache=None, metrics=None, row_mode=False, feed=None,
+                           status_filter=None, user_filter=None):
+    """
+    Creates and returns a new instance of UserStatusCollection,
+    optionally reading through a cache.StatusCache and
+    recording every call in a metrics.Metrics. row_mode makes
+    searches return rows.StatusRow tuples. Pass the result of
+    init_follow_collection() as feed to fill the home feeds,
+    and those of init_status_filter() and init_user_filter()
+    to skip the queries for ids that don't exist.
+    Creates the index list_statuses pages through if missing.
+    """
+    sc_instance = user_status.UserStatusCollection(socialnetwork_model.database, cache=cache,
+                                                   metrics=metrics, row_mode=row_mode,
+                                                   feed=feed, status_filter=status_filter,
+                                                   user_filter=user_filter)
+    sc_instance.create_timeline_index()
+    return sc_instance
+
+
+def init_user_filter(error_rate=None, counting=False):
+    """
+    Builds and returns a Bloom filter of the user_ids in the database,
+    a counting one that also forgets deleted users if counting.
+    error_rate defaults to bloom.ERROR_RATE.
+    """
+    return bloom.load_filter(socialnetwork_model.database,
+                             socialnetwork_model.UsersTable.user_id,
+                             error_rate or bloom.ERROR_RATE, counting)
 
-from loguru import logger
-import user_status
-import users
-from socialnetwork_model import database
 
-logger.remove()
-logger.add('loguru_file_{time:YYYY-MM-DD}.log', level='DEBUG')
-logger.add(sys.stderr, level='WARNING')
+def init_status_filter(error_rate=None, counting=False):
+    """
+    Builds and returns a Bloom filter of the status_ids in the database
+    """
+    return bloom.load_filter(socialnetwork_model.database,
+                             socialnetwork_model.UserStatusTable.status_id,
+                             error_rate or bloom.ERROR_RATE, counting)
 
-logger.debug("This is a debug")
-logger.info("This is an info")
-logger.warning("This is a warning")
-logger.error("This is an error")
+
+def init_follow_collection(fanout_limit=None, metrics=None):
+    """
+    Creates and returns a new instance of FollowCollection.
+    fanout_limit defaults to follows.FANOUT_LIMIT.
+    """
+    if fanout_limit is None:
+        fanout_limit = follows.FANOUT_LIMIT
+    return follows.FollowCollection(socialnetwork_model.database, fanout_limit=fanout_limit,
+                                    metrics=metrics)
 
 
-def init_user_collection():
+def init_shards(directory=SHARD_DIRECTORY, count=None):
     """
-    Creates and returns a new instance of UserCollection
+    Opens and returns the count shard databases in directory, by default
+    shards.SHARD_COUNT. Always reopen them with the same count, which
+    decides where each user is.
     """
-    return users.UserCollection(database)
+    return shards.open_shards(directory, count or shards.SHARD_COUNT)
 
 
-def init_status_collection():
+def init_sharded_user_collection(shard_databases, metrics=None, row_mode=False):
     """
-    Creates and returns a new instance of UserStatusCollection
+    Creates and returns a ShardedUserCollection over the result of
+    init_shards(). The bulk loaders split every chunk of the file by
+    shard and insert the parts in parallel through it.
     """
-    return user_status.UserStatusCollection(database)
+    return shards.ShardedUserCollection(shard_databases, metrics=metrics, row_mode=row_mode)
+
+
+def init_sharded_status_collection(shard_databases, metrics=None, row_mode=False):
+    """
+    Creates and returns a ShardedUserStatusCollection over the result of
+    init_shards(), storing every status on the shard of its user.
+    Creates the index list_statuses pages through on every shard.
+    """
+    sc_instance = shards.ShardedUserStatusCollection(shard_databases, metrics=metrics,
+                                                     row_mode=row_mode)
+    sc_instance.create_timeline_index()
+    return sc_instance
+
+
+def init_group_commit_writer(sc_instance, interval=None, max_rows=None):
+    """
+    Starts and returns a GroupCommitWriter committing the statuses
+    posted through it to sc_instance in groups. Close it when done.
+    interval and max_rows default to group_commit.FLUSH_INTERVAL and
+    group_commit.FLUSH_ROWS.
+    """
+    return group_commit.GroupCommitWriter(sc_instance,
+                                          interval=interval or group_commit.FLUSH_INTERVAL,
+                                          max_rows=max_rows or group_commit.FLUSH_ROWS)
 
 
 def load_accounts_csv_to_db(file, uc_instance):
@@ -60,8 +186,112 @@ def load_accounts_csv_to_db(file, uc_instance):
         logger.info("Successfully loaded users to database.")
         return True
     except FileNotFoundError as error:
-        logger.error(f'Detailed error message: {error}')
-        print(f'Detailed error message: {error}')
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def read_chunks(rows, chunk_size):
+    """
+    Splits an iterable of rows into lists of at most chunk_size rows
+    without reading the whole iterable into memory.
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def csv_row(row, columns):
+    """
+    Converts a DictReader row into a tuple of the given columns, e.g.
+    a (user_id, user_name, user_last_name, email) tuple for ACCOUNT_COLUMNS.
+
+    Returns None if any of the columns is missing or empty.
+    """
+    values = tuple(row.get(column) for column in columns)
+    if not all(values):
+        return None
+    return values
+
+
+def read_csv_rows(csv_file, columns, use_mmap=False):
+    """
+    Yields a tuple of the values of columns for every record of an open
+    CSV file, or None when one of them is missing or empty. With use_mmap,
+    the file is read through mmap_csv.read_tuples instead of DictReader,
+    which allocates much less per record.
+    """
+    if use_mmap:
+        return mmap_csv.read_tuples(csv_file, columns)
+    return (csv_row(row, columns) for row in DictReader(csv_file))
+
+
+def add_accounts_chunk(users_to_add, rejected, uc_instance, report):
+    """
+    Adds a chunk of validated user tuples through uc_instance.add_users
+    and updates the counts of a bulk account load report.
+    """
+    inserted = uc_instance.add_users(users_to_add)
+    report["inserted"] += inserted
+    report["skipped"] += len(users_to_add) - inserted
+    report["rejected"] += rejected
+
+
+def add_statuses_chunk(statuses, rejected, sc_instance, report):
+    """
+    Adds a chunk of validated status tuples through sc_instance.add_statuses
+    and merges the result into a bulk status load report.
+    """
+    chunk_report = sc_instance.add_statuses(statuses)
+    report["inserted"] += chunk_report["inserted"]
+    report["rejected"] += rejected
+    report["orphaned"].extend(chunk_report["orphaned"])
+    report["duplicates"].extend(chunk_report["duplicates"])
+
+
+def log_status_report(report):
+    """
+    Logs the summary of a bulk status load report
+    """
+    logger.info("Bulk loaded {} statuses to database, {} orphaned, {} duplicates, "
+                "{} rejected.", report["inserted"], len(report["orphaned"]),
+                len(report["duplicates"]), report["rejected"])
+
+
+def bulk_load_accounts_csv_to_db(file, uc_instance, chunk_size=LOAD_CHUNK_SIZE,
+                                 use_mmap=False):
+    """
+    Bulk version of load_accounts_csv_to_db. Streams the CSV file in
+    chunks of chunk_size rows and inserts each chunk into UsersTable in
+    a single transaction with multi-row INSERT statements. use_mmap reads
+    the file with the faster memory-mapped reader of mmap_csv.py. With a
+    ShardedUserCollection, every chunk is split by shard and the parts
+    are inserted in parallel, a transaction per shard.
+
+    Requirements:
+    - If a user_id already exists, it
+    will ignore it and continue to the
+    next.
+    - Returns False if the file can't be found
+    - Otherwise, it returns a dict counting the rows that were
+    'inserted', 'skipped' (user_id already exists) and 'rejected'
+    (missing or empty columns).
+    """
+    report = {"inserted": 0, "skipped": 0, "rejected": 0}
+    try:
+        with open(file, "r", encoding="utf-8") as user_file:
+            rows = read_csv_rows(user_file, ACCOUNT_COLUMNS, use_mmap)
+            for chunk in read_chunks(rows, chunk_size):
+                valid = [user for user in chunk if user is not None]
+                add_accounts_chunk(valid, len(chunk) - len(valid), uc_instance, report)
+        logger.info("Bulk loaded users to database: {}", report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
         return False
 
 
@@ -91,8 +321,279 @@ def load_status_csv_to_db(file, sc_instance):
         logger.info("Successfully loaded status data to database.")
         return True
     except FileNotFoundError as error:
-        logger.error(f'Detailed error message: {error}')
-        print(f'Detailed error message: {error}')
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def bulk_load_status_csv_to_db(file, sc_instance, chunk_size=LOAD_CHUNK_SIZE,
+                               use_mmap=False):
+    """
+    Bulk version of load_status_csv_to_db. Streams the CSV file in
+    chunks of chunk_size rows. The user_ids of each chunk are checked
+    against UsersTable with one query, then all the valid statuses of the
+    chunk are inserted in a single transaction. use_mmap reads the file
+    with the faster memory-mapped reader of mmap_csv.py. With a
+    ShardedUserStatusCollection, every chunk is split by shard like
+    the accounts.
+
+    Requirements:
+    - Statuses whose user_id does not exist, or whose status_id already
+    exists, are left out and the load continues.
+    - Returns False if the file can't be found
+    - Otherwise, it returns a dict with the number of statuses 'inserted'
+    and 'rejected' (missing or empty columns), and the lists of 'orphaned'
+    and 'duplicates' (status_id, user_id, status_text) rows.
+    """
+    report = {"inserted": 0, "rejected": 0, "orphaned": [], "duplicates": []}
+    try:
+        with open(file, "r", encoding="utf-8") as status_file:
+            rows = read_csv_rows(status_file, STATUS_COLUMNS, use_mmap)
+            for chunk in read_chunks(rows, chunk_size):
+                valid = [status for status in chunk if status is not None]
+                add_statuses_chunk(valid, len(chunk) - len(valid), sc_instance, report)
+        log_status_report(report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def parallel_load_accounts_csv_to_db(file, uc_instance, workers=None):
+    """
+    Pipelined version of bulk_load_accounts_csv_to_db. The file is parsed
+    in a pool of worker processes while this thread, which owns the
+    database connection, inserts the parsed batches.
+
+    Requirements:
+    - If a user_id already exists, it
+    will ignore it and continue to the
+    next.
+    - Returns False if the file can't be found
+    - Otherwise, it returns the same report as bulk_load_accounts_csv_to_db.
+    """
+    report = {"inserted": 0, "skipped": 0, "rejected": 0}
+    try:
+        for users_to_add, rejected in csv_pipeline.parse_in_parallel(
+                file, ACCOUNT_COLUMNS, workers):
+            add_accounts_chunk(users_to_add, rejected, uc_instance, report)
+        logger.info("Bulk loaded users to database: {}", report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def parallel_load_status_csv_to_db(file, sc_instance, workers=None):
+    """
+    Pipelined version of bulk_load_status_csv_to_db. The file is parsed
+    in a pool of worker processes while this thread, which owns the
+    database connection, inserts the parsed batches.
+
+    Requirements:
+    - Statuses whose user_id does not exist, or whose status_id already
+    exists, are left out and the load continues.
+    - Returns False if the file can't be found
+    - Otherwise, it returns the same report as bulk_load_status_csv_to_db.
+    """
+    report = {"inserted": 0, "rejected": 0, "orphaned": [], "duplicates": []}
+    try:
+        for statuses, rejected in csv_pipeline.parse_in_parallel(
+                file, STATUS_COLUMNS, workers):
+            add_statuses_chunk(statuses, rejected, sc_instance, report)
+        log_status_report(report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def open_export(file, compress):
+    """
+    Opens file for writing text, through gzip if compress is True
+    """
+    if compress:
+        return gzip.open(file, "wt", encoding="utf-8", newline="")
+    return open(file, "w", encoding="utf-8", newline="")
+
+
+def write_export(rows, export_file, columns, file_format):
+    """
+    Writes tuples of the given columns to an open file, as CSV with a
+    header row like the loaders read, or as one JSON object per line.
+    Returns the number of rows written.
+    """
+    count = 0
+    if file_format == "jsonl":
+        for row in rows:
+            export_file.write(json.dumps(dict(zip(columns, row))) + "\n")
+            count += 1
+    else:
+        writer = csv.writer(export_file, lineterminator="\n")
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def export_rows(rows, file, columns, file_format=None, compress=None):
+    """
+    Streams rows to file. file_format is "csv" or "jsonl", and compress
+    turns gzip on; by default both follow the file name, e.g.
+    users.jsonl.gz is gzipped JSON Lines and users.csv plain CSV.
+
+    Returns False if the file can't be created, otherwise the number of
+    rows exported.
+    """
+    name = file.lower()
+    if compress is None:
+        compress = name.endswith(".gz")
+    if file_format is None:
+        file_format = "jsonl" if name.removesuffix(".gz").endswith(".jsonl") else "csv"
+    try:
+        with open_export(file, compress) as export_file:
+            count = write_export(rows, export_file, columns, file_format)
+        logger.info("Exported {} rows to {}", count, file)
+        return count
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def export_accounts(file, uc_instance, file_format=None, compress=None):
+    """
+    Exports UsersTable to file, in the USER_ID,NAME,LASTNAME,EMAIL layout
+    that load_accounts_csv_to_db reads, or as JSON Lines with the same
+    keys. Users are streamed from the database, so memory use doesn't
+    grow with the table.
+
+    Requirements:
+    - file_format is "csv" or "jsonl" and compress turns gzip on; by
+    default both are guessed from the file name (.csv, .jsonl, .gz).
+    - Returns False if the file can't be created
+    - Otherwise, it returns the number of users exported.
+    """
+    return export_rows(uc_instance.iter_user_rows(), file, ACCOUNT_COLUMNS,
+                       file_format, compress)
+
+
+def export_statuses(file, sc_instance, file_format=None, compress=None):
+    """
+    Exports UserStatusTable to file, in the STATUS_ID,USER_ID,STATUS_TEXT
+    layout that load_status_csv_to_db reads, or as JSON Lines with the
+    same keys. Statuses are streamed from the database, so memory use
+    doesn't grow with the table.
+
+    Requirements:
+    - file_format is "csv" or "jsonl" and compress turns gzip on; by
+    default both are guessed from the file name (.csv, .jsonl, .gz).
+    - Returns False if the file can't be created
+    - Otherwise, it returns the number of statuses exported.
+    """
+    return export_rows(sc_instance.iter_status_rows(), file, STATUS_COLUMNS,
+                       file_format, compress)
+
+
+def resumable_load(file, collection, columns, add_chunk, report, chunk_size):
+    """
+    Loads a CSV file chunk_size rows at a time through add_chunk, starting
+    from the checkpoint of the file in the collection's database. Each
+    chunk and the new checkpoint are committed in the same transaction,
+    so a crash loses at most the chunk in progress.
+
+    Fills in report, with 'resumed_at' set to the byte offset the load
+    started from and 'already_imported' to True if there was nothing
+    left to load. Raises FileNotFoundError if the file can't be found, and
+    TypeError if the collection has no database of its own to keep the
+    checkpoint in, as the sharded collections.
+    """
+    fingerprint = checkpoints.file_fingerprint(file)
+    database = getattr(collection, "database", None)
+    if database is None:
+        raise TypeError(f"Can't checkpoint a load into a {type(collection).__name__}, "
+                        "which has no single database; use the bulk loaders")
+    with database.transaction("immediate"):
+        checkpoints.create_checkpoint_table(database)
+        offset = checkpoints.get_checkpoint(database, fingerprint)
+    offset = checkpoints.resume_offset(file, offset)
+    size = os.path.getsize(file)
+    report["resumed_at"] = offset
+    report["already_imported"] = offset > 0 and offset == size
+    if report["already_imported"]:
+        logger.info("{} was already imported, skipping it", file)
+        return report
+    if offset:
+        logger.info("Resuming the import of {} at byte {}", file, offset)
+    for chunk, end in checkpoints.read_csv_chunks(file, offset, chunk_size):
+        rows = [csv_row(row, columns) for row in chunk]
+        valid = [row for row in rows if row is not None]
+        with database.transaction("immediate"):
+            add_chunk(valid, len(chunk) - len(valid), collection, report)
+            checkpoints.save_checkpoint(database, fingerprint, file, end)
+    with database.transaction("immediate"):
+        # Trailing blank lines are part of the import too
+        checkpoints.save_checkpoint(database, fingerprint, file, size)
+    return report
+
+
+def resumable_load_accounts_csv_to_db(file, uc_instance, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Resumable version of bulk_load_accounts_csv_to_db. After each chunk,
+    the byte offset reached in the file is saved in the import_checkpoint
+    table, and a later call on the same file starts from there. Rows
+    appended to the file since are loaded; a file loaded to its end is
+    skipped.
+
+    Requirements:
+    - If a user_id already exists, it
+    will ignore it and continue to the
+    next.
+    - Returns False if the file can't be found
+    - Raises TypeError for a sharded collection
+    - Otherwise, it returns the report of bulk_load_accounts_csv_to_db
+    for this call, plus 'resumed_at' (the byte offset it started from)
+    and 'already_imported'.
+    """
+    report = {"inserted": 0, "skipped": 0, "rejected": 0}
+    try:
+        resumable_load(file, uc_instance, ACCOUNT_COLUMNS, add_accounts_chunk, report,
+                       chunk_size)
+        logger.info("Bulk loaded users to database: {}", report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
+def resumable_load_status_csv_to_db(file, sc_instance, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Resumable version of bulk_load_status_csv_to_db, checkpointed like
+    resumable_load_accounts_csv_to_db.
+
+    Requirements:
+    - Statuses whose user_id does not exist, or whose status_id already
+    exists, are left out and the load continues.
+    - Returns False if the file can't be found
+    - Raises TypeError for a sharded collection
+    - Otherwise, it returns the report of bulk_load_status_csv_to_db
+    for this call, plus 'resumed_at' (the byte offset it started from)
+    and 'already_imported'.
+    """
+    report = {"inserted": 0, "rejected": 0, "orphaned": [], "duplicates": []}
+    try:
+        resumable_load(file, sc_instance, STATUS_COLUMNS, add_statuses_chunk, report,
+                       chunk_size)
+        log_status_report(report)
+        return report
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
         return False
 
 
@@ -124,6 +625,52 @@ def delete_user(user_id, uc_instance):
     return uc_instance.delete_user(user_id)
 
 
+def delete_users(user_ids, uc_instance, chunk_size=None):
+    """
+    Deletes many users, and their status messages, in transactions of
+    chunk_size users.
+
+    Requirements:
+    - user_ids that don't exist are ignored.
+    - Returns a list with, for every chunk, the number of 'users' and
+    'statuses' deleted.
+    chunk_size defaults to users.DELETE_CHUNK_SIZE.
+    """
+    return uc_instance.delete_users(user_ids, chunk_size or users.DELETE_CHUNK_SIZE)
+
+
+def read_user_ids(user_file):
+    """
+    Yields the user_ids of an open file, one per line, skipping blank lines
+    """
+    for line in user_file:
+        user_id = line.strip()
+        if user_id:
+            yield user_id
+
+
+def delete_users_from_file(file, uc_instance, chunk_size=None):
+    """
+    Deletes the users listed in a text file, one user_id per line,
+    streaming the file through delete_users.
+
+    Requirements:
+    - Returns False if the file can't be found
+    - Otherwise, it returns the list of per-chunk counts of delete_users.
+    """
+    try:
+        with open(file, "r", encoding="utf-8") as user_file:
+            batches = uc_instance.delete_users(read_user_ids(user_file),
+                                               chunk_size or users.DELETE_CHUNK_SIZE)
+        logger.info("Deleted {} users listed in {}",
+                    sum(batch["users"] for batch in batches), file)
+        return batches
+    except FileNotFoundError as error:
+        logger.error('Detailed error message: {}', error)
+        echo('Detailed error message: {}', error)
+        return False
+
+
 def search_user(user_id, uc_instance):
     """
     Searches for a user in our user_collection instance.
@@ -138,6 +685,17 @@ def search_user(user_id, uc_instance):
     return user
 
 
+def search_users(user_ids, uc_instance):
+    """
+    Searches for many users at once in our user_collection instance.
+
+    Requirements:
+    - Returns a dict of the User instances found, keyed by user_id,
+    and the list of user_ids that are not in UsersTable.
+    """
+    return uc_instance.search_users(user_ids)
+
+
 def update_email(user_id, email, uc_instance):
     """
     Updates the email value of an existing user and saves the change in
@@ -150,6 +708,18 @@ def update_email(user_id, email, uc_instance):
     return uc_instance.update_email(user_id, email)
 
 
+def update_emails(emails, uc_instance):
+    """
+    Updates the email of many users at once. emails is a dict of
+    new email by user_id.
+
+    Requirements:
+    - Returns the number of users updated and the list of user_ids
+    that are not in UsersTable.
+    """
+    return uc_instance.update_emails(emails)
+
+
 def add_status(status_id, user_id, status_text, sc_instance):
     """
     Creates a new instance of UserStatus and stores it in our UserStatus
@@ -187,6 +757,48 @@ def search_status(status_id, sc_instance):
     return sc_instance.search_status(status_id)
 
 
+def search_statuses(status_ids, sc_instance):
+    """
+    Searches for many statuses at once in our status_collection instance.
+
+    Requirements:
+    - Returns a dict of the UserStatus instances found, keyed by status_id,
+    and the list of status_ids that are not in UserStatusTable.
+    """
+    return sc_instance.search_statuses(status_ids)
+
+
+def list_statuses(user_id, sc_instance, cursor=None, page_size=None):
+    """
+    Lists the statuses of a user one page at a time.
+
+    Requirements:
+    - Returns the list of UserStatus instances of the page and the cursor
+    to pass to get the next page, or None after the last page.
+    - A user without statuses, or that does not exist, gets an empty page.
+    """
+    return sc_instance.list_statuses(user_id, cursor, page_size or user_status.PAGE_SIZE)
+
+
+def iter_statuses(user_id, sc_instance, page_size=None):
+    """
+    Yields every status of a user without loading them all into memory.
+    """
+    return sc_instance.iter_statuses(user_id, page_size or user_status.PAGE_SIZE)
+
+
+def search_status_text(text, sc_instance, page=1, page_size=None):
+    """
+    Searches the statuses whose text contains every word of text.
+
+    Requirements:
+    - Returns a list of UserStatus instances, best matches first,
+    for the requested page of results.
+    - Returns an empty list if nothing matches.
+    """
+    return sc_instance.search_status_text(text, page, page_size or user_status.PAGE_SIZE)
+
+
 def update_status(status_id, status_text, sc_instance):
     """
     Updates a status text if status_id exists.
@@ -194,3 +806,50 @@ def update_status(status_id, status_text, sc_instance):
     Returns False if the status_id does not exist
     """
     return sc_instance.update_status_text(status_id, status_text)
+
+
+def update_statuses(status_texts, sc_instance):
+    """
+    Updates the text of many statuses at once. status_texts is a dict of
+    new status text by status_id.
+
+    Requirements:
+    - Returns the number of statuses updated and the list of status_ids
+    that are not in UserStatusTable.
+    """
+    return sc_instance.update_status_texts(status_texts)
+
+
+def follow_user(follower_id, followed_id, fc_instance):
+    """
+    Makes follower_id follow followed_id.
+
+    Requirements:
+    - Returns False if either user does not exist or if follower_id
+    already follows followed_id.
+    - Otherwise, it returns True.
+    """
+    return fc_instance.follow(follower_id, followed_id)
+
+
+def unfollow_user(follower_id, followed_id, fc_instance):
+    """
+    Makes follower_id stop following followed_id.
+
+    Requirements:
+    - Returns False if follower_id does not follow followed_id.
+    - Otherwise, it returns True.
+    """
+    return fc_instance.unfollow(follower_id, followed_id)
+
+
+def home_feed(user_id, fc_instance, cursor=None, page_size=None):
+    """
+    Lists the statuses of the accounts a user follows, newest first,
+    one page at a time.
+
+    Requirements:
+    - Returns the list of statuses of the page and the cursor to pass
+    to get the next page, or None after the last page.
+    """
+    return fc_instance.home_feed(user_id, cursor, page_size or user_status.PAGE_SIZE)
@@ -2,13 +2,11 @@
 Provides a basic frontend
 """
 import sys
+import log_config
 import main
+from lazy import LazyAttribute
 
-from loguru import logger
-
-logger.remove()
-logger.add('loguru_file_{time:YYYY-MM-DD}.log', level='DEBUG')
-logger.add(sys.stderr, level='WARNING')
+logger = LazyAttribute("loguru", "logger")
 
 
 def load_accounts_csv_to_db(uc_instance):
@@ -35,8 +33,8 @@ def add_user(uc_instance):
     email = input('User email: ')
     user_name = input('User name: ')
     user_last_name = input('User last name: ')
-    logger.info(f"Calling add_user with user_id")
-    logger.debug(f"add_user parameter user_id: {user_id}")
+    logger.info("Calling add_user with user_id")
+    logger.debug("add_user parameter user_id: {}", user_id)
     if not main.add_user(user_id,
                          email,
                          user_name,
@@ -55,13 +53,44 @@ def delete_user(uc_instance):
     """
     user_id = input("Enter the user_id of the user to delete: ")
     if not main.delete_user(user_id, uc_instance):
-        logger.debug(f'{user_id} does not exist')
+        logger.debug('{} does not exist', user_id)
         print(f"Failed to remove {user_id}. Does not exist!")
     else:
-        logger.debug(f'{user_id} deleted')
+        logger.debug('{} deleted', user_id)
         print(f"Removed {user_id}")
 
 
+def delete_users_from_file(uc_instance):
+    """
+    Deletes the users listed in a file
+    """
+    filename = input('Enter filename of the user_ids to delete: ')
+    batches = main.delete_users_from_file(filename, uc_instance)
+    if batches is not False:
+        print(f"Removed {sum(batch['users'] for batch in batches)} users and "
+              f"{sum(batch['statuses'] for batch in batches)} statuses")
+
+
+def export_accounts(uc_instance):
+    """
+    Exports user accounts to a file
+    """
+    filename = input('Enter filename to export users to (.csv, .jsonl, optionally .gz): ')
+    count = main.export_accounts(filename, uc_instance)
+    if count is not False:
+        print(f"Exported {count} users to {filename}")
+
+
+def export_statuses(sc_instance):
+    """
+    Exports status updates to a file
+    """
+    filename = input('Enter filename to export statuses to (.csv, .jsonl, optionally .gz): ')
+    count = main.export_statuses(filename, sc_instance)
+    if count is not False:
+        print(f"Exported {count} statuses to {filename}")
+
+
 def search_user(uc_instance):
     """
     Searches a user in the database
@@ -73,13 +102,13 @@ def search_user(uc_instance):
         logger.error("ERROR: User does not exist")
         print("ERROR: User does not exist")
     else:
-        logger.debug(f"User ID: {result.user_id}")
+        logger.debug("User ID: {}", result.user_id)
         print(f"User ID: {result.user_id}")
-        logger.debug(f"Email: {result.email}")
+        logger.debug("Email: {}", result.email)
         print(f"Email: {result.email}")
-        logger.debug(f"Name: {result.user_name}")
+        logger.debug("Name: {}", result.user_name)
         print(f"Name: {result.user_name}")
-        logger.debug(f"Last name: {result.user_last_name}")
+        logger.debug("Last name: {}", result.user_last_name)
         print(f"Last name: {result.user_last_name}")
 
 
@@ -141,6 +170,21 @@ def search_status(sc_instance):
         print(f"{status_id} was not found")
 
 
+def search_status_text(sc_instance):
+    """
+    Searches statuses by their text
+    """
+    text = input("Enter words to search for in status texts: ")
+    statuses = main.search_status_text(text, sc_instance)
+    if not statuses:
+        logger.debug("No status matched the search")
+        print(f"No status contains {text}")
+    for status in statuses:
+        print(
+            f"{status.status_id} from {status.user_id} has status(es): {status.status_text}."
+        )
+
+
 def update_status(sc_instance):
     """
     Updates information for an existing status
@@ -156,6 +200,43 @@ def update_status(sc_instance):
         logger.debug("Status was successfully updated")
 
 
+def follow_user(fc_instance):
+    """
+    Makes a user follow another one
+    """
+    follower_id = input('Enter your user_id: ')
+    followed_id = input('Enter the user_id to follow: ')
+    if not main.follow_user(follower_id, followed_id, fc_instance):
+        logger.error("An error occurred while trying to follow a user")
+        print(f"{follower_id} could not follow {followed_id}")
+    else:
+        print(f"{follower_id} now follows {followed_id}")
+
+
+def unfollow_user(fc_instance):
+    """
+    Makes a user stop following another one
+    """
+    follower_id = input('Enter your user_id: ')
+    followed_id = input('Enter the user_id to unfollow: ')
+    if not main.unfollow_user(follower_id, followed_id, fc_instance):
+        print(f"{follower_id} does not follow {followed_id}")
+    else:
+        print(f"{follower_id} no longer follows {followed_id}")
+
+
+def home_feed(fc_instance):
+    """
+    Shows the first page of the home feed of a user
+    """
+    user_id = input('Enter your user_id: ')
+    statuses, _ = main.home_feed(user_id, fc_instance)
+    if not statuses:
+        print(f"The feed of {user_id} is empty")
+    for status in statuses:
+        print(f"{status.status_id} from {status.user_id}: {status.status_text}")
+
+
 def quit_program():
     """
     Quits program
@@ -164,13 +245,21 @@ def quit_program():
 
 
 if __name__ == "__main__":
-    user_collection_instance = main.init_user_collection()
-    status_collection_instance = main.init_status_collection()
+    log_config.configure_logging()
+    # The menu only prints the attributes of what it finds
+    user_collection_instance = main.init_user_collection(row_mode=True)
+    follow_collection_instance = main.init_follow_collection()
+    status_collection_instance = main.init_status_collection(row_mode=True,
+                                                             feed=follow_collection_instance)
     while True:
         user_input = input(
             '1. Add user\n2. Search user\n3. Delete user\n4. Update email\n'
             '5. Add status\n6. Search status\n7. Delete status\n8. Update status text\n'
-            '9. Load user data to database\n10. Load status data to database\n11. Exit\nEnter option: ')
+            '9. Load user data to database\n10. Load status data to database\n'
+            '11. Search status text\n12. Delete users listed in a file\n'
+            '13. Export users to a file\n14. Export statuses to a file\n'
+            '15. Follow user\n16. Unfollow user\n17. Show home feed\n18. Exit\n'
+            'Enter option: ')
         if user_input == "1":
             add_user(user_collection_instance)
         elif user_input == "2":
@@ -192,6 +281,20 @@ if __name__ == "__main__":
         elif user_input == "10":
             load_status_csv_to_db(status_collection_instance)
         elif user_input == "11":
+            search_status_text(status_collection_instance)
+        elif user_input == "12":
+            delete_users_from_file(user_collection_instance)
+        elif user_input == "13":
+            export_accounts(user_collection_instance)
+        elif user_input == "14":
+            export_statuses(status_collection_instance)
+        elif user_input == "15":
+            follow_user(follow_collection_instance)
+        elif user_input == "16":
+            unfollow_user(follow_collection_instance)
+        elif user_input == "17":
+            home_feed(follow_collection_instance)
+        elif user_input == "18":
             sys.exit(0)
         else:
             print("Did not understand input")
\ No newline at end of file
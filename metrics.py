@@ -0,0 +1,184 @@
+"""
+Per-operation metrics for the collection classes.
+
+Methods decorated with @instrumented count their calls and record their
+latency in a histogram, split by outcome, whenever the collection has a
+Metrics instance in its metrics attribute. Without one, the decorator
+only costs an attribute lookup.
+"""
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+           0.25, 0.5, 1.0, float("inf"))
+# Slow queries kept by Metrics, oldest dropped first
+MAX_SLOW_QUERIES = 100
+
+
+def outcome_of(result):
+    """
+    Classifies the result of a collection method: the methods return
+    False or None when the user or status is missing or already exists.
+    """
+    return "failure" if result is False or result is None else "success"
+
+
+def instrumented(method):
+    """
+    Decorates a collection method to report its calls to self.metrics
+    """
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if metrics is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            metrics.observe(name, "error", time.perf_counter() - start)
+            raise
+        metrics.observe(name, outcome_of(result), time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+class Metrics:
+    """
+    Thread-safe call counters and latency histograms by method and outcome
+    ("success", "failure" or "error"), plus the slowest SQL statements of
+    the databases passed to attach().
+    """
+
+    def __init__(self, slow_query_seconds=None, buckets=BUCKETS,
+                 max_slow_queries=MAX_SLOW_QUERIES):
+        self.slow_query_seconds = slow_query_seconds
+        self.buckets = buckets
+        self.slow_queries = deque(maxlen=max_slow_queries)
+        # (method, outcome) -> [count per bucket, sum of seconds]
+        self._histograms = defaultdict(lambda: [[0] * len(self.buckets), 0.0])
+        self._lock = threading.Lock()
+
+    def observe(self, name, outcome, seconds):
+        """
+        Records one call of name that took seconds
+        """
+        with self._lock:
+            histogram = self._histograms[(name, outcome)]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += seconds
+
+    def attach(self, database):
+        """
+        Times every SQL statement run by database under the name "sql", as
+        a "success" or, if it raised, an "error", and keeps the ones slower
+        than slow_query_seconds with their SQL text.
+        The time is up to the first row; fetching the rest is not included.
+        """
+        execute_sql = database.execute_sql
+
+        def record(sql, params, outcome, start):
+            seconds = time.perf_counter() - start
+            self.observe("sql", outcome, seconds)
+            if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+                self.slow_queries.append({"sql": sql, "params": list(params or ()),
+                                          "seconds": seconds, "at": time.time()})
+
+        @functools.wraps(execute_sql)
+        def timed_execute_sql(sql, params=None, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                cursor = execute_sql(sql, params, *args, **kwargs)
+            except Exception:
+                record(sql, params, "error", start)
+                raise
+            record(sql, params, "success", start)
+            return cursor
+        database.execute_sql = timed_execute_sql
+
+    def snapshot(self):
+        """
+        Returns the metrics as a dict: for each method and outcome, the
+        call count, total seconds and cumulative bucket counts by upper
+        bound, plus the list of slow queries.
+        """
+        with self._lock:
+            methods = defaultdict(dict)
+            for (name, outcome), (counts, total) in sorted(self._histograms.items()):
+                cumulative = []
+                running = 0
+                for count in counts:
+                    running += count
+                    cumulative.append(running)
+                methods[name][outcome] = {
+                    "count": running,
+                    "seconds": total,
+                    "buckets": dict(zip(map(str, self.buckets), cumulative)),
+                }
+            return {"methods": dict(methods), "slow_queries": list(self.slow_queries)}
+
+    def prometheus_text(self):
+        """
+        Returns the metrics in the Prometheus text exposition format
+        """
+        lines = ["# TYPE socialnetwork_call_seconds histogram"]
+        for name, outcomes in self.snapshot()["methods"].items():
+            for outcome, histogram in outcomes.items():
+                labels = f'method="{name}",outcome="{outcome}"'
+                for bound, count in histogram["buckets"].items():
+                    bound = "+Inf" if bound == "inf" else bound
+                    lines.append(f'socialnetwork_call_seconds_bucket{{{labels},le="{bound}"}} '
+                                 f'{count}')
+                lines.append(f"socialnetwork_call_seconds_sum{{{labels}}} "
+                             f"{histogram['seconds']}")
+                lines.append(f"socialnetwork_call_seconds_count{{{labels}}} "
+                             f"{histogram['count']}")
+        lines.append("# TYPE socialnetwork_slow_queries gauge")
+        lines.append(f"socialnetwork_slow_queries {len(self.slow_queries)}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics, port=9100, host="127.0.0.1"):
+    """
+    Serves metrics.prometheus_text() at http://host:port/metrics from a
+    background thread, for a local scraper. Returns the server; call its
+    shutdown() method to stop it.
+    """
+    # Every collection imports this module, most never serve the metrics
+    from http.server import (  # pylint: disable=C0415
+        BaseHTTPRequestHandler, ThreadingHTTPServer)
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """
+        Answers GET /metrics
+        """
+        def do_GET(self):  # pylint: disable=C0103
+            """
+            Sends the current metrics
+            """
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=W0622
+            """
+            Keeps scrapes out of stderr
+            """
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,92 @@
+"""
+Memory-mapped CSV reader for the account and status loaders.
+
+csv.DictReader builds a dict for every record and decodes the file through
+a text wrapper line by line. read_tuples instead maps the file into memory,
+decodes it in large blocks and splits the lines on commas itself, yielding
+only a tuple of the wanted columns per record. Lines containing a quote go
+through the csv module, so quoted commas, doubled quotes and newlines
+inside quotes are read the same way as by DictReader.
+"""
+import csv
+import mmap
+import os
+from operator import itemgetter
+
+# Bytes of the mapped file decoded at once
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def iter_lines(csv_file, block_size=BLOCK_SIZE):
+    """
+    Yields the lines of an open file, without their line endings, by
+    decoding memory-mapped blocks of about block_size bytes that end on
+    a line boundary.
+    """
+    size = os.fstat(csv_file.fileno()).st_size
+    if size == 0:
+        return
+    with mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        start = 3 if mapped[:3] == b"\xef\xbb\xbf" else 0
+        while start < size:
+            end = mapped.find(b"\n", min(start + block_size, size) - 1)
+            end = size if end == -1 else end + 1
+            lines = mapped[start:end].decode("utf-8").split("\n")
+            if lines[-1] == "":
+                # The block ends with a newline, not with a last unterminated line
+                lines.pop()
+            for line in lines:
+                yield line[:-1] if line.endswith("\r") else line
+            start = end
+
+
+def read_tuples(csv_file, columns, block_size=BLOCK_SIZE):
+    """
+    Reads an open CSV file whose header names columns, and yields a tuple
+    of the values of columns for every record, or None if one of them is
+    missing or empty, like main.csv_row does for DictReader rows. Blank
+    lines are skipped.
+    """
+    lines = iter_lines(csv_file, block_size)
+    header = next(csv.reader([next(lines, "")]), [])
+    if not all(column in header for column in columns):
+        # DictReader rows would miss the column, so every record is invalid
+        pick = None
+    else:
+        indexes = [header.index(column) for column in columns]
+        getter = itemgetter(*indexes)
+        pick = getter if len(indexes) > 1 else lambda record: (getter(record),)
+    # Lines holding a quote are parsed by a csv reader, which reads on
+    # from lines by itself while a quoted field spans several of them
+    pending = []
+
+    def quoted_lines():
+        while True:
+            if pending:
+                yield pending.pop()
+            else:
+                following = next(lines, None)
+                if following is None:
+                    return
+                yield following + "\n"
+
+    quoted = csv.reader(quoted_lines())
+    for line in lines:
+        if not line:
+            continue
+        if '"' in line:
+            pending.append(line + "\n")
+            try:
+                record = next(quoted)
+            except csv.Error:
+                # DictReader would stop the load; this record is rejected instead
+                yield None
+                continue
+        else:
+            record = line.split(",")
+        try:
+            values = pick(record)
+        except (IndexError, TypeError):
+            yield None
+            continue
+        yield values if all(values) else None
@@ -0,0 +1,233 @@
+"""
+Compact in-memory read replica of UsersTable.
+
+The replica holds every user in four parallel lists, one per column,
+with the repeated first and last names interned, and a dict from user_id
+to list position. Lookups build a rows.UserRow without touching SQLite or
+constructing peewee models.
+
+Triggers on UsersTable append the user_id of every inserted, updated or
+deleted user to a change log table; refresh() re-reads only those users.
+The triggers add a row to the log for every write to UsersTable, from
+any connection, until drop_change_log() removes them.
+"""
+import sys
+import threading
+
+from loguru import logger
+
+from rows import UserRow
+from socialnetwork_model import UsersTable
+from users import SQLITE_MAX_VARIABLES, USER_FIELDS
+
+CHANGE_LOG_SQL = (
+    'CREATE TABLE IF NOT EXISTS "userstable_changes" ('
+    '"seq" INTEGER PRIMARY KEY AUTOINCREMENT, "user_id" TEXT NOT NULL)',
+    'CREATE TRIGGER IF NOT EXISTS "userstable_changes_insert" AFTER INSERT ON "userstable" '
+    'BEGIN INSERT INTO "userstable_changes" ("user_id") VALUES (new."user_id"); END',
+    'CREATE TRIGGER IF NOT EXISTS "userstable_changes_update" AFTER UPDATE ON "userstable" '
+    'BEGIN INSERT INTO "userstable_changes" ("user_id") VALUES (old."user_id"); '
+    'INSERT INTO "userstable_changes" ("user_id") VALUES (new."user_id"); END',
+    'CREATE TRIGGER IF NOT EXISTS "userstable_changes_delete" AFTER DELETE ON "userstable" '
+    'BEGIN INSERT INTO "userstable_changes" ("user_id") VALUES (old."user_id"); END',
+)
+DROP_CHANGE_LOG_SQL = (
+    'DROP TRIGGER IF EXISTS "userstable_changes_insert"',
+    'DROP TRIGGER IF EXISTS "userstable_changes_update"',
+    'DROP TRIGGER IF EXISTS "userstable_changes_delete"',
+    'DROP TABLE IF EXISTS "userstable_changes"',
+)
+
+
+def drop_change_log(database):
+    """
+    Removes the change log table and its triggers from database, so that
+    writes to UsersTable stop paying for them. Replicas of database can't
+    refresh afterwards; load() creates the log again.
+    """
+    with database.transaction("immediate"):
+        for statement in DROP_CHANGE_LOG_SQL:
+            database.execute_sql(statement)
+    logger.info("Dropped the users change log")
+
+
+def model_size(user):
+    """
+    Estimates the memory used by a UsersTable instance and its values, in bytes
+    """
+    return (sys.getsizeof(user) + sys.getsizeof(user.__data__)
+            + sum(sys.getsizeof(value) for value in user.__data__.values()))
+
+
+class UserReplica:
+    """
+    Read-only snapshot of UsersTable in database, kept current by refresh().
+
+    Pass it to UserCollection as replica: the collection then answers
+    search_user and search_users from it and refreshes it after each of
+    its own writes. Writes made by other connections or processes show
+    up at the next refresh().
+
+    With auto_prune, load() and refresh() delete the change log entries
+    they have applied, so the log only holds the writes since the last
+    refresh. When several replicas follow the same database, pass
+    auto_prune=False to all of them and call prune() from the one that
+    refreshes last.
+    """
+
+    def __init__(self, database, auto_prune=True):
+        self.database = database
+        self.auto_prune = auto_prune
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        """
+        Empties the replica
+        """
+        self._ids = []
+        self._names = []
+        self._last_names = []
+        self._emails = []
+        # user_id -> position in the column lists
+        self._index = {}
+        # Positions of deleted users, reused by the next additions
+        self._free = []
+        # Last change log entry applied
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def _set(self, user_id, user_name, user_last_name, email):
+        """
+        Stores a user, in place if it is already in the replica
+        """
+        position = self._index.get(user_id)
+        if position is None:
+            if self._free:
+                position = self._free.pop()
+            else:
+                position = len(self._ids)
+                for column in (self._ids, self._names, self._last_names, self._emails):
+                    column.append(None)
+            self._index[user_id] = position
+        self._ids[position] = user_id
+        self._names[position] = sys.intern(user_name)
+        self._last_names[position] = sys.intern(user_last_name)
+        self._emails[position] = email
+
+    def _drop(self, user_id):
+        """
+        Removes a user, if it is in the replica
+        """
+        position = self._index.pop(user_id, None)
+        if position is not None:
+            for column in (self._ids, self._names, self._last_names, self._emails):
+                column[position] = None
+            self._free.append(position)
+
+    def load(self):
+        """
+        Creates the change log if needed and loads every user. Call it
+        once before the other methods. Returns the replica.
+        """
+        with self.database.transaction("immediate"):
+            for statement in CHANGE_LOG_SQL:
+                self.database.execute_sql(statement)
+        # One read transaction, so the users match the last logged change
+        with self.database.transaction():
+            seq = self.database.execute_sql(
+                'SELECT COALESCE(MAX("seq"), 0) FROM "userstable_changes"').fetchone()[0]
+            query = UsersTable.select(*USER_FIELDS).tuples()
+            with self._lock:
+                self._clear()
+                for row in query.iterator(self.database):
+                    self._set(*row)
+                self._seq = seq
+        if self.auto_prune:
+            self.prune()
+        logger.info("Loaded {} users into the replica", len(self))
+        return self
+
+    def refresh(self):
+        """
+        Applies the changes logged since the last load or refresh.
+        Returns the number of user_ids re-read.
+        """
+        with self.database.transaction():
+            changes = self.database.execute_sql(
+                'SELECT "seq", "user_id" FROM "userstable_changes" WHERE "seq" > ? '
+                'ORDER BY "seq"', (self._seq,)).fetchall()
+            if not changes:
+                return 0
+            user_ids = list(dict.fromkeys(user_id for _, user_id in changes))
+            current = {}
+            for start in range(0, len(user_ids), SQLITE_MAX_VARIABLES):
+                batch = user_ids[start:start + SQLITE_MAX_VARIABLES]
+                query = (UsersTable.select(*USER_FIELDS)
+                         .where(UsersTable.user_id.in_(batch))
+                         .tuples())
+                current.update((row[0], row) for row in query.iterator(self.database))
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in current:
+                    self._set(*current[user_id])
+                else:
+                    self._drop(user_id)
+            self._seq = max(self._seq, changes[-1][0])
+        if self.auto_prune:
+            self.prune()
+        logger.debug("Refreshed {} users in the replica", len(user_ids))
+        return len(user_ids)
+
+    def prune(self):
+        """
+        Deletes the change log entries this replica has applied. Only
+        call it when no other replica of the database is behind this one.
+        """
+        with self.database.transaction("immediate"):
+            self.database.execute_sql('DELETE FROM "userstable_changes" WHERE "seq" <= ?',
+                                      (self._seq,))
+
+    def get(self, user_id):
+        """
+        Returns the UserRow of user_id, or None if there is no such user
+        """
+        with self._lock:
+            position = self._index.get(user_id)
+            if position is None:
+                return None
+            return UserRow(self._ids[position], self._names[position],
+                           self._last_names[position], self._emails[position])
+
+    def get_many(self, user_ids):
+        """
+        Returns a dict of UserRow by user_id and the list of user_ids
+        that are not in the replica
+        """
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            row = self.get(user_id)
+            if row is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = row
+        return found, missing
+
+    def memory_usage(self):
+        """
+        Estimates the memory held by the replica, in bytes in total and
+        per user. Interned strings shared by several users count once.
+        """
+        columns = (self._ids, self._names, self._last_names, self._emails)
+        seen = {}
+        for column in columns:
+            for value in column:
+                if value is not None:
+                    seen[id(value)] = value
+        total = (sum(sys.getsizeof(column) for column in columns)
+                 + sys.getsizeof(self._index) + sys.getsizeof(self._free)
+                 + sum(sys.getsizeof(value) for value in seen.values()))
+        return {"bytes": total, "bytes_per_user": round(total / len(self)) if self else 0}
@@ -0,0 +1,9 @@
+"""
+Lightweight row types returned instead of peewee model instances
+"""
+from collections import namedtuple
+
+# Has the attributes of a UsersTable instance, without the model machinery
+UserRow = namedtuple("UserRow", ("user_id", "user_name", "user_last_name", "email"))
+# Has the attributes of a UserStatusTable instance, with user_id as the raw id
+StatusRow = namedtuple("StatusRow", ("status_id", "user_id", "status_text"))
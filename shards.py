@@ -0,0 +1,425 @@
+"""
+Sharded storage across several SQLite files.
+
+Every user is stored, with all of their statuses, on the shard
+shard_index(user_id, count) picks among count database files. Each file
+has its own write lock, so writers to different shards commit in
+parallel instead of queueing for the single lock of users.db.
+
+ShardedUserCollection and ShardedUserStatusCollection have the methods of
+UserCollection and UserStatusCollection, so the loaders and wrappers of
+main.py work on them unchanged. Calls about one user go to its shard;
+batch calls split their input by shard and run the parts in parallel on
+a thread pool, then merge the results. A status is found from its
+status_id alone by asking every shard.
+
+A status_id must be unique across the shards, so adding statuses first
+looks their status_ids up on every shard. A lock per status_id stripe
+keeps two threads from adding the same status_id to two shards at once;
+processes writing to the same shard files are not covered. The shard of
+a user depends on count: reopening the files with another count loses
+track of the users.
+"""
+import contextlib
+import heapq
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from peewee import SqliteDatabase
+
+from loguru import logger
+
+from db_pool import BUSY_TIMEOUT
+from log_config import echo
+from metrics import instrumented
+from socialnetwork_model import UsersTable, UserStatusTable
+from user_status import PAGE_SIZE, UserStatusCollection
+from users import DELETE_CHUNK_SIZE, UserCollection, existing_keys
+
+# Database files users are spread over by default
+SHARD_COUNT = 4
+# Locks status_ids are spread over while they are checked and added
+STATUS_LOCKS = 64
+SHARD_MODELS = (UsersTable, UserStatusTable)
+
+
+def shard_index(user_id, count):
+    """
+    Returns the shard of user_id among count shards. crc32 is stable
+    across processes, unlike hash() of a str.
+    """
+    return zlib.crc32(user_id.encode("utf-8")) % count
+
+
+def open_shards(directory, count=SHARD_COUNT):
+    """
+    Opens, creating them if needed, the count database files shard0.db,
+    shard1.db... in directory, with UsersTable and UserStatusTable in each.
+
+    Returns the list of databases, indexed by shard. They are in WAL mode
+    so that the parallel reads of a batch never wait for a writer.
+    """
+    os.makedirs(directory, exist_ok=True)
+    shard_databases = []
+    for index in range(count):
+        shard = SqliteDatabase(os.path.join(directory, f"shard{index}.db"),
+                               pragmas={"journal_mode": "wal",
+                                        "foreign_keys": 1,
+                                        "busy_timeout": BUSY_TIMEOUT})
+        with shard.bind_ctx(SHARD_MODELS):
+            shard.create_tables(SHARD_MODELS)
+        shard_databases.append(shard)
+    logger.info("Opened {} shards in {}", count, directory)
+    return shard_databases
+
+
+class ShardedCollection:
+    """
+    Routes calls to a collection per shard and runs the calls of a batch
+    on executor, by default a thread pool with a thread per shard.
+    Peewee gives each thread its own connection to every shard.
+    """
+
+    def __init__(self, collections, executor=None, metrics=None):
+        self.collections = collections
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=len(collections), thread_name_prefix="socialnetwork-shard")
+        self.metrics = metrics
+
+    def _shard(self, user_id):
+        """
+        Returns the collection of the shard of user_id
+        """
+        return self.collections[shard_index(user_id, len(self.collections))]
+
+    def _partition(self, items, user_id):
+        """
+        Splits items by shard, user_id(item) giving the user of an item.
+        Returns a dict of the list of items by shard index.
+        """
+        parts = {}
+        for item in items:
+            parts.setdefault(shard_index(user_id(item), len(self.collections)), []).append(item)
+        return parts
+
+    def _gather(self, calls):
+        """
+        Runs the (function, *args) calls and returns their results in the
+        same order, in parallel on the executor unless there is only one
+        """
+        if len(calls) < 2:
+            return [function(*args) for function, *args in calls]
+        futures = [self.executor.submit(*call) for call in calls]
+        return [future.result() for future in futures]
+
+    def _scatter(self, method, *args):
+        """
+        Calls method of every shard's collection with args and returns
+        the list of results
+        """
+        return self._gather([(getattr(collection, method), *args)
+                             for collection in self.collections])
+
+    def _each_shard(self, method, parts):
+        """
+        Calls method of the collection of every shard in parts with its
+        items and returns the list of results
+        """
+        return self._gather([(getattr(self.collections[index], method), items)
+                             for index, items in parts.items()])
+
+
+class ShardedUserCollection(ShardedCollection):
+    """
+    UserCollection over shard_databases, as returned by open_shards.
+
+    metrics is an optional metrics.Metrics recording every call.
+    With row_mode, searches return rows.UserRow tuples.
+    """
+
+    def __init__(self, shard_databases, executor=None, metrics=None, row_mode=False):
+        super().__init__([UserCollection(shard, row_mode=row_mode) for shard in shard_databases],
+                         executor, metrics)
+
+    @instrumented
+    def add_user(self, user_id, user_name, user_last_name, email):
+        """
+        Adds a new user to their shard
+        """
+        return self._shard(user_id).add_user(user_id, user_name, user_last_name, email)
+
+    @instrumented
+    def add_users(self, users):
+        """
+        Adds many (user_id, user_name, user_last_name, email) tuples, each
+        shard's part in its own transaction, and returns the number of
+        users actually inserted
+        """
+        parts = self._partition(users, lambda user: user[0])
+        return sum(self._each_shard("add_users", parts))
+
+    @instrumented
+    def search_user(self, user_id):
+        """
+        Searches for a user on their shard
+        """
+        return self._shard(user_id).search_user(user_id)
+
+    @instrumented
+    def search_users(self, user_ids):
+        """
+        Searches for many users at once. Returns a dict of the users found
+        by user_id and the list of user_ids that do not exist.
+        """
+        wanted = list(dict.fromkeys(user_ids))
+        found = {}
+        for shard_found, _ in self._each_shard("search_users",
+                                               self._partition(wanted, lambda user_id: user_id)):
+            found.update(shard_found)
+        return found, [user_id for user_id in wanted if user_id not in found]
+
+    def iter_user_rows(self):
+        """
+        Yields every user as a (user_id, user_name, user_last_name, email)
+        tuple, ordered by user_id, merging the shards as they are read
+        """
+        yield from heapq.merge(*(collection.iter_user_rows()
+                                 for collection in self.collections))
+
+    @instrumented
+    def delete_user(self, user_id):
+        """
+        Deletes an existing user and their statuses
+        """
+        return self._shard(user_id).delete_user(user_id)
+
+    @instrumented
+    def delete_users(self, user_ids, chunk_size=DELETE_CHUNK_SIZE):
+        """
+        Deletes many users, and their statuses, chunk_size user_ids at a
+        time; every chunk is split by shard and deleted on the shards in
+        parallel.
+
+        Returns a list with a dict per chunk counting the 'users' and
+        'statuses' actually deleted.
+        """
+        batches = []
+        user_ids = iter(user_ids)
+        while True:
+            chunk = list(islice(user_ids, chunk_size))
+            if not chunk:
+                return batches
+            deleted = {"users": 0, "statuses": 0}
+            for shard_batches in self._each_shard(
+                    "delete_users", self._partition(chunk, lambda user_id: user_id)):
+                for batch in shard_batches:
+                    deleted["users"] += batch["users"]
+                    deleted["statuses"] += batch["statuses"]
+            batches.append(deleted)
+
+    @instrumented
+    def update_email(self, user_id, email):
+        """
+        Modifies the email of an existing user
+        """
+        return self._shard(user_id).update_email(user_id, email)
+
+    @instrumented
+    def update_emails(self, emails):
+        """
+        Modifies the email of many users at once. emails is a dict of new
+        email by user_id.
+
+        Returns the number of users updated and the list of user_ids that
+        do not exist.
+        """
+        parts = self._partition(emails.items(), lambda item: item[0])
+        updated = 0
+        missing = []
+        for shard_updated, shard_missing in self._gather(
+                [(self.collections[index].update_emails, dict(items))
+                 for index, items in parts.items()]):
+            updated += shard_updated
+            missing.extend(shard_missing)
+        return updated, missing
+
+
+class ShardStatusCollection(UserStatusCollection):
+    """
+    UserStatusCollection of one shard. Outside row mode, statuses are read
+    joined with their user, so that status.user_id is the user of the same
+    shard rather than a lazy query on the database UsersTable is bound to.
+    """
+
+    def _select(self, *conditions):
+        if self.row_mode:
+            return super()._select(*conditions)
+        return (UserStatusTable.select(UserStatusTable, UsersTable)
+                .join(UsersTable)
+                .where(*conditions)
+                .bind(self.database))
+
+
+class ShardedUserStatusCollection(ShardedCollection):
+    """
+    UserStatusCollection over shard_databases, as returned by open_shards.
+    Statuses are stored on the shard of their user.
+
+    metrics is an optional metrics.Metrics recording every call.
+    With row_mode, searches return rows.StatusRow tuples; otherwise
+    UserStatusTable instances holding their user, see ShardStatusCollection.
+    """
+
+    def __init__(self, shard_databases, executor=None, metrics=None, row_mode=False):
+        super().__init__([ShardStatusCollection(shard, row_mode=row_mode)
+                          for shard in shard_databases], executor, metrics)
+        self._status_locks = [threading.Lock() for _ in range(STATUS_LOCKS)]
+
+    @contextlib.contextmanager
+    def _locked(self, status_ids):
+        """
+        Holds the locks of status_ids, taken in order so that batches
+        never wait for each other in a cycle
+        """
+        stripes = sorted({shard_index(status_id, STATUS_LOCKS) for status_id in status_ids})
+        with contextlib.ExitStack() as stack:
+            for stripe in stripes:
+                stack.enter_context(self._status_locks[stripe])
+            yield
+
+    def _existing_status_ids(self, status_ids, shards):
+        """
+        Returns the list of the sets of status_ids found on each shard
+        index of shards
+        """
+        return self._gather([(existing_keys, self.collections[index].database,
+                              UserStatusTable.status_id, status_ids) for index in shards])
+
+    @instrumented
+    def add_status(self, status_id, user_id, status_text):
+        """
+        Adds a status to the shard of its user, unless another shard
+        already has its status_id
+        """
+        index = shard_index(user_id, len(self.collections))
+        others = [other for other in range(len(self.collections)) if other != index]
+        with self._locked([status_id]):
+            # The shard of the user turns down a duplicate by itself
+            if any(self._existing_status_ids([status_id], others)):
+                echo("Could not add {} because it already exists.", status_id)
+                logger.error("{} already exists on another shard", status_id)
+                return False
+            return self.collections[index].add_status(status_id, user_id, status_text)
+
+    @instrumented
+    def add_statuses(self, statuses):
+        """
+        Adds many (status_id, user_id, status_text) tuples, each shard's
+        part in its own transaction. Returns the same report as
+        UserStatusCollection.add_statuses, whose duplicates include the
+        status_ids already on another shard or earlier in statuses.
+        """
+        statuses = list(statuses)
+        report = {"inserted": 0, "orphaned": [], "duplicates": []}
+        status_ids = {status[0] for status in statuses}
+        with self._locked(status_ids):
+            # Shard index by status_id, of the shard holding or getting it
+            owners = {}
+            for index, found in enumerate(self._existing_status_ids(
+                    status_ids, range(len(self.collections)))):
+                for status_id in found:
+                    owners.setdefault(status_id, index)
+            parts = {}
+            for status in statuses:
+                index = shard_index(status[1], len(self.collections))
+                if owners.setdefault(status[0], index) != index:
+                    report["duplicates"].append(status)
+                else:
+                    parts.setdefault(index, []).append(status)
+            for shard_report in self._each_shard("add_statuses", parts):
+                report["inserted"] += shard_report["inserted"]
+                report["orphaned"].extend(shard_report["orphaned"])
+                report["duplicates"].extend(shard_report["duplicates"])
+        return report
+
+    def create_timeline_index(self):
+        """
+        Creates the index list_statuses pages through on every shard
+        """
+        self._scatter("create_timeline_index")
+
+    @instrumented
+    def search_status(self, status_id):
+        """
+        Searches every shard for status_id. Returns None if none has it.
+        """
+        return next((status for status in self._scatter("search_status", status_id)
+                     if status is not None), None)
+
+    @instrumented
+    def search_statuses(self, status_ids):
+        """
+        Searches every shard for many statuses at once. Returns a dict of
+        the statuses found by status_id and the list of status_ids that do
+        not exist.
+        """
+        wanted = list(dict.fromkeys(status_ids))
+        found = {}
+        for shard_found, _ in self._scatter("search_statuses", wanted):
+            found.update(shard_found)
+        return found, [status_id for status_id in wanted if status_id not in found]
+
+    @instrumented
+    def list_statuses(self, user_id, cursor=None, page_size=PAGE_SIZE):
+        """
+        Returns a page of the statuses of user_id and the cursor of the
+        next page, see UserStatusCollection.list_statuses
+        """
+        return self._shard(user_id).list_statuses(user_id, cursor, page_size)
+
+    def iter_statuses(self, user_id, page_size=PAGE_SIZE):
+        """
+        Yields every status of user_id, ordered by status_id
+        """
+        yield from self._shard(user_id).iter_statuses(user_id, page_size)
+
+    def iter_status_rows(self):
+        """
+        Yields every status as a (status_id, user_id, status_text) tuple,
+        ordered by status_id, merging the shards as they are read
+        """
+        yield from heapq.merge(*(collection.iter_status_rows()
+                                 for collection in self.collections))
+
+    @instrumented
+    def delete_status(self, status_id):
+        """
+        Deletes status_id from whichever shard has it
+        """
+        return any(self._scatter("delete_status", status_id))
+
+    @instrumented
+    def update_status_text(self, status_id, status_text):
+        """
+        Modifies the text of status_id on whichever shard has it
+        """
+        return any(self._scatter("update_status_text", status_id, status_text))
+
+    @instrumented
+    def update_status_texts(self, status_texts):
+        """
+        Modifies many status messages at once on every shard. status_texts
+        is a dict of new status_text by status_id.
+
+        Returns the number of statuses updated and the list of status_ids
+        that exist on no shard.
+        """
+        updated = 0
+        missing = None
+        for shard_updated, shard_missing in self._scatter("update_status_texts", status_texts):
+            updated += shard_updated
+            missing = set(shard_missing) if missing is None else missing & set(shard_missing)
+        return updated, [status_id for status_id in status_texts if status_id in missing]
@@ -0,0 +1,101 @@
+"""
+Unit testing the asyncio facade in async_main.py
+"""
+import asyncio
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock
+
+from peewee import SqliteDatabase
+
+from async_main import AsyncSocialNetwork
+from socialnetwork_model import UserStatusTable, UsersTable, database
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestAsyncSocialNetwork(IsolatedAsyncioTestCase):
+    """
+    Testing the facade against a database in a temporary file, since the
+    executor thread opens its own connection
+    """
+    def setUp(self):
+        """
+        Create the tables and the facade
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = SqliteDatabase(os.path.join(self.directory.name, "async.db"),
+                                       pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.network = AsyncSocialNetwork(UserCollection(self.database),
+                                          UserStatusCollection(self.database))
+
+    def tearDown(self):
+        """
+        Stop the executor and bind the tables back to users.db
+        """
+        self.network.close()
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+        self.directory.cleanup()
+
+    async def test_user_and_status_operations(self):
+        """
+        Every operation returns what its main.py counterpart returns
+        """
+        self.assertTrue(await self.network.add_user("ale314", "Audrey", "Le", "ale314@uw.edu"))
+        self.assertFalse(await self.network.add_user("ale314", "Audrey", "Le", "ale314@uw.edu"))
+        self.assertTrue(await self.network.update_email("ale314", "audrey@gmail.com"))
+        self.assertEqual((await self.network.search_user("ale314")).email, "audrey@gmail.com")
+        self.assertTrue(await self.network.add_status("ale314_00001", "ale314", "Hello"))
+        self.assertTrue(await self.network.update_status("ale314_00001", "Hello world"))
+        self.assertEqual((await self.network.search_status("ale314_00001")).status_text,
+                         "Hello world")
+        self.assertTrue(await self.network.delete_status("ale314_00001"))
+        self.assertIsNone(await self.network.search_status("ale314_00001"))
+        self.assertTrue(await self.network.delete_user("ale314"))
+        self.assertIsNone(await self.network.search_user("ale314"))
+
+    async def test_load_csv_files(self):
+        """
+        The CSV loaders run on the executor
+        """
+        self.assertTrue(await self.network.load_accounts_csv_to_db(
+            "test_main_load_user_file.csv"))
+        found, missing = await self.network.search_users(["Ashien.Amos47", "nobody"])
+        self.assertEqual(list(found), ["Ashien.Amos47"])
+        self.assertEqual(missing, ["nobody"])
+
+
+class TestSearchCoalescing(IsolatedAsyncioTestCase):
+    """
+    Testing that concurrent searches for the same id share one query
+    """
+    async def test_concurrent_searches_share_one_query(self):
+        """
+        Ten concurrent searches of one user run a single search_user
+        """
+        user_collection = MagicMock()
+        user_collection.search_user.side_effect = lambda user_id: user_id.upper()
+        network = AsyncSocialNetwork(user_collection, MagicMock())
+        results = await asyncio.gather(*[network.search_user("ale314") for _ in range(10)],
+                                       network.search_user("bryce05"))
+        network.close()
+        self.assertEqual(results, ["ALE314"] * 10 + ["BRYCE05"])
+        self.assertEqual(user_collection.search_user.call_count, 2)
+
+    async def test_write_is_not_coalesced_with_earlier_search(self):
+        """
+        A search awaited after a write runs its own query
+        """
+        user_collection = MagicMock()
+        network = AsyncSocialNetwork(user_collection, MagicMock())
+        first = asyncio.ensure_future(network.search_user("ale314"))
+        await asyncio.sleep(0)
+        await network.update_email("ale314", "audrey@gmail.com")
+        await network.search_user("ale314")
+        await first
+        network.close()
+        self.assertEqual(user_collection.search_user.call_count, 2)
@@ -0,0 +1,52 @@
+"""
+Unit testing the helpers of benchmarks.py
+"""
+import os
+import tempfile
+from csv import DictReader
+from unittest import TestCase
+
+import benchmarks
+
+
+class TestBenchmarkHelpers(TestCase):
+    """
+    Testing the synthetic data generators and the report comparison
+    """
+    def test_generated_files_match_loader_layout(self):
+        """
+        The generated CSV files have the columns the loaders read
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            accounts_file = os.path.join(directory, "accounts.csv")
+            status_file = os.path.join(directory, "status.csv")
+            benchmarks.generate_accounts_csv(accounts_file, 20)
+            benchmarks.generate_status_csv(status_file, 50, 20)
+            with open(accounts_file, encoding="utf-8") as csv_file:
+                accounts = list(DictReader(csv_file))
+            with open(status_file, encoding="utf-8") as csv_file:
+                statuses = list(DictReader(csv_file))
+        self.assertEqual(len({row["USER_ID"] for row in accounts}), 20)
+        self.assertEqual(accounts[0]["EMAIL"], accounts[0]["USER_ID"] + "@goodmail.com")
+        user_ids = {row["USER_ID"] for row in accounts}
+        self.assertTrue(all(row["USER_ID"] in user_ids for row in statuses))
+        self.assertEqual(len({row["STATUS_ID"] for row in statuses}), 50)
+
+    def test_percentiles(self):
+        """
+        p50 and p99 of 1 to 100
+        """
+        self.assertEqual(benchmarks.percentiles(list(range(100, 0, -1))),
+                         {"p50": 51, "p99": 100})
+
+    def test_compare_reports(self):
+        """
+        Slower latencies and lower throughputs beyond the threshold are reported
+        """
+        baseline = {"memory": {"search_user": {"p50_us": 100, "ops_per_second": 1000},
+                               "add_user": {"p50_us": 100, "ops_per_second": 1000}}}
+        current = {"memory": {"search_user": {"p50_us": 150, "ops_per_second": 1100},
+                              "add_user": {"p50_us": 110, "ops_per_second": 500}}}
+        self.assertEqual(benchmarks.compare_reports(baseline, current),
+                         ["memory.search_user.p50_us: 100 -> 150",
+                          "memory.add_user.ops_per_second: 1000 -> 500"])
@@ -0,0 +1,139 @@
+"""
+Unit testing the Bloom filters in bloom.py and their use by the collections
+"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from peewee import SqliteDatabase
+
+from bloom import BloomFilter, CountingBloomFilter, load_filter
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestBloomFilter(TestCase):
+    """
+    Testing the filters on their own
+    """
+    def test_no_false_negatives(self):
+        """
+        Every key added is found, and few others are
+        """
+        bloom = BloomFilter(10000, 0.01)
+        bloom.update(f"user{i}" for i in range(10000))
+        self.assertTrue(all(f"user{i}" in bloom for i in range(10000)))
+        false_positives = sum(f"other{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_stats(self):
+        """
+        The stats report the sizing, memory and estimated error rate
+        """
+        bloom = BloomFilter(1000, 0.01)
+        stats = bloom.stats()
+        self.assertEqual((stats["keys"], stats["false_positive_rate"]), (0, 0))
+        self.assertEqual(stats["hashes"], 7)
+        self.assertEqual(stats["bytes"], 1199)
+        bloom.update(str(i) for i in range(1000))
+        self.assertAlmostEqual(bloom.stats()["false_positive_rate"], 0.01, places=3)
+        self.assertEqual(CountingBloomFilter(1000, 0.01).stats()["bytes"], 9586)
+
+    def test_counting_discard(self):
+        """
+        A counting filter forgets discarded keys; a plain one can't
+        """
+        counting = CountingBloomFilter(100)
+        plain = BloomFilter(100)
+        for bloom in (counting, plain):
+            bloom.update(["ale314", "bryce05"])
+            bloom.discard("ale314")
+            self.assertIn("bryce05", bloom)
+        self.assertNotIn("ale314", counting)
+        self.assertIn("ale314", plain)
+
+
+class TestCollectionFilters(TestCase):
+    """
+    Testing that the collections keep the filters up to date and skip
+    the database for the ids they rule out
+    """
+    def setUp(self):
+        """
+        Create an in-memory database with a user and a status, and
+        counting filters of both loaded from it
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        UserCollection(self.database).add_user("ale314", "Audrey", "Le", "a@uw.edu")
+        UserStatusCollection(self.database).add_status("ale314_1", "ale314", "Hello")
+        self.user_filter = load_filter(self.database, UsersTable.user_id, counting=True)
+        self.status_filter = load_filter(self.database, UserStatusTable.status_id,
+                                         counting=True)
+        self.user_collection = UserCollection(self.database, user_filter=self.user_filter)
+        self.status_collection = UserStatusCollection(self.database,
+                                                      status_filter=self.status_filter,
+                                                      user_filter=self.user_filter)
+
+    def tearDown(self):
+        """
+        Disconnect test databases and bind the tables back to users.db
+        """
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+
+    def test_loaded_from_database(self):
+        """
+        The filters start with the ids already in the tables
+        """
+        self.assertIn("ale314", self.user_filter)
+        self.assertIn("ale314_1", self.status_filter)
+        self.assertEqual(self.user_filter.stats()["keys"], 1)
+
+    def test_negatives_skip_the_database(self):
+        """
+        Ids the filters rule out fail without running a statement
+        """
+        with patch.object(self.database, "execute_sql", side_effect=AssertionError):
+            self.assertIsNone(self.user_collection.search_user("nobody"))
+            self.assertFalse(self.user_collection.update_email("nobody", "x@uw.edu"))
+            self.assertFalse(self.user_collection.delete_user("nobody"))
+            self.assertFalse(self.status_collection.add_status("nobody_1", "nobody", "Hi"))
+            self.assertIsNone(self.status_collection.search_status("nobody_1"))
+            self.assertFalse(self.status_collection.update_status_text("nobody_1", "Hi"))
+            self.assertFalse(self.status_collection.delete_status("nobody_1"))
+
+    def test_model_and_int_keys(self):
+        """
+        A UsersTable instance stands for its user_id and an int id for its text
+        """
+        user = UsersTable.get(UsersTable.user_id == "ale314")
+        self.assertTrue(self.status_collection.add_status("ale314_2", user, "Hi"))
+        self.assertIn("ale314_2", self.status_filter)
+        self.assertIsNone(self.user_collection.search_user(42))
+        self.user_collection.add_user(42, "Number", "Id", "n@uw.edu")
+        self.assertIn("42", self.user_filter)
+        self.assertEqual(self.user_collection.search_user(42).user_name, "Number")
+
+    def test_writes_update_the_filters(self):
+        """
+        Added ids enter the filters and deleted ones leave the counting ones
+        """
+        self.user_collection.add_user("bryce05", "Bryce", "Brown", "b@uw.edu")
+        self.user_collection.add_users([("carol1", "Carol", "Kim", "c@uw.edu")])
+        self.status_collection.add_statuses([("bryce05_1", "bryce05", "Hey")])
+        self.assertIn("carol1", self.user_filter)
+        self.assertIn("bryce05_1", self.status_filter)
+        found, missing = self.user_collection.search_users(["bryce05", "nobody"])
+        self.assertEqual((list(found), missing), (["bryce05"], ["nobody"]))
+        self.assertTrue(self.status_collection.delete_status("ale314_1"))
+        self.assertNotIn("ale314_1", self.status_filter)
+        self.user_collection.delete_users(["carol1", "nobody"])
+        self.assertNotIn("carol1", self.user_filter)
+        self.assertEqual(self.user_collection.update_emails({"nobody": "x@uw.edu",
+                                                             "bryce05": "b2@uw.edu"}),
+                         (1, ["nobody"]))
+        self.assertEqual(self.status_collection.update_status_texts({"nobody_1": "Hi"}),
+                         (0, ["nobody_1"]))
+
@@ -0,0 +1,115 @@
+"""
+Unit testing the caches in cache.py
+"""
+from unittest import TestCase
+
+from cache import LRUCache, StatusCache
+
+
+class FakeClock:
+    """
+    Clock that only moves when told to
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(TestCase):
+    """
+    Testing eviction, expiry and invalidation in LRUCache
+    """
+    def setUp(self):
+        """
+        Create a small cache with a fake clock
+        """
+        self.clock = FakeClock()
+        self.cache = LRUCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get_and_put(self):
+        """
+        Cached values are returned and counted as hits, others as misses
+        """
+        self.cache.put("ale314", "Audrey")
+        self.assertEqual(self.cache.get("ale314"), "Audrey")
+        self.assertIsNone(self.cache.get("bryce05"))
+        self.assertEqual(self.cache.stats(), {"size": 1, "maxsize": 2, "hits": 1,
+                                              "misses": 1, "evictions": 0})
+
+    def test_evicts_least_recently_used(self):
+        """
+        The entry that was read least recently goes first
+        """
+        self.cache.put("ale314", "Audrey")
+        self.cache.put("bryce05", "Bryce")
+        self.cache.get("ale314")
+        self.cache.put("jerry.tom1", "Jerry")
+        self.assertIsNone(self.cache.get("bryce05"))
+        self.assertEqual(self.cache.get("ale314"), "Audrey")
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_expires_after_ttl(self):
+        """
+        Entries older than ttl seconds are misses
+        """
+        self.cache.put("ale314", "Audrey")
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get("ale314"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_put_after_invalidate_is_dropped(self):
+        """
+        A value read before an invalidation is not cached after it
+        """
+        version = self.cache.version
+        self.cache.invalidate("ale314")
+        self.cache.put("ale314", "Audrey", version)
+        self.assertIsNone(self.cache.get("ale314"))
+
+
+class TestStatusCache(TestCase):
+    """
+    Testing the byte bound and the per-user index of StatusCache
+    """
+    def setUp(self):
+        """
+        Create a cache that fits 100 bytes
+        """
+        self.cache = StatusCache(max_bytes=100)
+
+    def test_evicts_by_bytes(self):
+        """
+        Entries are evicted once their sizes add up past max_bytes
+        """
+        self.cache.put("peterpan1_00001", "short", user_id="peterpan1", size=40)
+        self.cache.put("peterpan1_00002", "short", user_id="peterpan1", size=40)
+        self.assertEqual(self.cache.bytes, 80)
+        self.cache.put("king.arthur_00001", "a much longer text", user_id="king.arthur",
+                       size=60)
+        self.assertIsNone(self.cache.get("peterpan1_00001"))
+        self.assertEqual(self.cache.bytes, 100)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_replacing_entry_updates_bytes(self):
+        """
+        Putting the same status twice only counts it once
+        """
+        self.cache.put("peterpan1_00001", "short", user_id="peterpan1", size=40)
+        self.cache.put("peterpan1_00001", "longer", user_id="peterpan1", size=50)
+        self.assertEqual(self.cache.bytes, 50)
+        self.assertEqual(self.cache.get("peterpan1_00001"), "longer")
+
+    def test_invalidate_user(self):
+        """
+        invalidate_user drops every status of that user only
+        """
+        self.cache.put("peterpan1_00001", "one", user_id="peterpan1", size=10)
+        self.cache.put("peterpan1_00002", "two", user_id="peterpan1", size=10)
+        self.cache.put("king.arthur_00001", "three", user_id="king.arthur", size=10)
+        self.cache.invalidate_user("peterpan1")
+        self.assertIsNone(self.cache.get("peterpan1_00001"))
+        self.assertIsNone(self.cache.get("peterpan1_00002"))
+        self.assertEqual(self.cache.get("king.arthur_00001"), "three")
+        self.assertEqual(self.cache.bytes, 10)
@@ -0,0 +1,159 @@
+"""
+Unit testing the resumable imports of checkpoints.py and main.py
+"""
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from peewee import SqliteDatabase
+
+import checkpoints
+import main
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from users import UserCollection
+
+
+class TestCheckpoints(TestCase):
+    """
+    Testing the checkpoint table and the offset-tracking CSV reader
+    """
+    def setUp(self):
+        """
+        Write an accounts file with a quoted newline and a blank line
+        """
+        handle, self.file = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\n")
+            csv_file.write("ale314,Audrey,\"Le\nLe\",ale314@uw.edu\n")
+            csv_file.write("\n")
+            csv_file.write("bryce05,Bryce,Brown,bryce05@gmail.com\n")
+            csv_file.write("short.row,Short\n")
+
+    def tearDown(self):
+        """
+        Remove the temporary file
+        """
+        os.remove(self.file)
+
+    def test_read_csv_chunks_offsets(self):
+        """
+        Each chunk ends at the offset where the next record starts, so
+        reading again from it gives the rest of the file
+        """
+        chunks = list(checkpoints.read_csv_chunks(self.file, 0, 1))
+        self.assertEqual([rows[0]["USER_ID"] for rows, _ in chunks],
+                         ["ale314", "bryce05", "short.row"])
+        self.assertEqual(chunks[0][0][0]["LASTNAME"], "Le\nLe")
+        self.assertEqual(chunks[-1][1], os.path.getsize(self.file))
+        rest = list(checkpoints.read_csv_chunks(self.file, chunks[0][1], 10))
+        self.assertEqual([row["USER_ID"] for row in rest[0][0]], ["bryce05", "short.row"])
+
+    def test_resume_offset(self):
+        """
+        Offsets that don't start a line, or are past the end, start over
+        """
+        _, end = next(checkpoints.read_csv_chunks(self.file, 0, 1))
+        self.assertEqual(checkpoints.resume_offset(self.file, end), end)
+        self.assertEqual(checkpoints.resume_offset(self.file, end + 2), 0)
+        self.assertEqual(checkpoints.resume_offset(self.file, 10 ** 6), 0)
+
+    def test_save_and_get_checkpoint(self):
+        """
+        Checkpoints are stored by fingerprint and replaced on save
+        """
+        test_database = SqliteDatabase(":memory:")
+        checkpoints.create_checkpoint_table(test_database)
+        fingerprint = checkpoints.file_fingerprint(self.file)
+        self.assertEqual(checkpoints.get_checkpoint(test_database, fingerprint), 0)
+        checkpoints.save_checkpoint(test_database, fingerprint, self.file, 10)
+        checkpoints.save_checkpoint(test_database, fingerprint, self.file, 20)
+        self.assertEqual(checkpoints.get_checkpoint(test_database, fingerprint), 20)
+        test_database.close()
+
+
+class TestResumableLoad(TestCase):
+    """
+    Testing that main's resumable loaders pick up where a failed load stopped
+    """
+    def setUp(self):
+        """
+        Create an in-memory database and an accounts file of 10 users
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.user_collection = UserCollection(self.database)
+        handle, self.file = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", encoding="utf-8") as csv_file:
+            csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\n")
+            for i in range(10):
+                csv_file.write(f"user{i},Name,Last,user{i}@uw.edu\n")
+
+    def tearDown(self):
+        """
+        Remove the file and bind the tables back to users.db
+        """
+        os.remove(self.file)
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+
+    def test_resume_after_failure(self):
+        """
+        A load that fails on its third chunk resumes from the third chunk
+        """
+        add_users = self.user_collection.add_users
+        calls = []
+
+        def failing_add_users(users):
+            calls.append(users)
+            if len(calls) == 3:
+                raise RuntimeError("disk full")
+            return add_users(users)
+
+        with patch.object(self.user_collection, "add_users", failing_add_users):
+            with self.assertRaises(RuntimeError):
+                main.resumable_load_accounts_csv_to_db(self.file, self.user_collection, 3)
+        self.assertEqual(UsersTable.select().count(), 6)
+
+        report = main.resumable_load_accounts_csv_to_db(self.file, self.user_collection, 3)
+        self.assertEqual(report["inserted"], 4)
+        self.assertEqual(report["skipped"], 0)
+        self.assertGreater(report["resumed_at"], 0)
+        self.assertFalse(report["already_imported"])
+        self.assertEqual(UsersTable.select().count(), 10)
+
+    def test_skip_imported_and_load_appended(self):
+        """
+        A fully imported file is skipped; rows appended later are loaded
+        """
+        main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+        report = main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+        self.assertTrue(report["already_imported"])
+        self.assertEqual(report["inserted"], 0)
+        with patch("checkpoints.FINGERPRINT_BYTES", 20):
+            main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+            with open(self.file, "a", encoding="utf-8") as csv_file:
+                csv_file.write("user10,Name,Last,user10@uw.edu\n")
+            report = main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+        self.assertEqual(report["inserted"], 1)
+        self.assertEqual(report["skipped"], 0)
+
+    def test_skip_imported_file_without_trailing_newline(self):
+        """
+        A file whose last line has no newline is skipped once imported
+        """
+        with open(self.file, "w", encoding="utf-8") as csv_file:
+            csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\nuser0,Name,Last,user0@uw.edu")
+        main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+        with patch("checkpoints.logger") as logger:
+            report = main.resumable_load_accounts_csv_to_db(self.file, self.user_collection)
+        self.assertTrue(report["already_imported"])
+        logger.warning.assert_not_called()
+
+    def test_file_not_found(self):
+        """
+        A missing file returns False
+        """
+        with patch("sys.stdout"):
+            self.assertFalse(main.resumable_load_status_csv_to_db("missing.csv", None))
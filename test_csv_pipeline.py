@@ -0,0 +1,75 @@
+"""
+Unit testing the parallel CSV parsing pipeline in csv_pipeline.py
+"""
+import os
+import tempfile
+from unittest import TestCase
+
+import csv_pipeline
+
+
+class TestCsvPipeline(TestCase):
+    """
+    Testing range splitting and parallel parsing on a generated accounts file
+    """
+    def setUp(self):
+        """
+        Write an accounts file with a few invalid records to a temporary file
+        """
+        handle, self.file = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", encoding="utf-8") as csv_file:
+            csv_file.write("USER_ID,NAME,LASTNAME,EMAIL\n")
+            for i in range(500):
+                csv_file.write(f"user{i},Name{i},\"Last, {i}\",user{i}@gmail.com\n")
+            csv_file.write("no.email,No,Email,\n")
+            csv_file.write("short.row,Short\n")
+
+    def tearDown(self):
+        """
+        Remove the temporary file
+        """
+        os.remove(self.file)
+
+    def test_split_ranges_on_line_boundaries(self):
+        """
+        Every range but the first starts right after a newline and the
+        ranges cover the file after the header
+        """
+        header, ranges = csv_pipeline.split_ranges(self.file, range_size=100)
+        self.assertEqual(header, ["USER_ID", "NAME", "LASTNAME", "EMAIL"])
+        with open(self.file, "rb") as csv_file:
+            data = csv_file.read()
+        self.assertEqual(ranges[0][0], data.index(b"\n") + 1)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[start - 1:start], b"\n")
+
+    def test_parse_in_parallel(self):
+        """
+        Parsing in two workers returns every valid row in file order
+        """
+        rows = []
+        rejected = 0
+        for batch, batch_rejected in csv_pipeline.parse_in_parallel(
+                self.file, ("USER_ID", "EMAIL", "LASTNAME"), workers=2, range_size=1000):
+            rows.extend(batch)
+            rejected += batch_rejected
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(rows[0], ("user0", "user0@gmail.com", "Last, 0"))
+        self.assertEqual(rows[-1], ("user499", "user499@gmail.com", "Last, 499"))
+        self.assertEqual(rejected, 2)
+
+    def test_parse_in_parallel_missing_column(self):
+        """
+        A header without one of the requested columns raises ValueError
+        """
+        with self.assertRaises(ValueError):
+            list(csv_pipeline.parse_in_parallel(self.file, ("STATUS_ID",)))
+
+    def test_parse_in_parallel_file_not_found(self):
+        """
+        A missing file raises FileNotFoundError
+        """
+        with self.assertRaises(FileNotFoundError):
+            list(csv_pipeline.parse_in_parallel("no_such_file.csv", ("USER_ID",)))
@@ -0,0 +1,76 @@
+"""
+Unit testing the pooled database mode in db_pool.py
+"""
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+import db_pool
+from socialnetwork_model import UserStatusTable, UsersTable, database
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestPooledDatabase(TestCase):
+    """
+    Testing both collections on a pooled database from several threads
+    """
+    def setUp(self):
+        """
+        Create a pooled database in a temporary file
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = db_pool.init_pooled_database(
+            os.path.join(self.directory.name, "pooled.db"), max_connections=4)
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.database.close()
+
+    def tearDown(self):
+        """
+        Close every pooled connection and bind the tables back to users.db
+        """
+        self.database.close_all()
+        database.bind([UsersTable, UserStatusTable])
+        self.directory.cleanup()
+
+    def test_wal_mode(self):
+        """
+        The pooled database runs in WAL mode with foreign keys on
+        """
+        with self.database.connection_context():
+            self.assertEqual(self.database.journal_mode, "wal")
+            self.assertEqual(self.database.foreign_keys, 1)
+
+    def test_concurrent_collections(self):
+        """
+        Threads add, search and update users and statuses through their own connections
+        """
+        errors = []
+
+        def work(thread_id):
+            try:
+                with self.database.connection_context():
+                    user_collection = UserCollection(self.database)
+                    status_collection = UserStatusCollection(self.database)
+                    for i in range(20):
+                        user_id = f"user{thread_id}_{i}"
+                        assert user_collection.add_user(user_id, "Name", "Last",
+                                                        f"{user_id}@gmail.com")
+                        assert status_collection.add_status(f"{user_id}_00001", user_id,
+                                                            "Hello")
+                        assert user_collection.update_email(user_id, f"{user_id}@uw.edu")
+                        assert user_collection.search_user(user_id).email == \
+                            f"{user_id}@uw.edu"
+            except Exception as error:  # pylint: disable=W0703
+                errors.append(error)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with self.database.connection_context():
+            self.assertEqual(UsersTable.select().count(), 80)
+            self.assertEqual(UserStatusTable.select().count(), 80)
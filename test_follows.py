@@ -0,0 +1,127 @@
+"""
+Unit testing the follow graph and home feeds in follows.py
+"""
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from follows import FollowCollection
+from rows import StatusRow
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestFollowCollection(TestCase):
+    """
+    Testing follow/unfollow and the fan-out of statuses to home feeds
+    """
+    def setUp(self):
+        """
+        Create an in-memory database with four users; carol becomes a
+        celebrity once she has more than two followers
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.user_collection = UserCollection(self.database)
+        self.user_collection.add_users([(user_id, "Name", "Last", f"{user_id}@uw.edu")
+                                        for user_id in ("ale", "bryce", "carol", "dan")])
+        self.follow_collection = FollowCollection(self.database, fanout_limit=2)
+        self.status_collection = UserStatusCollection(self.database,
+                                                      feed=self.follow_collection)
+
+    def tearDown(self):
+        """
+        Disconnect test databases and bind the tables back to users.db
+        """
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+
+    def feed_ids(self, user_id, **kwargs):
+        """
+        Returns the status_ids of a page of the home feed of user_id
+        """
+        statuses, _ = self.follow_collection.home_feed(user_id, **kwargs)
+        return [status.status_id for status in statuses]
+
+    def test_follow_and_unfollow(self):
+        """
+        Follows are unique, between existing distinct users
+        """
+        self.assertTrue(self.follow_collection.follow("ale", "bryce"))
+        self.assertFalse(self.follow_collection.follow("ale", "bryce"))
+        self.assertFalse(self.follow_collection.follow("ale", "ale"))
+        self.assertFalse(self.follow_collection.follow("ale", "nobody"))
+        self.assertEqual(self.follow_collection.following("ale"), ["bryce"])
+        self.assertEqual(self.follow_collection.follower_count("bryce"), 1)
+        self.assertTrue(self.follow_collection.unfollow("ale", "bryce"))
+        self.assertFalse(self.follow_collection.unfollow("ale", "bryce"))
+
+    def test_fan_out_on_write(self):
+        """
+        New statuses land in the followers' feeds, newest first
+        """
+        self.follow_collection.follow("ale", "bryce")
+        self.status_collection.add_status("bryce_1", "bryce", "Hello")
+        self.status_collection.add_statuses([("bryce_2", "bryce", "Again"),
+                                             ("dan_1", "dan", "Not followed")])
+        statuses, cursor = self.follow_collection.home_feed("ale")
+        self.assertEqual(statuses, [StatusRow("bryce_2", "bryce", "Again"),
+                                    StatusRow("bryce_1", "bryce", "Hello")])
+        self.assertIsNone(cursor)
+        self.assertEqual(self.feed_ids("bryce"), [])
+
+    def test_backfill_and_unfollow_cleanup(self):
+        """
+        Following copies recent statuses in; unfollowing takes them out
+        """
+        self.status_collection.add_status("bryce_1", "bryce", "Hello")
+        self.follow_collection.follow("ale", "bryce")
+        self.assertEqual(self.feed_ids("ale"), ["bryce_1"])
+        self.follow_collection.unfollow("ale", "bryce")
+        self.assertEqual(self.feed_ids("ale"), [])
+
+    def test_celebrity_fan_out_on_read(self):
+        """
+        A celebrity's statuses are merged in at read time, in order and
+        without duplicates
+        """
+        self.follow_collection.follow("ale", "carol")
+        self.status_collection.add_status("carol_1", "carol", "Before fame")
+        self.follow_collection.follow("bryce", "carol")
+        self.follow_collection.follow("dan", "carol")
+        self.follow_collection.follow("ale", "bryce")
+        self.status_collection.add_status("bryce_1", "bryce", "Hi")
+        self.status_collection.add_status("carol_2", "carol", "Famous now")
+        self.status_collection.add_status("bryce_2", "bryce", "Hi again")
+        written = self.database.execute_sql('SELECT COUNT(*) FROM "feedtable" '
+                                            'WHERE "status_id" = ?', ("carol_2",))
+        self.assertEqual(written.fetchone()[0], 0)
+        self.assertEqual(self.feed_ids("ale"), ["bryce_2", "carol_2", "bryce_1", "carol_1"])
+        self.assertEqual(self.feed_ids("dan"), ["carol_2", "carol_1"])
+
+    def test_pages(self):
+        """
+        The cursor of a page gives the next one
+        """
+        self.follow_collection.follow("ale", "bryce")
+        self.status_collection.add_statuses([(f"bryce_{i}", "bryce", "Hi") for i in range(5)])
+        statuses, cursor = self.follow_collection.home_feed("ale", page_size=3)
+        self.assertEqual(len(statuses), 3)
+        statuses, cursor = self.follow_collection.home_feed("ale", cursor, page_size=3)
+        self.assertEqual([status.status_id for status in statuses], ["bryce_1", "bryce_0"])
+        self.assertIsNone(cursor)
+
+    def test_deletes_cascade_to_feeds(self):
+        """
+        Deleting a status or its author removes it from the feeds
+        """
+        self.follow_collection.follow("ale", "bryce")
+        self.follow_collection.follow("ale", "dan")
+        self.status_collection.add_status("bryce_1", "bryce", "Hello")
+        self.status_collection.add_status("dan_1", "dan", "Hey")
+        self.status_collection.delete_status("bryce_1")
+        self.user_collection.delete_user("dan")
+        self.assertEqual(self.feed_ids("ale"), [])
+        self.assertEqual(self.follow_collection.following("ale"), ["bryce"])
@@ -0,0 +1,92 @@
+"""
+Unit testing the group-commit writer in group_commit.py
+"""
+import os
+import tempfile
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from group_commit import GroupCommitWriter
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestGroupCommitWriter(TestCase):
+    """
+    Testing that buffered statuses are committed with add_status results
+    """
+    def setUp(self):
+        """
+        Create a database file with two users; the flusher thread opens
+        its own connection to it
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = SqliteDatabase(os.path.join(self.directory.name, "group.db"),
+                                       pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        UserCollection(self.database).add_users([("ale314", "Audrey", "Le", "a@uw.edu"),
+                                                 ("bryce05", "Bryce", "Brown", "b@uw.edu")])
+        self.status_collection = UserStatusCollection(self.database)
+
+    def tearDown(self):
+        """
+        Disconnect test databases and bind the tables back to users.db
+        """
+        self.database.close()
+        self.directory.cleanup()
+        database.bind([UsersTable, UserStatusTable])
+
+    def test_results_match_add_status(self):
+        """
+        Duplicates and unknown users resolve to False, the others to True
+        """
+        with GroupCommitWriter(self.status_collection, interval=0.05) as writer:
+            futures = [writer.add_status("ale314_1", "ale314", "Hello"),
+                       writer.add_status("ale314_1", "ale314", "Hello"),
+                       writer.add_status("nobody_1", "nobody", "Hi"),
+                       writer.add_status("bryce05_1", "bryce05", "Hey")]
+            self.assertEqual([future.result(5) for future in futures],
+                             [True, False, False, True])
+            self.assertFalse(writer.add_status("bryce05_1", "bryce05", "Hey").result(5))
+        self.assertEqual(self.status_collection.search_status("bryce05_1").status_text, "Hey")
+
+    def test_model_instance_user(self):
+        """
+        A UsersTable instance as user_id resolves to True, as add_status returns
+        """
+        user = UsersTable.get(UsersTable.user_id == "ale314")
+        with GroupCommitWriter(self.status_collection, interval=0.05) as writer:
+            self.assertTrue(writer.add_status("ale314_1", user, "Hello").result(5))
+            self.assertFalse(writer.add_status("ale314_1", user, "Hello").result(5))
+        self.assertEqual(self.status_collection.search_status("ale314_1").user_id_id, "ale314")
+
+    def test_groups_by_max_rows(self):
+        """
+        A full group is committed without waiting for the interval
+        """
+        with GroupCommitWriter(self.status_collection, interval=60, max_rows=3) as writer:
+            futures = [writer.add_status(f"ale314_{i}", "ale314", "Hi") for i in range(3)]
+            self.assertTrue(all(future.result(5) for future in futures))
+
+    def test_close_commits_the_rest(self):
+        """
+        Closing commits what is buffered and refuses new statuses
+        """
+        writer = GroupCommitWriter(self.status_collection, interval=60)
+        future = writer.add_status("ale314_1", "ale314", "Hello")
+        writer.close()
+        self.assertTrue(future.done() and future.result())
+        with self.assertRaises(RuntimeError):
+            writer.add_status("ale314_2", "ale314", "Again")
+
+    def test_flush(self):
+        """
+        flush() returns once the buffered statuses are committed
+        """
+        with GroupCommitWriter(self.status_collection, interval=0.01) as writer:
+            futures = [writer.add_status(f"ale314_{i}", "ale314", "Hi") for i in range(10)]
+            writer.flush()
+            self.assertTrue(all(future.done() for future in futures))
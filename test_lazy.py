@@ -0,0 +1,51 @@
+"""
+Unit testing the deferred imports in lazy.py and the startup of main.py
+"""
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from lazy import LazyAttribute, LazyModule
+
+
+class TestLazy(TestCase):
+    """
+    Testing that modules are only imported when first used
+    """
+    def test_lazy_module(self):
+        """
+        The module is imported by the first attribute read
+        """
+        module = LazyModule("json")
+        self.assertIn("not loaded", repr(module))
+        self.assertEqual(module.dumps([1]), "[1]")
+        self.assertIn("(loaded)", repr(module))
+
+    def test_lazy_attribute(self):
+        """
+        The attribute of the module is looked up on first use
+        """
+        path = LazyAttribute("os", "path")
+        self.assertEqual(path.join("a", "b"), os.path.join("a", "b"))
+
+    def test_main_import_has_no_side_effects(self):
+        """
+        Importing main neither connects to the database nor sets up logging
+        """
+        code = ("import sys, main; "
+                "print(sorted({'peewee', 'loguru', 'socialnetwork_model'} & set(sys.modules)))")
+        done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(done.stdout.strip(), "[]")
+        self.assertEqual(done.stderr, "")
+
+    def test_async_main_import_leaves_the_model_unloaded(self):
+        """
+        Importing async_main doesn't import the collections and the database
+        """
+        code = ("import sys, async_main; "
+                "print(sorted({'peewee', 'socialnetwork_model', 'user_status'} & set(sys.modules)))")
+        done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(done.stdout.strip(), "[]")
@@ -15,7 +15,11 @@ something along the lines of "main.add_status etc. should also return None)
 In this light, I would make sure that the unittests for load_csv_to_db functions
 work since they are unique to the main.py file.
 """
+import gzip
 import io
+import json
+import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import MagicMock, patch, mock_open
 
@@ -69,6 +73,46 @@ class TestMain(TestCase):
                                  ['Detailed error message:'])  # the error message cuts
                 # out for some reason
 
+    def test_load_error_quiet(self):
+        """
+        Quiet mode keeps the loaders' error messages off the console
+        """
+        with patch('log_config.QUIET', True):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                self.assertFalse(main.load_accounts_csv_to_db('missing.csv',
+                                                              users.UserCollection))
+                self.assertFalse(main.load_status_csv_to_db('missing.csv',
+                                                            user_status.UserStatusCollection))
+                self.assertEqual(mock_stdout.getvalue(), "")
+
+    def test_bulk_load_accounts_csv_to_db_success(self):
+        """
+        Testing the chunked bulk loader counts inserted, skipped and rejected rows
+        """
+        user_collection = MagicMock()
+        # the first chunk inserts both rows, the second skips its only valid row
+        user_collection.add_users.side_effect = [2, 0]
+        csv_data = ("USER_ID,NAME,LASTNAME,EMAIL\n"
+                    "serena.tennis,Serena,Williams,serena.tennis@gmail.com\n"
+                    "venus.tennis,Venus,Williams,venus.tennis@gmail.com\n"
+                    "serena.tennis,Serena,Williams,serena.tennis@gmail.com\n"
+                    "no.email,No,Email,\n")
+        with patch('main.open', mock_open(read_data=csv_data)):
+            report = main.bulk_load_accounts_csv_to_db('file.csv', user_collection,
+                                                       chunk_size=2)
+        self.assertEqual(report, {"inserted": 2, "skipped": 1, "rejected": 1})
+        user_collection.add_users.assert_called_with(
+            [("serena.tennis", "Serena", "Williams", "serena.tennis@gmail.com")])
+
+    def test_bulk_load_accounts_csv_to_db_file_not_found(self):
+        """
+        Testing FileNotFoundError exception in bulk_load_accounts_csv_to_db
+        """
+        with patch('main.open', mock_open()) as mock_file:
+            with patch("sys.stdout", new_callable=io.StringIO):
+                mock_file.side_effect = FileNotFoundError
+                self.assertFalse(main.bulk_load_accounts_csv_to_db('file.csv', MagicMock()))
+
     def test_load_status_csv_to_db_success(self):
         """
         Testing loading status data to UserStatusTable in database.
@@ -80,6 +124,62 @@ class TestMain(TestCase):
         self.assertTrue(main.load_status_csv_to_db('test_main_load_status_file.csv',
                                                    test_status_collection))
 
+    def test_bulk_load_status_csv_to_db_success(self):
+        """
+        Testing the chunked bulk status loader merges the report of every chunk
+        """
+        status_collection = MagicMock()
+        orphan = ("shaggy1_00001", "shaggy1", "Zoinks!")
+        duplicate = ("serena.tennis_00001", "serena.tennis", "Again")
+        status_collection.add_statuses.side_effect = [
+            {"inserted": 1, "orphaned": [orphan], "duplicates": []},
+            {"inserted": 0, "orphaned": [], "duplicates": [duplicate]},
+        ]
+        csv_data = ("STATUS_ID,USER_ID,STATUS_TEXT\n"
+                    "serena.tennis_00001,serena.tennis,I don't like to lose\n"
+                    "shaggy1_00001,shaggy1,Zoinks!\n"
+                    "serena.tennis_00001,serena.tennis,Again\n"
+                    ",serena.tennis,No status id\n")
+        with patch('main.open', mock_open(read_data=csv_data)):
+            report = main.bulk_load_status_csv_to_db('file.csv', status_collection,
+                                                     chunk_size=2)
+        self.assertEqual(report, {"inserted": 1, "rejected": 1,
+                                  "orphaned": [orphan], "duplicates": [duplicate]})
+
+    def test_bulk_load_accounts_csv_to_db_mmap(self):
+        """
+        Testing the bulk loader with the memory-mapped reader on the test user file
+        """
+        user_collection = MagicMock()
+        user_collection.add_users.side_effect = len
+        report = main.bulk_load_accounts_csv_to_db('test_main_load_user_file.csv',
+                                                   user_collection, use_mmap=True)
+        expected = main.bulk_load_accounts_csv_to_db('test_main_load_user_file.csv',
+                                                     user_collection)
+        self.assertEqual(report, expected)
+        self.assertGreater(report["inserted"], 0)
+
+    def test_parallel_load_accounts_csv_to_db_success(self):
+        """
+        Testing the pipelined account loader on the test user file
+        """
+        user_collection = MagicMock()
+        user_collection.add_users.return_value = 1
+        report = main.parallel_load_accounts_csv_to_db('test_main_load_user_file.csv',
+                                                       user_collection, workers=1)
+        self.assertEqual(report, {"inserted": 1, "skipped": 1, "rejected": 0})
+        user_collection.add_users.assert_called_with(
+            [("Melitta.Zacharia32", "Melitta", "Zacharia", "Melitta.Zacharia32@goodmail.com"),
+             ("Ashien.Amos47", "Ashien", "Amos", "Ashien.Amos47@goodmail.com")])
+
+    def test_parallel_load_status_csv_to_db_file_not_found(self):
+        """
+        Testing FileNotFoundError exception in parallel_load_status_csv_to_db
+        """
+        with patch("sys.stdout", new_callable=io.StringIO):
+            self.assertFalse(main.parallel_load_status_csv_to_db('no_such_file.csv',
+                                                                 MagicMock()))
+
     def test_load_status_csv_to_db_file_not_found(self):
         """
         Testing FileNotFoundError exception in load_status_csv_to_db
@@ -152,6 +252,18 @@ class TestMain(TestCase):
         # Verify that the function that was passed to main.search_user returned False
         self.assertFalse(main.search_user(mock_user, user_collection))
 
+    def test_search_users(self):
+        """
+        Mocking search_users in main.py
+        """
+        user_collection = MagicMock()
+        user_collection.search_users.return_value = ({"serena.tennis": MagicMock()},
+                                                     ["venus.tennis"])
+        found, missing = main.search_users(["serena.tennis", "venus.tennis"], user_collection)
+        self.assertEqual(list(found), ["serena.tennis"])
+        self.assertEqual(missing, ["venus.tennis"])
+        user_collection.search_users.assert_called_with(["serena.tennis", "venus.tennis"])
+
     def test_delete_user_success(self):
         """
         Mocking delete_user in main.py
@@ -184,6 +296,26 @@ class TestMain(TestCase):
         # should return False
         self.assertFalse(main.delete_user(mock_user.user_id, user_collection))
 
+    def test_delete_users_from_file(self):
+        """
+        Mocking delete_users_from_file in main.py with a file of user_ids
+        """
+        user_collection = MagicMock()
+        user_collection.delete_users.side_effect = lambda user_ids, chunk_size: [
+            {"users": len(list(user_ids)), "statuses": 0}]
+        with patch('main.open', mock_open(read_data="serena.tennis\n\nvenus.tennis\n")):
+            batches = main.delete_users_from_file('spam.txt', user_collection, 100)
+        self.assertEqual(batches, [{"users": 2, "statuses": 0}])
+
+    def test_delete_users_from_file_not_found(self):
+        """
+        Testing FileNotFoundError exception in delete_users_from_file
+        """
+        with patch('main.open', mock_open()) as mock_file:
+            with patch("sys.stdout", new_callable=io.StringIO):
+                mock_file.side_effect = FileNotFoundError
+                self.assertFalse(main.delete_users_from_file('spam.txt', MagicMock()))
+
     def test_update_email_success(self):
         """
         Mocking update_email in main.py
@@ -283,6 +415,36 @@ class TestMain(TestCase):
         # Verify that main.search_status also returns None
         self.assertIsNone(main.search_status(mock_status.status_id, status_collection))
 
+    def test_search_statuses(self):
+        """
+        Mocking search_statuses in main.py
+        """
+        status_collection = MagicMock()
+        status_collection.search_statuses.return_value = ({}, ["serena.tennis_00001"])
+        self.assertEqual(main.search_statuses(["serena.tennis_00001"], status_collection),
+                         ({}, ["serena.tennis_00001"]))
+        status_collection.search_statuses.assert_called_with(["serena.tennis_00001"])
+
+    def test_list_statuses(self):
+        """
+        Mocking list_statuses in main.py
+        """
+        status_collection = MagicMock()
+        status_collection.list_statuses.return_value = ([], None)
+        self.assertEqual(main.list_statuses("serena.tennis", status_collection,
+                                            "serena.tennis_00001", 10), ([], None))
+        status_collection.list_statuses.assert_called_with("serena.tennis",
+                                                           "serena.tennis_00001", 10)
+
+    def test_search_status_text(self):
+        """
+        Mocking search_status_text in main.py
+        """
+        status_collection = MagicMock()
+        status_collection.search_status_text.return_value = []
+        self.assertEqual(main.search_status_text("lose", status_collection), [])
+        status_collection.search_status_text.assert_called_with("lose", 1, 20)
+
     def test_delete_status_success(self):
         """
         Mocking delete_status in main.py
@@ -345,3 +507,100 @@ class TestMain(TestCase):
         # Verify that main.delete_status also returns None
         self.assertIsNone(main.update_status(mock_status.status_id, mock_status.status_text,
                                             status_collection))
+
+    def test_update_emails(self):
+        """
+        Mocking update_emails in main.py
+        """
+        user_collection = MagicMock()
+        user_collection.update_emails.return_value = (1, ["venus.tennis"])
+        emails = {"serena.tennis": "serena@tennis.com", "venus.tennis": "venus@tennis.com"}
+        self.assertEqual(main.update_emails(emails, user_collection), (1, ["venus.tennis"]))
+        user_collection.update_emails.assert_called_with(emails)
+
+    def test_update_statuses(self):
+        """
+        Mocking update_statuses in main.py
+        """
+        status_collection = MagicMock()
+        status_collection.update_status_texts.return_value = (1, [])
+        status_texts = {"simba_lion_00001": "Hakuna matata"}
+        self.assertEqual(main.update_statuses(status_texts, status_collection), (1, []))
+        status_collection.update_status_texts.assert_called_with(status_texts)
+
+    def test_export_accounts_csv(self):
+        """
+        export_accounts writes the CSV layout the account loaders read
+        """
+        user_collection = MagicMock()
+        user_collection.iter_user_rows.return_value = iter(
+            [("serena.tennis", "Serena", "Williams", "serena.tennis@gmail.com")])
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, "accounts.csv")
+            self.assertEqual(main.export_accounts(file, user_collection), 1)
+            loader = MagicMock()
+            loader.add_users.return_value = 1
+            report = main.bulk_load_accounts_csv_to_db(file, loader)
+        self.assertEqual(report, {"inserted": 1, "skipped": 0, "rejected": 0})
+        loader.add_users.assert_called_with(
+            [("serena.tennis", "Serena", "Williams", "serena.tennis@gmail.com")])
+
+    def test_export_statuses_jsonl_gz(self):
+        """
+        export_statuses writes gzipped JSON Lines for a .jsonl.gz file
+        """
+        status_collection = MagicMock()
+        status_collection.iter_status_rows.return_value = iter(
+            [("simba_lion_00001", "simba_lion", "Hakuna, matata"),
+             ("simba_lion_00002", "simba_lion", "I am king")])
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, "statuses.jsonl.gz")
+            self.assertEqual(main.export_statuses(file, status_collection), 2)
+            with gzip.open(file, "rt", encoding="utf-8") as export_file:
+                rows = [json.loads(line) for line in export_file]
+        self.assertEqual(rows[0], {"STATUS_ID": "simba_lion_00001", "USER_ID": "simba_lion",
+                                   "STATUS_TEXT": "Hakuna, matata"})
+        self.assertEqual(len(rows), 2)
+
+    def test_export_accounts_file_not_found(self):
+        """
+        export_accounts returns False when the file can't be created
+        """
+        with patch("sys.stdout", new_callable=io.StringIO):
+            self.assertFalse(main.export_accounts("no/such/dir/accounts.csv", MagicMock()))
+
+    def test_follow_user(self):
+        """
+        Mocking follow_user and unfollow_user in main.py
+        """
+        follow_collection = MagicMock()
+        follow_collection.follow.return_value = True
+        follow_collection.unfollow.return_value = False
+        self.assertTrue(main.follow_user("serena.tennis", "venus.tennis", follow_collection))
+        follow_collection.follow.assert_called_with("serena.tennis", "venus.tennis")
+        self.assertFalse(main.unfollow_user("serena.tennis", "venus.tennis",
+                                            follow_collection))
+
+    def test_home_feed(self):
+        """
+        Mocking home_feed in main.py
+        """
+        follow_collection = MagicMock()
+        follow_collection.home_feed.return_value = ([], None)
+        self.assertEqual(main.home_feed("serena.tennis", follow_collection), ([], None))
+        follow_collection.home_feed.assert_called_with("serena.tennis", None,
+                                                       user_status.PAGE_SIZE)
+
+    def test_init_sharded_collections(self):
+        """
+        Testing the functions that open the shards and their collections
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            shard_databases = main.init_shards(directory, 2)
+            self.assertTrue(os.path.exists(os.path.join(directory, "shard1.db")))
+            user_collection = main.init_sharded_user_collection(shard_databases)
+            status_collection = main.init_sharded_status_collection(shard_databases)
+            self.assertEqual(len(user_collection.collections), 2)
+            self.assertEqual(len(status_collection.collections), 2)
+            for shard in shard_databases:
+                shard.close()
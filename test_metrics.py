@@ -0,0 +1,109 @@
+"""
+Unit testing the instrumentation in metrics.py
+"""
+from unittest import TestCase
+from urllib.request import urlopen
+
+from peewee import IntegrityError, SqliteDatabase
+
+from metrics import Metrics, serve_metrics
+from socialnetwork_model import UserStatusTable, UsersTable
+from user_status import UserStatusCollection
+from users import UserCollection
+
+
+class TestMetrics(TestCase):
+    """
+    Testing the metrics recorded by instrumented collections
+    """
+    def setUp(self):
+        """
+        Create an in-memory database and collections sharing a Metrics
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.connect()
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.metrics = Metrics(slow_query_seconds=0)
+        self.user_collection = UserCollection(self.database, metrics=self.metrics)
+        self.status_collection = UserStatusCollection(self.database, metrics=self.metrics)
+
+    def tearDown(self):
+        """
+        Disconnect test databases
+        """
+        self.database.drop_tables([UserStatusTable, UsersTable])
+        self.database.close()
+
+    def test_counts_by_outcome(self):
+        """
+        Calls are counted as success or failure by what the method returned
+        """
+        self.user_collection.add_user("ale314", "Audrey", "Le", "ale314@uw.edu")
+        self.user_collection.add_user("ale314", "Audrey", "Le", "ale314@uw.edu")
+        self.user_collection.search_user("ale314")
+        self.status_collection.search_status("ale314_00001")
+        methods = self.metrics.snapshot()["methods"]
+        self.assertEqual(methods["UserCollection.add_user"]["success"]["count"], 1)
+        self.assertEqual(methods["UserCollection.add_user"]["failure"]["count"], 1)
+        self.assertEqual(methods["UserCollection.search_user"]["success"]["count"], 1)
+        self.assertEqual(methods["UserStatusCollection.search_status"]["failure"]["count"], 1)
+        self.assertEqual(methods["UserCollection.add_user"]["success"]["buckets"]["inf"], 1)
+
+    def test_errors_are_counted_and_raised(self):
+        """
+        Exceptions are counted as errors and still reach the caller
+        """
+        self.database.drop_tables([UserStatusTable])
+        with self.assertRaises(Exception):
+            self.status_collection.search_statuses(["ale314_00001"])
+        methods = self.metrics.snapshot()["methods"]
+        self.assertEqual(methods["UserStatusCollection.search_statuses"]["error"]["count"], 1)
+        self.database.create_tables([UserStatusTable])
+
+    def test_slow_queries(self):
+        """
+        Statements slower than slow_query_seconds are kept with their SQL text
+        """
+        self.metrics.attach(self.database)
+        self.user_collection.search_user("ale314")
+        slow_queries = self.metrics.snapshot()["slow_queries"]
+        self.assertTrue(any('FROM "userstable"' in query["sql"] and
+                            query["params"][0] == "ale314" for query in slow_queries))
+        self.assertGreater(self.metrics.snapshot()["methods"]["sql"]["success"]["count"], 0)
+
+    def test_failed_statements_are_errors(self):
+        """
+        A statement that raises is counted as an sql error, not a success
+        """
+        self.metrics.attach(self.database)
+        self.user_collection.add_user("ale314", "Audrey", "Le", "ale314@uw.edu")
+        successes = self.metrics.snapshot()["methods"]["sql"]["success"]["count"]
+        with self.assertRaises(IntegrityError):
+            self.database.execute_sql('INSERT INTO "userstable" VALUES (?, ?, ?, ?)',
+                                      ("ale314", "Audrey", "Le", "ale314@uw.edu"))
+        sql = self.metrics.snapshot()["methods"]["sql"]
+        self.assertEqual(sql["error"]["count"], 1)
+        self.assertEqual(sql["success"]["count"], successes)
+
+    def test_prometheus_text(self):
+        """
+        The text dump has buckets, sum and count for every method and outcome
+        """
+        self.user_collection.search_user("ale314")
+        text = self.metrics.prometheus_text()
+        labels = 'method="UserCollection.search_user",outcome="failure"'
+        self.assertIn(f'socialnetwork_call_seconds_bucket{{{labels},le="+Inf"}} 1', text)
+        self.assertIn(f"socialnetwork_call_seconds_count{{{labels}}} 1", text)
+
+    def test_serve_metrics(self):
+        """
+        A scraper can read the text dump over HTTP
+        """
+        self.user_collection.search_user("ale314")
+        server = serve_metrics(self.metrics, port=0)
+        try:
+            with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+                self.assertIn("UserCollection.search_user", response.read().decode())
+        finally:
+            server.shutdown()
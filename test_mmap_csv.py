@@ -0,0 +1,100 @@
+"""
+Unit testing the memory-mapped CSV reader in mmap_csv.py
+"""
+import os
+import tempfile
+from csv import DictReader
+from unittest import TestCase
+
+import main
+import mmap_csv
+
+RECORDS = [
+    "﻿STATUS_ID,USER_ID,STATUS_TEXT\r\n",
+    "evmiles97_00001,evmiles97,\"Code, code, code!\"\r\n",
+    "\r\n",
+    "dave03_00001,dave03,\"She said \"\"hi\"\"\"\r\n",
+    "dave03_00002,dave03,\"First line\nsecond line\"\r\n",
+    "dave03_00003,dave03,\r\n",
+    "short.row,dave03\r\n",
+    "dave03_00004,dave03,Sunny today\r\n",
+    "dave03_00006,dave03,I am 5\" tall\r\n",
+    "dave03_00007,dave03,ok\r\n",
+    "dave03_00005,dave03,No newline at the end",
+]
+
+
+class TestMmapCsv(TestCase):
+    """
+    Testing that read_tuples reads the same rows as DictReader
+    """
+    def setUp(self):
+        """
+        Write a status file with quoting, blank lines and invalid records
+        """
+        handle, self.file = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(handle, "w", encoding="utf-8", newline="") as csv_file:
+            csv_file.write("".join(RECORDS))
+
+    def tearDown(self):
+        """
+        Remove the temporary file
+        """
+        os.remove(self.file)
+
+    def dict_reader_rows(self, columns):
+        """
+        Returns the rows main.csv_row gets from DictReader
+        """
+        with open(self.file, "r", encoding="utf-8-sig", newline="") as csv_file:
+            return [main.csv_row(row, columns) for row in DictReader(csv_file)]
+
+    def test_same_rows_as_dict_reader(self):
+        """
+        Quoted commas, doubled quotes and quoted newlines are read like
+        DictReader reads them, whatever the block size
+        """
+        expected = self.dict_reader_rows(main.STATUS_COLUMNS)
+        self.assertEqual(expected[2], ("dave03_00002", "dave03", "First line\nsecond line"))
+        for block_size in (1, 7, 64, mmap_csv.BLOCK_SIZE):
+            with open(self.file, "rb") as csv_file:
+                rows = list(mmap_csv.read_tuples(csv_file, main.STATUS_COLUMNS, block_size))
+            self.assertEqual(rows, expected)
+
+    def test_single_and_missing_columns(self):
+        """
+        One column gives 1-tuples; a column the header lacks rejects every record
+        """
+        with open(self.file, "rb") as csv_file:
+            rows = list(mmap_csv.read_tuples(csv_file, ("USER_ID",)))
+        self.assertEqual(rows[0], ("evmiles97",))
+        with open(self.file, "rb") as csv_file:
+            rows = list(mmap_csv.read_tuples(csv_file, ("USER_ID", "EMAIL")))
+        self.assertEqual(rows, [None] * 9)
+
+    def test_stray_quote_in_unquoted_field(self):
+        """
+        A quote inside an unquoted field is a literal, as for DictReader,
+        and does not swallow the next line
+        """
+        with open(self.file, "rb") as csv_file:
+            rows = list(mmap_csv.read_tuples(csv_file, main.STATUS_COLUMNS))
+        self.assertIn(("dave03_00006", "dave03", 'I am 5" tall'), rows)
+        self.assertIn(("dave03_00007", "dave03", "ok"), rows)
+
+    def test_csv_error_rejects_the_record(self):
+        """
+        A record the csv module can't parse is rejected, not raised
+        """
+        with tempfile.TemporaryFile() as csv_file:
+            csv_file.write(b'STATUS_ID,USER_ID,STATUS_TEXT\ns1,u1,"a"b\rc\ns2,u1,ok\n')
+            csv_file.seek(0)
+            rows = list(mmap_csv.read_tuples(csv_file, main.STATUS_COLUMNS))
+        self.assertEqual(rows, [None, ("s2", "u1", "ok")])
+
+    def test_empty_file(self):
+        """
+        An empty file has no rows
+        """
+        with tempfile.TemporaryFile() as csv_file:
+            self.assertEqual(list(mmap_csv.read_tuples(csv_file, main.STATUS_COLUMNS)), [])
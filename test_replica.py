@@ -0,0 +1,126 @@
+"""
+Unit testing the in-memory read replica of UsersTable in replica.py
+"""
+from unittest import TestCase
+
+from peewee import SqliteDatabase
+
+from replica import UserReplica, drop_change_log, model_size
+from rows import UserRow
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from users import UserCollection
+
+
+class TestUserReplica(TestCase):
+    """
+    Testing that the replica follows UsersTable through its change log
+    """
+    def setUp(self):
+        """
+        Create an in-memory database with two users and a loaded replica
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.create_tables([UsersTable, UserStatusTable])
+        UserCollection(self.database).add_users(
+            [("ale314", "Audrey", "Le", "ale314@uw.edu"),
+             ("bryce05", "Bryce", "Brown", "bryce05@gmail.com")])
+        self.replica = UserReplica(self.database).load()
+        self.user_collection = UserCollection(self.database, replica=self.replica)
+
+    def tearDown(self):
+        """
+        Disconnect test databases and bind the tables back to users.db
+        """
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+
+    def test_search_from_replica(self):
+        """
+        Searches return UserRow tuples from memory
+        """
+        self.assertEqual(self.user_collection.search_user("ale314"),
+                         UserRow("ale314", "Audrey", "Le", "ale314@uw.edu"))
+        self.assertIsNone(self.user_collection.search_user("strumpf"))
+        found, missing = self.user_collection.search_users(["bryce05", "strumpf"])
+        self.assertEqual(found["bryce05"].email, "bryce05@gmail.com")
+        self.assertEqual(missing, ["strumpf"])
+
+    def test_collection_writes_refresh_replica(self):
+        """
+        The collection's own writes show up in the replica at once
+        """
+        self.user_collection.add_user("carol1", "Carol", "Kim", "carol1@uw.edu")
+        self.user_collection.update_email("ale314", "audrey314.le@gmail.com")
+        self.user_collection.delete_user("bryce05")
+        self.assertEqual(self.user_collection.search_user("carol1").user_name, "Carol")
+        self.assertEqual(self.user_collection.search_user("ale314").email,
+                         "audrey314.le@gmail.com")
+        self.assertIsNone(self.user_collection.search_user("bryce05"))
+        self.assertEqual(len(self.replica), 2)
+
+    def test_refresh_applies_other_writers(self):
+        """
+        Writes that bypass the collection are applied by refresh()
+        """
+        self.database.execute_sql('UPDATE "userstable" SET "user_id" = ? WHERE "user_id" = ?',
+                                  ("audrey.le", "ale314"))
+        self.database.execute_sql('INSERT INTO "userstable" VALUES (?, ?, ?, ?)',
+                                  ("dan7", "Dan", "Le", "dan7@uw.edu"))
+        self.assertIsNone(self.replica.get("dan7"))
+        self.assertEqual(self.replica.refresh(), 3)
+        self.assertIsNone(self.replica.get("ale314"))
+        self.assertEqual(self.replica.get("audrey.le").user_name, "Audrey")
+        self.assertEqual(self.replica.get("dan7").user_last_name, "Le")
+        self.assertEqual(self.replica.refresh(), 0)
+
+    def test_prune_and_reuse_positions(self):
+        """
+        Pruning empties the applied log; deleted positions are reused
+        """
+        self.user_collection.delete_user("ale314")
+        self.user_collection.add_user("carol1", "Carol", "Kim", "carol1@uw.edu")
+        self.assertEqual(len(self.replica._ids), 2)  # pylint: disable=W0212
+        self.replica.prune()
+        count = self.database.execute_sql('SELECT COUNT(*) FROM "userstable_changes"')
+        self.assertEqual(count.fetchone()[0], 0)
+
+    def test_memory_usage_below_model(self):
+        """
+        A user takes less memory in the replica than as a model instance
+        """
+        self.user_collection.add_users([(f"user{i}", "Name", "Last", f"user{i}@uw.edu")
+                                        for i in range(1000)])
+        usage = self.replica.memory_usage()
+        self.assertGreater(usage["bytes"], 0)
+        self.assertLess(usage["bytes_per_user"],
+                        model_size(UsersTable.get(UsersTable.user_id == "ale314")))
+
+    def log_size(self):
+        """
+        Returns the number of entries in the change log
+        """
+        return self.database.execute_sql('SELECT COUNT(*) FROM "userstable_changes"').fetchone()[0]
+
+    def test_refresh_prunes_applied_changes(self):
+        """
+        The log only keeps the writes the replica has not applied yet
+        """
+        self.assertEqual(self.log_size(), 0)
+        self.user_collection.add_users([(f"user{i}", "Name", "Last", f"user{i}@uw.edu")
+                                        for i in range(10)])
+        self.assertEqual(self.log_size(), 0)
+        self.database.execute_sql('DELETE FROM "userstable" WHERE "user_id" = ?', ("user1",))
+        self.assertEqual(self.log_size(), 1)
+        self.replica.refresh()
+        self.assertEqual(self.log_size(), 0)
+
+    def test_drop_change_log(self):
+        """
+        Dropping the log removes the triggers along with it, so that
+        writes don't create it again
+        """
+        drop_change_log(self.database)
+        self.assertNotIn("userstable_changes", self.database.get_tables())
+        UserCollection(self.database).add_user("carol1", "Carol", "Kim", "carol1@uw.edu")
+        self.assertNotIn("userstable_changes", self.database.get_tables())
@@ -0,0 +1,178 @@
+"""
+Unit testing the sharded collections in shards.py
+"""
+import tempfile
+from unittest import TestCase
+
+import main
+from rows import StatusRow, UserRow
+from shards import (ShardedUserCollection, ShardedUserStatusCollection, open_shards,
+                    shard_index)
+from socialnetwork_model import UsersTable
+
+USERS = [(f"user{i}", "Name", "Last", f"user{i}@uw.edu") for i in range(20)]
+
+
+class TestShards(TestCase):
+    """
+    Testing that users and their statuses are spread over the shards and
+    that the batch methods merge the results of every shard
+    """
+    def setUp(self):
+        """
+        Open three shard files in a temporary directory with 20 users
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.shard_databases = open_shards(self.directory.name, 3)
+        self.user_collection = ShardedUserCollection(self.shard_databases, row_mode=True)
+        self.status_collection = ShardedUserStatusCollection(self.shard_databases,
+                                                             row_mode=True)
+        self.user_collection.add_users(USERS)
+
+    def tearDown(self):
+        """
+        Disconnect the shards and delete their files
+        """
+        self.user_collection.executor.shutdown()
+        self.status_collection.executor.shutdown()
+        for shard in self.shard_databases:
+            shard.close()
+        self.directory.cleanup()
+
+    def shard_user_ids(self, index):
+        """
+        Returns the user_ids stored on shard index
+        """
+        query = UsersTable.select(UsersTable.user_id).tuples()
+        return {user_id for (user_id,) in query.execute(self.shard_databases[index])}
+
+    def test_users_are_spread_by_hash(self):
+        """
+        Every user is stored once, on the shard shard_index picks
+        """
+        for index in range(3):
+            self.assertEqual(self.shard_user_ids(index),
+                             {user[0] for user in USERS if shard_index(user[0], 3) == index})
+            self.assertTrue(self.shard_user_ids(index))
+
+    def test_user_methods(self):
+        """
+        Single-user calls go to the user's shard
+        """
+        self.assertTrue(self.user_collection.add_user("ale314", "Audrey", "Le", "a@uw.edu"))
+        self.assertFalse(self.user_collection.add_user("ale314", "Audrey", "Le", "a@uw.edu"))
+        self.assertTrue(self.user_collection.update_email("ale314", "b@uw.edu"))
+        self.assertEqual(self.user_collection.search_user("ale314"),
+                         UserRow("ale314", "Audrey", "Le", "b@uw.edu"))
+        self.assertTrue(self.user_collection.delete_user("ale314"))
+        self.assertIsNone(self.user_collection.search_user("ale314"))
+
+    def test_batch_user_methods(self):
+        """
+        Batches are split by shard and their results merged
+        """
+        self.assertEqual(self.user_collection.add_users(USERS[:5]), 0)
+        found, missing = self.user_collection.search_users(["user3", "nobody", "user17"])
+        self.assertEqual(set(found), {"user3", "user17"})
+        self.assertEqual(missing, ["nobody"])
+        updated, missing = self.user_collection.update_emails({"user1": "one@uw.edu",
+                                                               "user2": "two@uw.edu",
+                                                               "nobody": "x@uw.edu"})
+        self.assertEqual((updated, missing), (2, ["nobody"]))
+        self.assertEqual(self.user_collection.search_user("user2").email, "two@uw.edu")
+        self.assertEqual([row[0] for row in self.user_collection.iter_user_rows()],
+                         sorted(user[0] for user in USERS))
+
+    def test_statuses_follow_their_user(self):
+        """
+        Statuses are stored on their user's shard, where deleting the user
+        cascades to them
+        """
+        report = self.status_collection.add_statuses(
+            [(f"user{i}_1", f"user{i}", "Hello") for i in range(10)]
+            + [("nobody_1", "nobody", "Hi"), ("user0_1", "user0", "Again")])
+        self.assertEqual(report["inserted"], 10)
+        self.assertEqual(report["orphaned"], [("nobody_1", "nobody", "Hi")])
+        self.assertEqual(report["duplicates"], [("user0_1", "user0", "Again")])
+        self.assertEqual(self.status_collection.search_status("user4_1"),
+                         StatusRow("user4_1", "user4", "Hello"))
+        self.assertIsNone(self.status_collection.search_status("nobody_1"))
+        self.assertEqual(len(list(self.status_collection.iter_status_rows())), 10)
+        batches = self.user_collection.delete_users(["user4", "user5", "nobody"])
+        self.assertEqual(batches, [{"users": 2, "statuses": 2}])
+        found, missing = self.status_collection.search_statuses(["user4_1", "user6_1"])
+        self.assertEqual((list(found), missing), (["user6_1"], ["user4_1"]))
+
+    def test_status_methods(self):
+        """
+        Status calls by status_id find the status on any shard
+        """
+        self.assertTrue(self.status_collection.add_status("user7_1", "user7", "Hello"))
+        self.assertFalse(self.status_collection.add_status("nobody_1", "nobody", "Hi"))
+        self.assertTrue(self.status_collection.update_status_text("user7_1", "Bye"))
+        statuses, cursor = self.status_collection.list_statuses("user7")
+        self.assertEqual((statuses, cursor), ([StatusRow("user7_1", "user7", "Bye")], None))
+        updated, missing = self.status_collection.update_status_texts({"user7_1": "Hi",
+                                                                       "none_1": "Hi"})
+        self.assertEqual((updated, missing), (1, ["none_1"]))
+        self.assertTrue(self.status_collection.delete_status("user7_1"))
+        self.assertFalse(self.status_collection.delete_status("user7_1"))
+        self.assertFalse(self.status_collection.update_status_text("user7_1", "Bye"))
+
+    def test_status_ids_are_unique_across_shards(self):
+        """
+        A status_id already on one shard is turned down for a user of another
+        """
+        first, second = (next(user_id for user_id, *_ in USERS if shard_index(user_id, 3) == index)
+                         for index in (0, 1))
+        self.assertTrue(self.status_collection.add_status("s1", first, "Hello"))
+        self.assertFalse(self.status_collection.add_status("s1", second, "Hello"))
+        report = self.status_collection.add_statuses([("s1", second, "Hi"),
+                                                      ("s2", second, "Hi"),
+                                                      ("s2", first, "Hi"),
+                                                      ("s3", first, "Hi")])
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(report["duplicates"], [("s1", second, "Hi"), ("s2", first, "Hi")])
+        self.assertEqual(self.status_collection.search_status("s1").user_id, first)
+        self.assertEqual(self.status_collection.search_status("s2").user_id, second)
+
+    def test_model_mode_statuses_read_their_shard(self):
+        """
+        The user of a status returned as a model instance is read from the
+        shard of the status, not from users.db
+        """
+        status_collection = ShardedUserStatusCollection(self.shard_databases)
+        try:
+            self.assertTrue(status_collection.add_status("user7_1", "user7", "Hello"))
+            status = status_collection.search_status("user7_1")
+            self.assertEqual(status.user_id.user_id, "user7")
+            self.assertEqual(status.user_id.email, "user7@uw.edu")
+            found, _ = status_collection.search_statuses(["user7_1"])
+            self.assertEqual(found["user7_1"].user_id.user_id, "user7")
+            statuses, _ = status_collection.list_statuses("user7")
+            self.assertEqual(str(statuses[0].user_id), "user7")
+        finally:
+            status_collection.executor.shutdown()
+
+    def test_bulk_loaders_partition_by_shard(self):
+        """
+        The CSV loaders of main.py load into the shards unchanged
+        """
+        for shard in self.shard_databases:
+            shard.execute_sql('DELETE FROM "userstable"')
+        report = main.bulk_load_accounts_csv_to_db("test_main_load_user_file.csv",
+                                                   self.user_collection, chunk_size=2)
+        self.assertGreater(report["inserted"], 0)
+        self.assertEqual(sum(len(self.shard_user_ids(index)) for index in range(3)),
+                         report["inserted"])
+
+    def test_resumable_loaders_reject_shards(self):
+        """
+        The resumable loaders need a single database for their checkpoints
+        """
+        with self.assertRaises(TypeError):
+            main.resumable_load_accounts_csv_to_db("test_main_load_user_file.csv",
+                                                   self.user_collection)
+        with self.assertRaises(TypeError):
+            main.resumable_load_status_csv_to_db("test_main_load_status_file.csv",
+                                                 self.status_collection)
@@ -4,6 +4,8 @@ Unit testing methods in UserStatus class
 from unittest import TestCase
 
 from peewee import SqliteDatabase
+from cache import StatusCache
+from rows import StatusRow
 from socialnetwork_model import UserStatusTable, UsersTable
 from user_status import UserStatusCollection
 from users import UserCollection
@@ -76,6 +78,27 @@ class TestUserStatusCollection(TestCase):
         result3 = self.status_collection.search_status("scooby.doo1_00001")
         self.assertIsNone(result3)
 
+    def test_add_statuses_success(self):
+        """
+        Testing add_statuses in user_status.py reports orphaned and duplicate rows
+        """
+        statuses = [("peterpan1_00001", "peterpan1", "Second star to the right"),
+                     ("shaggy1_00001", "shaggy1", "Zoinks!"),
+                     ("scooby.doo1_00001", "scooby.doo1", "Ruh roh"),
+                     ("peterpan1_00001", "peterpan1", "Straight on till morning"),
+                     ("jerry.tom1_00001", "jerry.tom1", "Cheese please")]
+        report = self.status_collection.add_statuses(statuses)
+        self.assertEqual(report["inserted"], 2)
+        self.assertEqual(report["orphaned"], [("shaggy1_00001", "shaggy1", "Zoinks!")])
+        self.assertEqual(report["duplicates"],
+                         [("scooby.doo1_00001", "scooby.doo1", "Ruh roh"),
+                          ("peterpan1_00001", "peterpan1", "Straight on till morning")])
+        self.assertEqual(self.status_collection.search_status("peterpan1_00001").status_text,
+                         "Second star to the right")
+        # the existing status is left untouched
+        self.assertEqual(self.status_collection.search_status("scooby.doo1_00001").status_text,
+                         "Scooby, Scooby Dooo!")
+
     def test_search_status_success(self, scooby_user=None):
         """
         Testing search_status in user_status.py
@@ -84,6 +107,103 @@ class TestUserStatusCollection(TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result.status_text, "Scooby, Scooby Dooo!")
 
+    def test_search_statuses(self):
+        """
+        Testing search_statuses in user_status.py returns found statuses and missing ids
+        """
+        found, missing = self.status_collection.search_statuses(
+            ["scooby.doo1_00001", "shaggy1_00001", "king.arthur_00001"])
+        self.assertEqual(sorted(found), ["king.arthur_00001", "scooby.doo1_00001"])
+        self.assertEqual(found["king.arthur_00001"].status_text, "I live for honor")
+        self.assertEqual(missing, ["shaggy1_00001"])
+
+    def test_list_statuses_pages(self):
+        """
+        Testing list_statuses in user_status.py walks a user's statuses page by page
+        """
+        for i in range(5):
+            self.status_collection.add_status(f"peterpan1_0000{i}", "peterpan1", f"Flight {i}")
+        page, cursor = self.status_collection.list_statuses("peterpan1", page_size=2)
+        self.assertEqual([status.status_id for status in page],
+                         ["peterpan1_00000", "peterpan1_00001"])
+        page, cursor = self.status_collection.list_statuses("peterpan1", cursor, page_size=2)
+        self.assertEqual([status.status_id for status in page],
+                         ["peterpan1_00002", "peterpan1_00003"])
+        page, cursor = self.status_collection.list_statuses("peterpan1", cursor, page_size=2)
+        self.assertEqual([status.status_id for status in page], ["peterpan1_00004"])
+        self.assertIsNone(cursor)
+
+    def test_timeline_index(self):
+        """
+        Testing list_statuses leaves creating its index to create_timeline_index
+        """
+        def indexes():
+            return [index.name for index in self.database.get_indexes("userstatustable")]
+        self.status_collection.list_statuses("peterpan1")
+        self.assertNotIn("userstatustable_user_id_status_id", indexes())
+        self.status_collection.create_timeline_index()
+        self.status_collection.create_timeline_index()
+        self.assertIn("userstatustable_user_id_status_id", indexes())
+
+    def test_list_statuses_no_statuses(self):
+        """
+        Testing list_statuses in user_status.py for a user without statuses
+        """
+        self.assertEqual(self.status_collection.list_statuses("jerry.tom1"), ([], None))
+
+    def test_iter_statuses(self):
+        """
+        Testing iter_statuses in user_status.py yields every status of the user only
+        """
+        for i in range(5):
+            self.status_collection.add_status(f"peterpan1_0000{i}", "peterpan1", f"Flight {i}")
+        statuses = list(self.status_collection.iter_statuses("peterpan1", page_size=2))
+        self.assertEqual([status.status_id for status in statuses],
+                         [f"peterpan1_0000{i}" for i in range(5)])
+
+    def test_search_status_text(self):
+        """
+        Testing search_status_text in user_status.py finds statuses added before
+        and after the index exists and keeps it in sync with updates and deletes
+        """
+        self.status_collection.add_status("peterpan1_00001", "peterpan1",
+                                          "I live for flying and for honor")
+        results = self.status_collection.search_status_text("honor")
+        # the shorter status ranks first
+        self.assertEqual([status.status_id for status in results],
+                         ["king.arthur_00001", "peterpan1_00001"])
+        self.status_collection.add_statuses([("jerry.tom1_00001", "jerry.tom1",
+                                              "Honor among mice")])
+        self.status_collection.update_status_text("king.arthur_00001", "I live for glory")
+        self.status_collection.delete_status("peterpan1_00001")
+        results = self.status_collection.search_status_text("HONOR")
+        self.assertEqual([status.status_id for status in results], ["jerry.tom1_00001"])
+        self.assertEqual(results[0].status_text, "Honor among mice")
+        # the cascade from deleting a user also updates the index
+        self.user_collection.delete_user("jerry.tom1")
+        self.assertEqual(self.status_collection.search_status_text("honor"), [])
+
+    def test_search_status_text_pages(self):
+        """
+        Testing search_status_text in user_status.py pages through the results
+        """
+        for i in range(5):
+            self.status_collection.add_status(f"peterpan1_0000{i}", "peterpan1",
+                                              f"Second star number {i}")
+        first = self.status_collection.search_status_text("star", page=1, page_size=3)
+        second = self.status_collection.search_status_text("star", page=2, page_size=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({s.status_id for s in first} & {s.status_id for s in second})
+
+    def test_search_status_text_syntax(self):
+        """
+        Testing search_status_text in user_status.py treats its input as plain words
+        """
+        self.assertEqual(self.status_collection.search_status_text('Scooby "AND'),
+                         self.status_collection.search_status_text("scooby and"))
+        self.assertEqual(self.status_collection.search_status_text("   "), [])
+
     def test_search_status_by_user_fail(self):
         """
         Testing how search_status in user_status.py fails
@@ -150,6 +270,27 @@ class TestUserStatusCollection(TestCase):
         result2 = self.status_collection.search_status("merlin.wizard8_00001")
         self.assertEqual(result2.status_text, "Have you ever considered being a squirrel?")
 
+    def test_update_status_texts(self):
+        """
+        Testing update_status_texts in user_status.py
+        """
+        updated, missing = self.status_collection.update_status_texts(
+            {"scooby.doo1_00001": "Ruh-roh!", "king.arthur_00001": "Camelot!",
+             "king.arthur_00002": "I am a squirrel!"})
+        self.assertEqual(updated, 2)
+        self.assertEqual(missing, ["king.arthur_00002"])
+        self.assertEqual(self.status_collection.search_status("king.arthur_00001").status_text,
+                         "Camelot!")
+        self.assertEqual(self.status_collection.update_status_texts({}), (0, []))
+
+    def test_iter_status_rows(self):
+        """
+        Testing iter_status_rows in user_status.py
+        """
+        self.assertEqual(list(self.status_collection.iter_status_rows()),
+                         [("king.arthur_00001", "king.arthur", "I live for honor"),
+                          ("scooby.doo1_00001", "scooby.doo1", "Scooby, Scooby Dooo!")])
+
     def test_update_status_by_user_fail(self):
         """
         Testing how update_status_text in user_status.py fails
@@ -161,3 +302,95 @@ class TestUserStatusCollection(TestCase):
         self.user_collection.delete_user("king.arthur")
         self.assertFalse(self.status_collection.update_status_text("king.arthur_00001",
                                                                    "I am legend"))
+
+
+class TestCachedUserStatusCollection(TestCase):
+    """
+    Testing that UserStatusCollection keeps its StatusCache in sync with UserStatusTable
+    """
+    def setUp(self):
+        """
+        Create an in-memory database and collections sharing a status cache
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UserStatusTable, UsersTable])
+        self.database.connect()
+        self.database.create_tables([UserStatusTable, UsersTable])
+        self.cache = StatusCache(max_bytes=1024 * 1024)
+        self.user_collection = UserCollection(self.database, status_cache=self.cache)
+        self.status_collection = UserStatusCollection(self.database, cache=self.cache)
+        self.user_collection.add_user("scooby.doo1", "Scooby", "Doo", "scooby.doo1@gmail.com")
+        self.status_collection.add_status("scooby.doo1_00001", "scooby.doo1",
+                                          "Scooby, Scooby Dooo!")
+        self.status_collection.add_status("scooby.doo1_00002", "scooby.doo1", "Ruh roh")
+
+    def tearDown(self):
+        """
+        Disconnect test databases
+        """
+        self.database.drop_tables([UserStatusTable, UsersTable])
+        self.database.close()
+
+    def test_search_status_hits_cache(self):
+        """
+        The second search of a status is served by the cache
+        """
+        self.status_collection.search_status("scooby.doo1_00001")
+        result = self.status_collection.search_status("scooby.doo1_00001")
+        self.assertEqual(result.status_text, "Scooby, Scooby Dooo!")
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertGreater(self.cache.bytes, len("Scooby, Scooby Dooo!"))
+
+    def test_search_statuses_uses_cache(self):
+        """
+        search_statuses serves cached statuses and caches the ones it fetches
+        """
+        self.status_collection.search_status("scooby.doo1_00001")
+        found, missing = self.status_collection.search_statuses(
+            ["scooby.doo1_00001", "scooby.doo1_00002"])
+        self.assertEqual(len(found), 2)
+        self.assertEqual(missing, [])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_update_and_delete_invalidate_cache(self):
+        """
+        Searching after update_status_text or delete_status is never stale
+        """
+        self.status_collection.search_status("scooby.doo1_00001")
+        self.status_collection.update_status_text("scooby.doo1_00001", "Scooby snacks!")
+        self.assertEqual(self.status_collection.search_status("scooby.doo1_00001").status_text,
+                         "Scooby snacks!")
+        self.status_collection.delete_status("scooby.doo1_00001")
+        self.assertIsNone(self.status_collection.search_status("scooby.doo1_00001"))
+
+    def test_delete_user_drops_cascaded_statuses(self):
+        """
+        Deleting the user drops their cached statuses along with the rows
+        """
+        self.status_collection.search_status("scooby.doo1_00001")
+        self.status_collection.search_status("scooby.doo1_00002")
+        self.assertEqual(len(self.cache), 2)
+        self.user_collection.delete_user("scooby.doo1")
+        self.assertEqual(len(self.cache), 0)
+        self.assertIsNone(self.status_collection.search_status("scooby.doo1_00001"))
+
+    def test_row_mode_returns_status_rows(self):
+        """
+        In row mode, searches and pages return cached StatusRow tuples
+        """
+        status_collection = UserStatusCollection(self.database, cache=self.cache,
+                                                 row_mode=True)
+        expected = StatusRow("scooby.doo1_00001", "scooby.doo1", "Scooby, Scooby Dooo!")
+        self.assertEqual(status_collection.search_status("scooby.doo1_00001"), expected)
+        self.assertEqual(status_collection.search_status("scooby.doo1_00001"), expected)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        found, missing = status_collection.search_statuses(["scooby.doo1_00002", "nope"])
+        self.assertEqual(found["scooby.doo1_00002"].status_text, "Ruh roh")
+        self.assertEqual(missing, ["nope"])
+        statuses, cursor = status_collection.list_statuses("scooby.doo1", page_size=1)
+        self.assertEqual((statuses, cursor), ([expected], "scooby.doo1_00001"))
+        self.assertEqual(status_collection.search_status_text("ruh"),
+                         [StatusRow("scooby.doo1_00002", "scooby.doo1", "Ruh roh")])
+        self.user_collection.delete_user("scooby.doo1")
+        self.assertIsNone(status_collection.search_status("scooby.doo1_00001"))
@@ -2,9 +2,12 @@
 Unit testing methods in User class
 """
 from unittest import TestCase
+from unittest.mock import patch
 
 from peewee import SqliteDatabase
-from socialnetwork_model import UsersTable
+from cache import LRUCache, StatusCache
+from socialnetwork_model import database, UsersTable, UserStatusTable
+from rows import UserRow
 from users import UserCollection
 
 
@@ -60,6 +63,26 @@ class TestUserCollection(TestCase):
             self.user_collection.add_user(user_id, user_name, user_last_name, email)
         )
 
+    def test_add_users_success(self):
+        """
+        Testing add_users in users.py skips user_ids that already exist
+        """
+        users = [("jerry.tom1", "Jerry", "Mouse", "jerry.tom1@gmail.com"),
+                 ("ale314", "Audrey", "Le", "ale314@uw.edu"),
+                 ("scooby.doo1", "Scooby", "Doo", "scooby.doo1@gmail.com")]
+        self.assertEqual(self.user_collection.add_users(users), 2)
+        self.assertEqual(self.user_collection.search_user("jerry.tom1").user_name, "Jerry")
+        # the existing user is left untouched
+        self.assertEqual(self.user_collection.search_user("ale314").email, "ale314@uw.edu")
+
+    def test_add_users_many_batches(self):
+        """
+        Testing add_users in users.py with more rows than fit in one INSERT
+        """
+        users = [(f"user{i}", "Name", "Last", f"user{i}@gmail.com") for i in range(1000)]
+        self.assertEqual(self.user_collection.add_users(users), 1000)
+        self.assertEqual(UsersTable.select().count(), 1002)
+
     def test_search_user_success(self):
         """
         Testing search_user in users.py
@@ -72,6 +95,30 @@ class TestUserCollection(TestCase):
         """
         self.assertFalse(self.user_collection.search_user("dr.seuss1"))
 
+    def test_search_users(self):
+        """
+        Testing search_users in users.py returns found users and missing ids
+        """
+        found, missing = self.user_collection.search_users(["bryce05", "dr.seuss1",
+                                                            "ale314", "bryce05"])
+        self.assertEqual(sorted(found), ["ale314", "bryce05"])
+        self.assertEqual(found["ale314"].user_name, "Audrey")
+        self.assertEqual(missing, ["dr.seuss1"])
+
+    def test_search_users_chunks_queries(self):
+        """
+        Testing search_users in users.py needs a handful of queries for 2000 ids
+        """
+        users = [(f"user{i}", "Name", "Last", f"user{i}@gmail.com") for i in range(1000)]
+        self.user_collection.add_users(users)
+        user_ids = [f"user{i}" for i in range(2000)]
+        with patch.object(self.database, "execute_sql",
+                          wraps=self.database.execute_sql) as execute_sql:
+            found, missing = self.user_collection.search_users(user_ids)
+        self.assertEqual(len(found), 1000)
+        self.assertEqual(missing, user_ids[1000:])
+        self.assertLessEqual(execute_sql.call_count, 5)
+
     def test_delete_user_success(self):
         """
         Testing delete_user in users.py
@@ -95,3 +142,187 @@ class TestUserCollection(TestCase):
         Testing how update_email in users.py fails
         """
         self.assertFalse(self.user_collection.update_email("strumpf", "strumpf@gmail.com"))
+
+
+    def test_update_emails(self):
+        """
+        Testing update_emails in users.py
+        """
+        updated, missing = self.user_collection.update_emails(
+            {"ale314": "audrey314.le@gmail.com", "strumpf": "strumpf@gmail.com",
+             "bryce05": "bryce@uw.edu"})
+        self.assertEqual(updated, 2)
+        self.assertEqual(missing, ["strumpf"])
+        self.assertEqual(self.user_collection.search_user("bryce05").email, "bryce@uw.edu")
+
+    def test_update_emails_many_batches(self):
+        """
+        update_emails splits large mappings into several statements
+        """
+        self.user_collection.add_users([(f"user{i}", "Name", "Last", f"user{i}@uw.edu")
+                                        for i in range(1000)])
+        updated, missing = self.user_collection.update_emails(
+            {f"user{i}": f"new{i}@uw.edu" for i in range(1000)})
+        self.assertEqual((updated, missing), (1000, []))
+        self.assertEqual(self.user_collection.search_user("user999").email, "new999@uw.edu")
+
+    def test_iter_user_rows(self):
+        """
+        Testing iter_user_rows in users.py
+        """
+        self.assertEqual(list(self.user_collection.iter_user_rows()),
+                         [("ale314", "Audrey", "Le", "ale314@uw.edu"),
+                          ("bryce05", "Bryce", "Brown", "bryce05@gmail.com")])
+
+class TestCachedUserCollection(TestCase):
+    """
+    Testing that UserCollection keeps its LRU cache in sync with UsersTable
+    """
+    def setUp(self):
+        """
+        Create an in-memory database and a collection with a cache
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable])
+        self.database.connect()
+        self.database.create_tables([UsersTable])
+        self.cache = LRUCache(maxsize=10)
+        self.user_collection = UserCollection(self.database, cache=self.cache)
+        self.user_collection.add_user("ale314", "Audrey", "Le", "ale314@uw.edu")
+
+    def tearDown(self):
+        """
+        Disconnect test databases
+        """
+        self.database.drop_tables([UsersTable])
+        self.database.close()
+
+    def test_search_user_hits_cache(self):
+        """
+        add_user writes through to the cache, so searches don't miss
+        """
+        self.assertEqual(self.user_collection.search_user("ale314").user_name, "Audrey")
+        self.assertEqual(self.user_collection.search_user("ale314").user_name, "Audrey")
+        self.assertEqual(self.cache.stats()["hits"], 2)
+        self.assertEqual(self.cache.stats()["misses"], 0)
+
+    def test_update_email_invalidates_cache(self):
+        """
+        Searching after update_email returns the new email
+        """
+        self.user_collection.search_user("ale314")
+        self.assertTrue(self.user_collection.update_email("ale314", "audrey314.le@gmail.com"))
+        self.assertEqual(self.user_collection.search_user("ale314").email,
+                         "audrey314.le@gmail.com")
+        self.user_collection.update_emails({"ale314": "ale314@gmail.com"})
+        self.assertEqual(self.user_collection.search_user("ale314").email, "ale314@gmail.com")
+
+    def test_delete_user_invalidates_cache(self):
+        """
+        Searching after delete_user returns None
+        """
+        self.user_collection.search_user("ale314")
+        self.assertTrue(self.user_collection.delete_user("ale314"))
+        self.assertIsNone(self.user_collection.search_user("ale314"))
+        self.assertEqual(len(self.cache), 0)
+
+
+class TestDeleteUsers(TestCase):
+    """
+    Testing the bulk delete of users and their statuses
+    """
+    def setUp(self):
+        """
+        Create an in-memory database with users and statuses
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable, UserStatusTable])
+        self.database.connect()
+        self.database.create_tables([UsersTable, UserStatusTable])
+        self.cache = LRUCache(maxsize=10)
+        self.status_cache = StatusCache()
+        self.user_collection = UserCollection(self.database, cache=self.cache,
+                                              status_cache=self.status_cache)
+        self.user_collection.add_users([(f"user{i}", "Name", "Last", f"user{i}@uw.edu")
+                                        for i in range(10)])
+        UserStatusTable.insert_many(
+            [(f"user{i}_{j}", f"user{i}", "Hello") for i in range(10) for j in range(i)],
+            fields=[UserStatusTable.status_id, UserStatusTable.user_id,
+                    UserStatusTable.status_text]).execute()
+
+    def tearDown(self):
+        """
+        Disconnect test databases and bind the tables back to users.db
+        """
+        self.database.drop_tables([UserStatusTable, UsersTable])
+        self.database.close()
+        database.bind([UsersTable, UserStatusTable])
+
+    def test_delete_users_counts_per_batch(self):
+        """
+        Each chunk reports the users and cascaded statuses it deleted
+        """
+        batches = self.user_collection.delete_users(
+            (f"user{i}" for i in range(6)), chunk_size=3)
+        self.assertEqual(batches, [{"users": 3, "statuses": 3},
+                                   {"users": 3, "statuses": 12}])
+        self.assertEqual(UsersTable.select().count(), 4)
+        self.assertEqual(UserStatusTable.select().count(), 30)
+
+    def test_delete_users_ignores_unknown(self):
+        """
+        Unknown user_ids are not counted
+        """
+        batches = self.user_collection.delete_users(["user9", "nobody"])
+        self.assertEqual(batches, [{"users": 1, "statuses": 9}])
+        self.assertEqual(self.user_collection.delete_users([]), [])
+
+    def test_delete_users_invalidates_caches(self):
+        """
+        Deleted users and their statuses are dropped from the caches
+        """
+        self.user_collection.search_user("user2")
+        self.status_cache.put("user2_0", "status", user_id="user2")
+        self.user_collection.delete_users(["user2"])
+        self.assertIsNone(self.user_collection.search_user("user2"))
+        self.assertIsNone(self.status_cache.get("user2_0"))
+
+
+class TestRowModeUserCollection(TestCase):
+    """
+    Testing that UserCollection returns UserRow tuples in row mode
+    """
+    def setUp(self):
+        """
+        Create an in-memory database and a collection in row mode
+        """
+        self.database = SqliteDatabase(":memory:", pragmas={"foreign_keys": 1})
+        self.database.bind([UsersTable])
+        self.database.connect()
+        self.database.create_tables([UsersTable])
+        self.user_collection = UserCollection(self.database, row_mode=True)
+        self.user_collection.add_user("ale314", "Audrey", "Le", "ale314@uw.edu")
+
+    def tearDown(self):
+        """
+        Disconnect test databases
+        """
+        self.database.drop_tables([UsersTable])
+        self.database.close()
+
+    def test_search_user_returns_row(self):
+        """
+        search_user returns a UserRow with the attributes of a UsersTable instance
+        """
+        result = self.user_collection.search_user("ale314")
+        self.assertEqual(result, UserRow("ale314", "Audrey", "Le", "ale314@uw.edu"))
+        self.assertEqual(result.user_last_name, "Le")
+        self.assertIsNone(self.user_collection.search_user("bryce05"))
+
+    def test_search_users_returns_rows(self):
+        """
+        search_users returns UserRow tuples too
+        """
+        found, missing = self.user_collection.search_users(["ale314", "bryce05"])
+        self.assertIsInstance(found["ale314"], UserRow)
+        self.assertEqual(missing, ["bryce05"])
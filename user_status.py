@@ -2,100 +2,436 @@
 classes to manage the user status messages
 """
 import sys
-from peewee import IntegrityError, DoesNotExist
+from peewee import IntegrityError, DoesNotExist, chunked
 
 from loguru import logger
 
-from socialnetwork_model import UserStatusTable
+from bloom import filter_key
+from log_config import echo
+from metrics import instrumented
+from rows import StatusRow
+from socialnetwork_model import UserStatusTable, UsersTable
+from users import SQLITE_MAX_VARIABLES, existing_keys, insert_ignore_many, update_many
 
-logger.remove()
-logger.add('loguru_file_{time:YYYY-MM-DD}.log', level='DEBUG')
-logger.add(sys.stderr, level='WARNING')
+STATUS_FIELDS = (UserStatusTable.status_id, UserStatusTable.user_id,
+                 UserStatusTable.status_text)
+# Statuses returned per page by list_statuses
+PAGE_SIZE = 20
+# Lets list_statuses seek to (user_id, status_id) instead of sorting all of
+# a user's statuses, which userstatustable_user_id alone would require
+TIMELINE_INDEX_SQL = ('CREATE INDEX IF NOT EXISTS "userstatustable_user_id_status_id" '
+                      'ON "userstatustable" ("user_id", "status_id")')
+# FTS5 index over status_text. It reads the text from userstatustable by rowid
+# and triggers keep it in sync with every insert, update and delete, including
+# bulk loads and the ON DELETE CASCADE from userstable. VACUUM can renumber
+# the rowids of userstatustable, so run rebuild_search_index() after one.
+SEARCH_INDEX_SQL = (
+    'CREATE VIRTUAL TABLE "userstatus_fts" USING fts5('
+    'status_text, content="userstatustable", content_rowid="rowid")',
+    'CREATE TRIGGER IF NOT EXISTS "userstatus_fts_insert" AFTER INSERT ON "userstatustable" '
+    'BEGIN INSERT INTO "userstatus_fts" (rowid, status_text) '
+    'VALUES (new.rowid, new.status_text); END',
+    'CREATE TRIGGER IF NOT EXISTS "userstatus_fts_delete" AFTER DELETE ON "userstatustable" '
+    'BEGIN INSERT INTO "userstatus_fts" ("userstatus_fts", rowid, status_text) '
+    'VALUES (\'delete\', old.rowid, old.status_text); END',
+    'CREATE TRIGGER IF NOT EXISTS "userstatus_fts_update" '
+    'AFTER UPDATE OF status_text ON "userstatustable" '
+    'BEGIN INSERT INTO "userstatus_fts" ("userstatus_fts", rowid, status_text) '
+    'VALUES (\'delete\', old.rowid, old.status_text); '
+    'INSERT INTO "userstatus_fts" (rowid, status_text) '
+    'VALUES (new.rowid, new.status_text); END',
+)
+SEARCH_SQL = ('SELECT s.status_id, s.user_id, s.status_text FROM "userstatus_fts" AS f '
+              'JOIN "userstatustable" AS s ON s.rowid = f.rowid '
+              'WHERE "userstatus_fts" MATCH ? ORDER BY f.rank LIMIT ? OFFSET ?')
+
+
+def status_size(status):
+    """
+    Estimates the memory used by a UserStatusTable instance or a StatusRow
+    and its values, in bytes
+    """
+    if isinstance(status, tuple):
+        return sys.getsizeof(status) + sum(sys.getsizeof(value) for value in status)
+    return (sys.getsizeof(status) + sys.getsizeof(status.__data__)
+            + sum(sys.getsizeof(value) for value in status.__data__.values()))
 
 
 class UserStatusCollection:
     """
     class to hold status message data
+
+    cache is an optional cache.StatusCache of UserStatusTable instances by
+    status_id. Share it with the UserCollection as its status_cache so that
+    deleting a user also drops the statuses the database cascade removes.
+    metrics is an optional metrics.Metrics recording every call.
+    With row_mode, the search and list methods read the columns with
+    .tuples() queries and return rows.StatusRow tuples instead of
+    UserStatusTable instances. Their user_id is the raw id rather than
+    a UsersTable instance, which prints the same.
+    feed is an optional follows.FollowCollection: add_status and
+    add_statuses then copy the new statuses into the home feeds of the
+    followers of their authors, in the same transaction.
+    status_filter is an optional bloom.BloomFilter of the status_ids:
+    calls for status_ids it has never seen return at once. user_filter,
+    the UserCollection's filter of the user_ids, lets add_status turn down
+    the statuses of unknown users without a transaction.
     """
 
-    def __init__(self, database):
+    def __init__(self, database, cache=None, metrics=None, row_mode=False, feed=None,
+                 status_filter=None, user_filter=None):
         self.database = database
+        self.cache = cache
+        self.metrics = metrics
+        self.row_mode = row_mode
+        self.feed = feed
+        self.status_filter = status_filter
+        self.user_filter = user_filter
+        self._search_indexed = False
+
+    def _absent(self, status_id):
+        """
+        Tells whether status_filter is sure status_id does not exist
+        """
+        if self.status_filter is not None and status_id not in self.status_filter:
+            logger.debug("{} is not in the status filter", status_id)
+            return True
+        return False
+
+    def _select(self, *conditions):
+        """
+        Returns a query of the statuses matching conditions that yields
+        UserStatusTable instances, or (status_id, ...) tuples in row mode
+        """
+        if self.row_mode:
+            query = UserStatusTable.select(*STATUS_FIELDS).where(*conditions).tuples()
+        else:
+            query = UserStatusTable.select().where(*conditions)
+        return query.bind(self.database)
+
+    def _result(self, status):
+        """
+        Wraps a status read by a _select() query as this collection returns it
+        """
+        return StatusRow._make(status) if self.row_mode else status
+
+    def _cache(self, status, version):
+        """
+        Caches a status read from the database, if there is a cache
+        """
+        if self.cache is not None:
+            # user_id_id is the raw foreign key, reading user_id would query UsersTable
+            user_id = status.user_id if self.row_mode else status.user_id_id
+            self.cache.put(status.status_id, status, version, user_id=user_id,
+                           size=status_size(status))
 
+    @instrumented
     def add_status(self, status_id, user_id, status_text):
         """
         add a status to the collection
         """
+        if self.user_filter is not None and user_id not in self.user_filter:
+            echo('Doh! Did you forget to add {} as a user beforehand?', user_id)
+            logger.error("Failed to add {} as a user before adding their status.", user_id)
+            return False
         try:
-            with self.database.transaction():
-                new_status = UserStatusTable.create(
+            # Writes begin "immediate" to queue for the write lock, see users.py
+            with self.database.transaction("immediate"):
+                UserStatusTable.insert(
                     status_id=status_id,
                     user_id=user_id,
                     status_text=status_text,
-                )
-                new_status.save()
-                print(f"Saved {user_id} 's {status_id}: {status_text} to UserStatusTable")
-                logger.info(f"Successfully added a status for {user_id}")
+                ).execute(self.database)
+                if self.feed is not None:
+                    self.feed.fan_out([status_id])
+                echo("Saved {} 's {}: {} to UserStatusTable", user_id, status_id, status_text)
+                logger.info("Successfully added a status for {}", user_id)
+            if self.status_filter is not None:
+                self.status_filter.add(status_id)
             return True
         # Catch any errors with duplicate keys (status_id)
         except IntegrityError:
-            print(f'Doh! Did you forget to add {user_id} as a user beforehand?')
-            logger.error(f"Failed to add {user_id} as a user before adding their status.")
+            echo('Doh! Did you forget to add {} as a user beforehand?', user_id)
+            logger.error("Failed to add {} as a user before adding their status.", user_id)
             return False
 
+    @instrumented
+    def add_statuses(self, statuses):
+        """
+        Adds many statuses to the collection in a single transaction.
+        statuses is an iterable of (status_id, user_id, status_text) tuples.
+
+        The user_ids and status_ids of the batch are checked up front with
+        one query each, so statuses of unknown users and duplicate
+        status_ids are filtered out instead of failing one by one.
+        A user_id may be a UsersTable instance, as with add_status.
+        Returns a dict with the number of statuses 'inserted' and the
+        'orphaned' and 'duplicates' status tuples that were left out,
+        as they were passed in.
+        """
+        statuses = list(statuses)
+        # The ids as the TEXT columns hold them, to compare with what they return
+        keys = [(filter_key(status[0]), filter_key(status[1])) for status in statuses]
+        report = {"inserted": 0, "orphaned": [], "duplicates": []}
+        with self.database.transaction("immediate"):
+            # Only the ids the filters can't rule out need looking up
+            known_users = existing_keys(self.database, UsersTable.user_id,
+                                        {user_id for _, user_id in keys
+                                         if self.user_filter is None
+                                         or user_id in self.user_filter})
+            seen = existing_keys(self.database, UserStatusTable.status_id,
+                                 {status_id for status_id, _ in keys
+                                  if not self._absent(status_id)})
+            valid = []
+            for status, (status_id, user_id) in zip(statuses, keys):
+                if user_id not in known_users:
+                    report["orphaned"].append(status)
+                elif status_id in seen:
+                    report["duplicates"].append(status)
+                else:
+                    seen.add(status_id)
+                    valid.append((status_id, user_id, status[2]))
+            report["inserted"] = insert_ignore_many(self.database, STATUS_FIELDS, valid)
+            if self.feed is not None:
+                self.feed.fan_out([status[0] for status in valid])
+        if self.status_filter is not None:
+            self.status_filter.update(status[0] for status in valid)
+        logger.info("Bulk added {} statuses", report['inserted'])
+        return report
+
+    @instrumented
     def search_status(self, status_id):
         """
         Find and return a status message by its status_id
 
         Returns an empty UserStatus object if status_id does not exist
         """
+        if self._absent(status_id):
+            return None
+        version = None
+        if self.cache is not None:
+            result = self.cache.get(status_id)
+            if result is not None:
+                return result
+            version = self.cache.version
         try:
             with self.database.transaction():
                 # Find a status by its status_id
-                result = UserStatusTable.get(UserStatusTable.status_id == status_id)
-                logger.info(f"Found this status for {status_id}: ")
+                result = self._result(
+                    self._select(UserStatusTable.status_id == status_id).get())
+                logger.info("Found this status for {}: ", status_id)
+            self._cache(result, version)
             return result
         # Catches any errors not finding this record
         except DoesNotExist:
-            logger.error(f'{status_id} does not exist in the UserStatus database!')
+            logger.error('{} does not exist in the UserStatus database!', status_id)
             return None
 
+    @instrumented
+    def search_statuses(self, status_ids):
+        """
+        Find many status messages at once. Statuses missing from the cache
+        are fetched with IN (...) queries of up to SQLITE_MAX_VARIABLES ids each.
+
+        Returns a dict of UserStatusTable instances (StatusRow tuples in row
+        mode) by status_id and the list of status_ids that do not exist in
+        the database.
+        """
+        found = {}
+        wanted = list(dict.fromkeys(status_ids))
+        version = None
+        if self.cache is not None:
+            for status_id in wanted:
+                result = self.cache.get(status_id)
+                if result is not None:
+                    found[status_id] = result
+            version = self.cache.version
+        to_fetch = [status_id for status_id in wanted
+                    if status_id not in found and not self._absent(status_id)]
+        with self.database.transaction():
+            for batch in chunked(to_fetch, SQLITE_MAX_VARIABLES):
+                for result in self._select(UserStatusTable.status_id.in_(batch)):
+                    result = self._result(result)
+                    found[result.status_id] = result
+                    self._cache(result, version)
+        missing = [status_id for status_id in wanted if status_id not in found]
+        logger.info("Found {} statuses, {} missing", len(found), len(missing))
+        return found, missing
+
+    @instrumented
+    def list_statuses(self, user_id, cursor=None, page_size=PAGE_SIZE):
+        """
+        Returns a page of the statuses of user_id, ordered by status_id.
+
+        Pages use keyset pagination: pass the cursor returned with a page
+        to get the next one. Every page is an index seek on
+        (user_id, status_id), so deep pages cost the same as the first.
+        Returns the list of UserStatusTable instances and the cursor of
+        the next page, which is None on the last page.
+
+        The seek needs the index of create_timeline_index(); without it,
+        every page sorts all the statuses of the user.
+        """
+        query = (self._select(UserStatusTable.user_id == user_id)
+                 .order_by(UserStatusTable.status_id)
+                 .limit(page_size + 1))
+        if cursor is not None:
+            query = query.where(UserStatusTable.status_id > cursor)
+        with self.database.transaction():
+            statuses = [self._result(status) for status in query]
+        logger.info("Listed {} statuses for {}", len(statuses[:page_size]), user_id)
+        if len(statuses) > page_size:
+            return statuses[:page_size], statuses[page_size - 1].status_id
+        return statuses, None
+
+    def iter_statuses(self, user_id, page_size=PAGE_SIZE):
+        """
+        Yields every status of user_id, ordered by status_id, fetching
+        them page by page so that only one page is held in memory.
+        """
+        cursor = None
+        while True:
+            statuses, cursor = self.list_statuses(user_id, cursor, page_size)
+            yield from statuses
+            if cursor is None:
+                return
+
+    def iter_status_rows(self):
+        """
+        Yields every status as a (status_id, user_id, status_text) tuple,
+        ordered by status_id. The rows are read from a single SELECT one at
+        a time as they are consumed, without being cached, so memory stays
+        constant whatever the size of the table.
+        """
+        query = (UserStatusTable.select(*STATUS_FIELDS)
+                 .order_by(UserStatusTable.status_id)
+                 .tuples())
+        yield from query.iterator(self.database)
+
+    def create_timeline_index(self):
+        """
+        Creates the (user_id, status_id) index list_statuses pages through.
+        Does nothing if the index already exists; on a large table, building
+        it holds the write lock until it is done.
+        """
+        with self.database.transaction("immediate"):
+            self.database.execute_sql(TIMELINE_INDEX_SQL)
+        logger.info("Created the status timeline index")
+
+    def create_search_index(self):
+        """
+        Creates the full-text index of status_text and the triggers that
+        keep it in sync, indexing the statuses already in the table.
+        Does nothing if the index already exists.
+        """
+        with self.database.transaction("immediate"):
+            if "userstatus_fts" not in self.database.get_tables():
+                for statement in SEARCH_INDEX_SQL:
+                    self.database.execute_sql(statement)
+                self.rebuild_search_index()
+                logger.info("Created the status_text search index")
+        self._search_indexed = True
+
+    def rebuild_search_index(self):
+        """
+        Re-indexes every status_text from userstatustable
+        """
+        self.database.execute_sql('INSERT INTO "userstatus_fts" ("userstatus_fts") '
+                                  'VALUES (\'rebuild\')')
+
+    @instrumented
+    def search_status_text(self, text, page=1, page_size=PAGE_SIZE):
+        """
+        Full-text search of status_text. Every word of text must appear in
+        the status, in any order.
+
+        Returns a page of UserStatusTable instances, best matches first.
+        Creates the search index on first use if it does not exist yet.
+        """
+        if not self._search_indexed:
+            self.create_search_index()
+        # Quote each word so that user input is never parsed as FTS5 syntax
+        terms = " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+        if not terms:
+            return []
+        params = (terms, page_size, (page - 1) * page_size)
+        with self.database.transaction():
+            if self.row_mode:
+                results = [StatusRow._make(row)
+                           for row in self.database.execute_sql(SEARCH_SQL, params)]
+            else:
+                results = list(UserStatusTable.raw(SEARCH_SQL, *params).bind(self.database))
+        logger.info("Found {} statuses matching {}", len(results), text)
+        return results
+
+    @instrumented
     def delete_status(self, status_id):
         """
         deletes the status message with id, status_id
         """
-        try:
-            with self.database.transaction():
-                # Find the status going by this status_id
-                result = UserStatusTable.get(UserStatusTable.status_id == status_id)
-                # Deletes it
-                result.delete_instance()
-                print(f"Removed {status_id}")
-                logger.info(f"Successfully deleted {status_id}")
-            return True
-        # Catches any errors not finding this record
-        except DoesNotExist:
-            print(f'Could not delete {status_id} because it does not exist.')
-            logger.error(f'There is no {status_id} in existence in the UserStatus database '
-                         f'to delete.')
+        if self._absent(status_id):
+            return False
+        with self.database.transaction("immediate"):
+            # A single DELETE; no row deleted means there is no such status
+            deleted = (UserStatusTable.delete()
+                       .where(UserStatusTable.status_id == status_id)
+                       .execute(self.database))
+        if not deleted:
+            echo('Could not delete {} because it does not exist.', status_id)
+            logger.error('There is no {} in existence in the UserStatus database '
+                         'to delete.', status_id)
             return False
+        echo("Removed {}", status_id)
+        logger.info("Successfully deleted {}", status_id)
+        if self.status_filter is not None:
+            self.status_filter.discard(status_id)
+        if self.cache is not None:
+            self.cache.invalidate(status_id)
+        return True
 
+    @instrumented
     def update_status_text(self, status_id, status_text):
         """
         Modifies a status message
 
         The new user_id and status_text are assigned to the existing message
         """
-        try:
-            with self.database.transaction():
-                # Find the status by its id
-                result = UserStatusTable.get(UserStatusTable.status_id == status_id)
-                # Update the status text
-                result.status_text = status_text
-                # Save it in the db
-                result.save()
-                logger.info(f'Successfully updated the status text for {status_id}')
-            return True
-        # Catches any errors not finding this record
-        except DoesNotExist:
-            logger.error(f'There is no {status_id} in the UserStatus database to update.')
+        if self._absent(status_id):
+            return False
+        with self.database.transaction("immediate"):
+            # A single UPDATE; no row changed means there is no such status
+            updated = (UserStatusTable.update(status_text=status_text)
+                       .where(UserStatusTable.status_id == status_id)
+                       .execute(self.database))
+        if not updated:
+            logger.error('There is no {} in the UserStatus database to update.', status_id)
             return False
+        logger.info('Successfully updated the status text for {}', status_id)
+        if self.cache is not None:
+            self.cache.invalidate(status_id)
+        return True
+
+    @instrumented
+    def update_status_texts(self, status_texts):
+        """
+        Modifies many status messages at once. status_texts is a dict of
+        new status_text by status_id.
+
+        Returns the number of statuses updated and the list of status_ids
+        that do not exist in the database.
+        """
+        absent = [status_id for status_id in status_texts if self._absent(status_id)]
+        if absent:
+            skip = set(absent)
+            status_texts = {status_id: status_text
+                            for status_id, status_text in status_texts.items()
+                            if status_id not in skip}
+        with self.database.transaction("immediate"):
+            updated, missing = update_many(self.database, UserStatusTable.status_id,
+                                           UserStatusTable.status_text, status_texts)
+        missing = absent + missing
+        if self.cache is not None:
+            for status_id in status_texts:
+                self.cache.invalidate(status_id)
+        logger.info("Updated {} status texts, {} missing", updated, len(missing))
+        return updated, missing
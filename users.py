@@ -1,15 +1,86 @@
 """Methods available to the User class"""
 # pylint: disable=R0903
-import sys
-from peewee import IntegrityError, DoesNotExist
+from functools import lru_cache
+from peewee import Case, IntegrityError, DoesNotExist, chunked
 
 from loguru import logger
 
-from socialnetwork_model import UsersTable
+from log_config import echo
+from metrics import instrumented
+from rows import UserRow
+from socialnetwork_model import UsersTable, UserStatusTable
 
-logger.remove()
-logger.add('loguru_file_{time:YYYY-MM-DD}.log', level='DEBUG')
-logger.add(sys.stderr, level='WARNING')
+# Default SQLite builds cap a single statement at 999 bound parameters
+SQLITE_MAX_VARIABLES = 999
+# Users deleted per transaction by delete_users
+DELETE_CHUNK_SIZE = 500
+USER_FIELDS = (UsersTable.user_id, UsersTable.user_name,
+               UsersTable.user_last_name, UsersTable.email)
+
+
+@lru_cache(maxsize=None)
+def insert_ignore_sql(fields, rows):
+    """
+    Returns the text of an INSERT OR IGNORE statement adding the given
+    number of rows of fields. Built once per size, since generating it
+    through peewee for every batch costs more than running it.
+    """
+    placeholders = [[None] * len(fields)] * rows
+    query = fields[0].model.insert_many(placeholders, fields=fields).on_conflict_ignore()
+    return query.sql()[0]
+
+
+def insert_ignore_many(database, fields, rows):
+    """
+    Inserts rows, tuples of values for fields, with multi-row INSERT OR
+    IGNORE statements that stay under SQLite's bound-parameter limit.
+    Rows whose primary key already exists are skipped.
+
+    Returns the number of rows actually inserted.
+    """
+    inserted = 0
+    for batch in chunked(rows, SQLITE_MAX_VARIABLES // len(fields)):
+        cursor = database.execute_sql(insert_ignore_sql(fields, len(batch)),
+                                      [value for row in batch for value in row])
+        inserted += cursor.rowcount
+    return inserted
+
+
+def existing_keys(database, field, keys):
+    """
+    Returns the subset of keys that exist in the column field, using
+    IN (...) queries that stay under SQLite's bound-parameter limit.
+    """
+    found = set()
+    for batch in chunked(keys, SQLITE_MAX_VARIABLES):
+        query = field.model.select(field).where(field.in_(batch)).tuples()
+        found.update(key for (key,) in query.execute(database))
+    return found
+
+
+def update_many(database, key_field, value_field, values):
+    """
+    Sets value_field to values[key] on the row of every key of the dict
+    values, with one UPDATE ... SET value_field = CASE key_field ... END
+    statement per batch instead of a read and a save per row.
+
+    Returns the number of rows updated and the list of keys that matched
+    no row. Those are only looked up when a batch updates fewer rows than
+    it has keys.
+    """
+    updated = 0
+    missing = []
+    # Every key is bound twice in the CASE and once in the IN (...)
+    for batch in chunked(values.items(), SQLITE_MAX_VARIABLES // 3):
+        keys = [key for key, _ in batch]
+        count = (key_field.model.update({value_field: Case(key_field, batch)})
+                 .where(key_field.in_(keys))
+                 .execute(database))
+        if count < len(keys):
+            found = existing_keys(database, key_field, keys)
+            missing.extend(key for key in keys if key not in found)
+        updated += count
+    return updated, missing
 
 
 # A base class that will also contain the database
@@ -24,77 +95,302 @@ class BaseCollection:
 class UserCollection(BaseCollection):
     """
     Class representing User
+
+    cache is an optional cache.LRUCache of UsersTable instances by user_id,
+    kept up to date by add_user, update_email and delete_user.
+    status_cache is the optional cache.StatusCache of the UserStatusCollection;
+    delete_user drops the user's statuses from it, as the database cascades
+    the delete to UserStatusTable.
+    metrics is an optional metrics.Metrics recording every call.
+    replica is an optional loaded replica.UserReplica: search_user and
+    search_users then return rows.UserRow tuples from it without querying
+    the database, and every write refreshes it.
+    With row_mode, search_user and search_users read the columns with
+    .tuples() queries and return rows.UserRow tuples instead of UsersTable
+    instances; they have the same attributes but cost far less to build.
+    user_filter is an optional bloom.BloomFilter of the user_ids, such as
+    bloom.load_filter(database, UsersTable.user_id): calls for user_ids it
+    has never seen return at once without querying the database. Pass a
+    bloom.CountingBloomFilter to also forget deleted users.
     """
 
+    def __init__(self, database, cache=None, status_cache=None, metrics=None, replica=None,
+                 row_mode=False, user_filter=None):
+        super().__init__(database)
+        self.cache = cache
+        self.status_cache = status_cache
+        self.metrics = metrics
+        self.replica = replica
+        self.row_mode = row_mode
+        self.user_filter = user_filter
+
+    def _absent(self, user_id):
+        """
+        Tells whether user_filter is sure user_id does not exist
+        """
+        if self.user_filter is not None and user_id not in self.user_filter:
+            logger.debug("{} is not in the user filter", user_id)
+            return True
+        return False
+
+    def _select(self, *conditions):
+        """
+        Returns a query of the users matching conditions that yields
+        UsersTable instances, or (user_id, ...) tuples in row mode
+        """
+        if self.row_mode:
+            query = UsersTable.select(*USER_FIELDS).where(*conditions).tuples()
+        else:
+            query = UsersTable.select().where(*conditions)
+        return query.bind(self.database)
+
+    def _result(self, user):
+        """
+        Wraps a user read by a _select() query as this collection returns it
+        """
+        return UserRow._make(user) if self.row_mode else user
+
+    def _refresh_replica(self):
+        """
+        Applies the writes just made to the replica, if there is one
+        """
+        if self.replica is not None:
+            self.replica.refresh()
+
+    @instrumented
     def add_user(self, user_id, user_name, user_last_name, email):
         """
         Adds a new user to the collection
         """
         try:
-            # .transaction() acts like a context manager
-            with self.database.transaction():
-                new_user = UsersTable.create(
+            # .transaction() acts like a context manager. Writes begin "immediate"
+            # so they wait for the write lock up front: a transaction that reads
+            # first can't wait for it when another connection is writing.
+            with self.database.transaction("immediate"):
+                UsersTable.insert(
                     user_id=user_id,
                     user_name=user_name,
                     user_last_name=user_last_name,
                     email=email
-                )
-                new_user.save()
-                print(f"Success adding user {user_id}")
+                ).execute(self.database)
+                echo("Success adding user {}", user_id)
                 logger.info("Success adding user")
+            if self.cache is not None:
+                new_user = UserRow(user_id, user_name, user_last_name, email)
+                if not self.row_mode:
+                    new_user = UsersTable(**new_user._asdict())
+                self.cache.put(user_id, new_user)
+            if self.user_filter is not None:
+                self.user_filter.add(user_id)
+            self._refresh_replica()
             return True
         except IntegrityError:
-            print(f'{user_id} already exists in the database!')
+            echo('{} already exists in the database!', user_id)
             logger.error("User already exists in the database!")
             return False
 
+    @instrumented
+    def add_users(self, users):
+        """
+        Adds many users to the collection in a single transaction, using
+        multi-row INSERT statements. users is an iterable of
+        (user_id, user_name, user_last_name, email) tuples.
+
+        Users whose user_id already exists are ignored, like add_user does.
+        Returns the number of users actually inserted.
+        """
+        if self.user_filter is not None:
+            users = list(users)
+        with self.database.transaction("immediate"):
+            inserted = insert_ignore_many(self.database, USER_FIELDS, users)
+        if self.user_filter is not None:
+            # Adding the ids that already existed again is harmless
+            self.user_filter.update(user[0] for user in users)
+        logger.info("Bulk added {} users", inserted)
+        self._refresh_replica()
+        return inserted
+
+    @instrumented
     def search_user(self, user_id):
         """
         Searches for user data. We search by user_id because it is our primary key in
         UsersTable. We pass it the parameter user_id.
         """
+        if self._absent(user_id):
+            return None
+        if self.replica is not None:
+            return self.replica.get(user_id)
+        if self.cache is not None:
+            result = self.cache.get(user_id)
+            if result is not None:
+                return result
+            version = self.cache.version
         try:
             with self.database.transaction():
                 # Find a user by their user_id.
-                result = UsersTable.get(UsersTable.user_id == user_id)
-                logger.info(f"Found user! {user_id}")
+                result = self._result(self._select(UsersTable.user_id == user_id).get())
+                logger.info("Found user! {}", user_id)
+            if self.cache is not None:
+                self.cache.put(user_id, result, version)
             return result
         # Catches any errors not finding this record
         except DoesNotExist:
-            logger.error(f'{user_id} does not exist in the database!')
+            logger.error('{} does not exist in the database!', user_id)
             return None
 
+    @instrumented
+    def search_users(self, user_ids):
+        """
+        Searches for many users at once. Users missing from the cache are
+        fetched with IN (...) queries of up to SQLITE_MAX_VARIABLES ids each.
+
+        Returns a dict of UsersTable instances (UserRow tuples in row mode)
+        by user_id and the list of user_ids that do not exist in the database.
+        """
+        if self.replica is not None:
+            return self.replica.get_many(user_ids)
+        found = {}
+        wanted = list(dict.fromkeys(user_ids))
+        to_fetch = [user_id for user_id in wanted if not self._absent(user_id)]
+        if self.cache is not None:
+            for user_id in to_fetch:
+                result = self.cache.get(user_id)
+                if result is not None:
+                    found[user_id] = result
+            version = self.cache.version
+        to_fetch = [user_id for user_id in to_fetch if user_id not in found]
+        with self.database.transaction():
+            for batch in chunked(to_fetch, SQLITE_MAX_VARIABLES):
+                for result in self._select(UsersTable.user_id.in_(batch)):
+                    result = self._result(result)
+                    found[result.user_id] = result
+                    if self.cache is not None:
+                        self.cache.put(result.user_id, result, version)
+        missing = [user_id for user_id in wanted if user_id not in found]
+        logger.info("Found {} users, {} missing", len(found), len(missing))
+        return found, missing
+
+    def iter_user_rows(self):
+        """
+        Yields every user as a (user_id, user_name, user_last_name, email)
+        tuple, ordered by user_id. The rows are read from a single SELECT
+        one at a time as they are consumed, without being cached, so memory
+        stays constant whatever the size of the table.
+        """
+        query = UsersTable.select(*USER_FIELDS).order_by(UsersTable.user_id).tuples()
+        yield from query.iterator(self.database)
+
+    @instrumented
     def delete_user(self, user_id):
         """
         Deletes an existing user
         """
-        try:
-            with self.database.transaction():
-                # Find a person with the same name
-                result = UsersTable.get(UsersTable.user_id == user_id)
-                # Deletes it
-                result.delete_instance()
-                logger.info(f"Success deleting {user_id}")
-            return True
-        # Catches any errors not finding this record
-        except DoesNotExist:
-            logger.error(f'Cannot delete user because {user_id} does not exist in the database!')
+        if self._absent(user_id):
+            return False
+        with self.database.transaction("immediate"):
+            # A single DELETE; no row deleted means there is no such user
+            deleted = (UsersTable.delete()
+                       .where(UsersTable.user_id == user_id)
+                       .execute(self.database))
+        if not deleted:
+            logger.error('Cannot delete user because {} does not exist in the database!', user_id)
             return False
+        logger.info("Success deleting {}", user_id)
+        if self.user_filter is not None:
+            self.user_filter.discard(user_id)
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
+        if self.status_cache is not None:
+            self.status_cache.invalidate_user(user_id)
+        self._refresh_replica()
+        return True
+
+    @instrumented
+    def delete_users(self, user_ids, chunk_size=DELETE_CHUNK_SIZE):
+        """
+        Deletes many users, and their statuses, chunk_size user_ids at a
+        time. user_ids can be any iterable, including a generator reading
+        them from a file; it is consumed one chunk at a time.
 
+        Each chunk is deleted in its own transaction with one DELETE of the
+        statuses and one of the users, so other connections never wait for
+        more than one chunk. Unknown user_ids are ignored.
+
+        Returns a list with a dict per chunk counting the 'users' and
+        'statuses' actually deleted.
+        """
+        batches = []
+        for batch in chunked(user_ids, min(chunk_size, SQLITE_MAX_VARIABLES)):
+            if self.user_filter is not None:
+                batch = [user_id for user_id in batch if not self._absent(user_id)]
+            forget = self.user_filter is not None and self.user_filter.counting
+            with self.database.transaction("immediate"):
+                if forget:
+                    # A counting filter must only forget the users that existed
+                    existing = existing_keys(self.database, UsersTable.user_id, batch)
+                # The foreign key would cascade anyway, but deleting the
+                # statuses first is the only way to count them
+                statuses = (UserStatusTable.delete()
+                            .where(UserStatusTable.user_id.in_(batch))
+                            .execute(self.database))
+                deleted = (UsersTable.delete()
+                           .where(UsersTable.user_id.in_(batch))
+                           .execute(self.database))
+            if forget:
+                for user_id in existing:
+                    self.user_filter.discard(user_id)
+            for user_id in batch:
+                if self.cache is not None:
+                    self.cache.invalidate(user_id)
+                if self.status_cache is not None:
+                    self.status_cache.invalidate_user(user_id)
+            batches.append({"users": deleted, "statuses": statuses})
+            logger.info("Deleted {} users and {} statuses", deleted, statuses)
+        self._refresh_replica()
+        return batches
+
+    @instrumented
     def update_email(self, user_id, email):
         """
         Modifies an existing user
         """
-        try:
-            with self.database.transaction():
-                # Find the person
-                result = UsersTable.get(UsersTable.user_id == user_id)
-                # Update fields
-                result.email = email
-                # Save it in the db
-                result.save()
-                logger.info(f"Successly updated email for {user_id} to {email}")
-            return True
-        except DoesNotExist:
-            logger.error(f'Cannot update email because {user_id} does not exist in the database!')
+        if self._absent(user_id):
+            return False
+        with self.database.transaction("immediate"):
+            # A single UPDATE; no row changed means there is no such user
+            updated = (UsersTable.update(email=email)
+                       .where(UsersTable.user_id == user_id)
+                       .execute(self.database))
+        if not updated:
+            logger.error('Cannot update email because {} does not exist in the database!', user_id)
             return False
+        logger.info("Successly updated email for {} to {}", user_id, email)
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
+        self._refresh_replica()
+        return True
+
+    @instrumented
+    def update_emails(self, emails):
+        """
+        Modifies the email of many users at once. emails is a dict of new
+        email by user_id.
+
+        Returns the number of users updated and the list of user_ids that
+        do not exist in the database.
+        """
+        absent = [user_id for user_id in emails if self._absent(user_id)]
+        if absent:
+            skip = set(absent)
+            emails = {user_id: email for user_id, email in emails.items()
+                      if user_id not in skip}
+        with self.database.transaction("immediate"):
+            updated, missing = update_many(self.database, UsersTable.user_id,
+                                          UsersTable.email, emails)
+        missing = absent + missing
+        if self.cache is not None:
+            for user_id in emails:
+                self.cache.invalidate(user_id)
+        logger.info("Updated {} emails, {} missing", updated, len(missing))
+        self._refresh_replica()
+        return updated, missing